@@ -0,0 +1,334 @@
+"""
+음성/텍스트 클라이언트 공용 Azure Function(SendIoTCommand) 호출 모듈
+
+명령 하나마다 Idempotency-Key를 만들어 보내고, 시간 초과나 연결 오류로 다시 보낼 때도
+같은 키를 사용합니다. 첫 요청이 실제로는 처리되었더라도 Function이 중복을 걸러내므로
+IoT Hub로 같은 명령이 두 번 전송되지 않습니다.
+
+trace(pipeline_trace.PipelineTrace)를 넘기면 전송 직전에 http_sent 단계를 기록하고
+요청 본문의 "trace"로 함께 보냅니다.
+
+요청마다 새 세션을 만들지 않고 이벤트 루프마다 하나의 aiohttp 세션(keep-alive, DNS 캐시)을
+계속 사용합니다. 클라이언트는 시작할 때 start_connection_keeper()로 Function 주소에 미리 연결해
+두고(DNS/TCP/TLS), 요청이 없는 동안에도 주기적으로 연결을 새로 고쳐 사용자가 말을 마쳤을 때
+바로 보낼 수 있게 합니다. 종료할 때는 close_session()을 호출합니다.
+
+Function에 닿지 못한 명령(시간 초과, 연결 오류, 429/5xx)은 오프라인 보관함(command_outbox)에
+저장했다가 run_with_warm_connection()이 띄우는 백그라운드 작업이 같은 Idempotency-Key로 다시 보냅니다.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from urllib.parse import urlsplit
+
+from command_outbox import (
+    DEFAULT_MAX_AGE_SECONDS,
+    DEFAULT_OUTBOX_PATH,
+    RESULT_REJECTED,
+    RESULT_RETRY,
+    RESULT_SENT,
+    CommandOutbox,
+    replay_forever,
+)
+from lazy_import import LazyModule
+
+# 클라이언트 시작을 늦추지 않도록 첫 사용 때(또는 preload로 백그라운드에서) 불러옴
+aiohttp = LazyModule("aiohttp")
+
+DEFAULT_TIMEOUT_SECONDS = 10
+DEFAULT_MAX_ATTEMPTS = 2
+RETRY_DELAY_SECONDS = 1.0
+# 유휴 연결을 새로 고치는 간격(초). Azure 프런트 엔드는 약 4분 동안 유휴인 연결을 끊습니다.
+KEEPALIVE_REFRESH_SECONDS = float(os.getenv("AZURE_FUNCTION_KEEPALIVE_REFRESH_SECONDS", "60"))
+# 풀에 있는 유휴 연결을 닫기 전까지 보관하는 시간(초). 새로 고침 간격보다 길어야 합니다.
+KEEPALIVE_TIMEOUT_SECONDS = float(os.getenv("AZURE_FUNCTION_KEEPALIVE_SECONDS", "150"))
+DNS_CACHE_SECONDS = int(os.getenv("AZURE_FUNCTION_DNS_CACHE_SECONDS", "300"))
+WARMUP_TIMEOUT_SECONDS = 5
+CONNECTION_LIMIT = 4
+# 오프라인 보관함 파일 (빈 값이면 보관하지 않음)
+OUTBOX_PATH = os.getenv("CLIENT_OUTBOX_PATH", DEFAULT_OUTBOX_PATH)
+OUTBOX_MAX_AGE_SECONDS = float(os.getenv("CLIENT_OUTBOX_MAX_AGE_SECONDS", str(DEFAULT_MAX_AGE_SECONDS)))
+# true면 서버가 성공을 알린 뒤에 확인 안내를 말함 (기본: 전송과 동시에 말함)
+CONFIRM_AFTER_SEND = os.getenv("CLIENT_CONFIRM_AFTER_SEND", "false").lower() == "true"
+SEND_FAILURE_PHRASE = "죄송합니다. 조명 명령을 전달하지 못했습니다."
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+# 이벤트 루프 → _LoopSession (닫힌 루프의 세션은 루프와 함께 사라짐)
+_sessions = weakref.WeakKeyDictionary()
+
+
+class _LoopSession:
+    """이벤트 루프 하나에서 쓰는 세션과 연결 새로 고침/보관함 재전송 작업"""
+
+    def __init__(self, session):
+        self.session = session
+        self.refresher = None
+        self.replayer = None
+        self.last_used = 0.0
+
+
+def get_outbox():
+    """프로세스 공용 오프라인 보관함 (CLIENT_OUTBOX_PATH가 비어 있으면 None)"""
+    global _outbox
+    if not OUTBOX_PATH:
+        return None
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = CommandOutbox(OUTBOX_PATH, max_age_seconds=OUTBOX_MAX_AGE_SECONDS)
+            if len(_outbox):
+                print(f"📥 오프라인 보관함에 보내지 못한 명령 {len(_outbox)}건이 있습니다.")
+        return _outbox
+
+
+def _get_loop_session():
+    loop = asyncio.get_running_loop()
+    state = _sessions.get(loop)
+    if state is None or state.session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            ttl_dns_cache=DNS_CACHE_SECONDS,
+            keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS
+        )
+        state = _sessions[loop] = _LoopSession(aiohttp.ClientSession(connector=connector))
+    return state
+
+
+def _warmup_url():
+    """미리 연결할 주소 (AZURE_FUNCTION_WARMUP_URL, 기본은 Function URL의 호스트 루트)"""
+    warmup_url = os.getenv("AZURE_FUNCTION_WARMUP_URL")
+    if warmup_url:
+        return warmup_url
+    function_url = os.getenv("AZURE_FUNCTION_URL")
+    if not function_url:
+        return None
+    parts = urlsplit(function_url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+async def warm_up():
+    """
+    Function 호스트에 가벼운 GET 요청을 보내 DNS 조회와 TCP/TLS 연결을 미리 해 둡니다.
+    (HEAD 응답 뒤에는 aiohttp가 연결을 풀에 돌려놓지 않는 경우가 있어 GET을 사용합니다.)
+    응답 상태 코드와 관계없이 연결이 되면 True를 반환합니다(연결은 풀에 남아 다음 요청이 재사용).
+    """
+    url = _warmup_url()
+    if not url:
+        return False
+    state = _get_loop_session()
+    started = time.perf_counter()
+    try:
+        async with state.session.get(
+            url,
+            allow_redirects=False,
+            timeout=aiohttp.ClientTimeout(total=WARMUP_TIMEOUT_SECONDS)
+        ) as response:
+            await response.read()
+    except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+        print(f"⚠️ Azure Function 사전 연결 실패: {str(e) or '시간 초과'}")
+        return False
+    state.last_used = time.monotonic()
+    print(f"🔌 Azure Function 사전 연결 완료 ({(time.perf_counter() - started) * 1000:.0f}ms)")
+    return True
+
+
+async def _refresh_idle_connection(state, interval):
+    while True:
+        await asyncio.sleep(max(1.0, interval - (time.monotonic() - state.last_used)))
+        if time.monotonic() - state.last_used >= interval:
+            await warm_up()
+
+
+async def start_connection_keeper(warm_up_now=True, refresh_interval=KEEPALIVE_REFRESH_SECONDS):
+    """
+    현재 이벤트 루프의 세션을 준비하고(warm_up_now=True면 바로 사전 연결),
+    refresh_interval초 동안 요청이 없으면 연결을 새로 고치는 백그라운드 작업을 시작합니다.
+    """
+    state = _get_loop_session()
+    if warm_up_now:
+        await warm_up()
+    if refresh_interval > 0 and (state.refresher is None or state.refresher.done()):
+        state.refresher = asyncio.create_task(_refresh_idle_connection(state, refresh_interval))
+    outbox = get_outbox()
+    if outbox is not None and (state.replayer is None or state.replayer.done()):
+        state.replayer = asyncio.create_task(replay_forever(outbox, _replay_entry))
+
+
+async def close_session():
+    """현재 이벤트 루프의 세션과 새로 고침 작업을 정리합니다."""
+    state = _sessions.pop(asyncio.get_running_loop(), None)
+    if state is None:
+        return
+    for task in (state.refresher, state.replayer):
+        if task is not None:
+            task.cancel()
+    await state.session.close()
+
+
+async def run_with_warm_connection(coro, warm_up_now=True):
+    """
+    클라이언트 main() 실행 전후로 사전 연결/새로 고침/보관함 재전송을 시작하고 세션을 정리합니다.
+    warm_up_now=False면 main()이 준비를 마친 뒤 start_connection_keeper()를 직접 호출합니다.
+    """
+    if warm_up_now:
+        await start_connection_keeper()
+    try:
+        return await coro
+    finally:
+        await close_session()
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+async def send_command_to_azure_function(command, timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+                                         idempotency_key=None, max_attempts=DEFAULT_MAX_ATTEMPTS, trace=None,
+                                         use_outbox=True):
+    """
+    Azure Function에 HTTP 요청을 보내서 IoT Hub로 메시지를 전달합니다.
+    시간 초과/연결 오류면 같은 Idempotency-Key로 max_attempts번까지 보내고, 성공 여부를 반환합니다.
+    (keep-alive 연결이 서버 쪽에서 이미 끊겼던 경우도 연결 오류로 보고 다시 보냅니다.)
+    그래도 닿지 못하면(use_outbox=True) 오프라인 보관함에 저장해 나중에 다시 보냅니다.
+    """
+    device_id = os.getenv("DEVICE_ID", "default-device")
+    idempotency_key = idempotency_key or new_idempotency_key()
+    # 보관함에서 다시 보낼 때도 같은 본문이 되도록 요청 시각을 한 번만 정함 (서버가 키별 본문 해시를 비교)
+    timestamp = time.time()
+    outbox = get_outbox() if use_outbox else None
+    if outbox is None:
+        result = await _post_command(command, device_id, idempotency_key, timestamp,
+                                     timeout_seconds, max_attempts, trace)
+        return result == RESULT_SENT
+
+    # 보관함의 이전 명령을 다시 보내는 중이면 그 전송이 끝난 뒤에 보냄 (이전 명령이 나중에 도착하지 않도록)
+    async with outbox.device_lock(device_id):
+        result = await _post_command(command, device_id, idempotency_key, timestamp,
+                                     timeout_seconds, max_attempts, trace)
+        if result == RESULT_RETRY:
+            try:
+                outbox.add(device_id, command, idempotency_key, created_at=timestamp)
+                print("📥 명령을 오프라인 보관함에 저장했습니다. 연결이 돌아오면 다시 보냅니다.")
+            except OSError as e:
+                print(f"❌ 오프라인 보관함 저장 실패: {e}")
+        elif outbox.discard_device(device_id):
+            # 새 명령이 처리되었으므로 같은 디바이스의 밀린 명령은 더 이상 보내지 않음
+            print("🗑️ 같은 디바이스의 밀린 명령을 보관함에서 지웠습니다.")
+    return result == RESULT_SENT
+
+
+async def send_with_confirmation(command, speak, confirmation, failure_phrase=SEND_FAILURE_PHRASE,
+                                 wait_for_result=None, **send_kwargs):
+    """
+    명령 전송과 음성 확인 안내를 동시에 진행합니다. speak(text)는 말을 끝낼 때까지 기다리는
+    TTS 코루틴 함수이며, 막히는 일반 함수면 이벤트 루프를 막지 않도록 작업 스레드에서 실행합니다.
+    wait_for_result=True(기본: CLIENT_CONFIRM_AFTER_SEND)면 서버가 성공을 알린 뒤에 안내하고,
+    전송이 실패하면 failure_phrase를 말합니다. 전송 성공 여부를 반환합니다.
+    """
+    if wait_for_result is None:
+        wait_for_result = CONFIRM_AFTER_SEND
+    send_task = asyncio.create_task(send_command_to_azure_function(command, **send_kwargs))
+    if wait_for_result:
+        success = await send_task
+        if success:
+            await _speak(speak, confirmation)
+    else:
+        # 조명이 바뀌는 시각이 안내가 끝날 때까지 밀리지 않도록 전송을 먼저 시작
+        speech = _speak(speak, confirmation)
+        success, _ = await asyncio.gather(send_task, speech)
+    if not success and failure_phrase:
+        await _speak(speak, failure_phrase)
+    return success
+
+
+async def _speak(speak, text):
+    if asyncio.iscoroutinefunction(speak):
+        await speak(text)
+    else:
+        await asyncio.to_thread(speak, text)
+
+
+async def _replay_entry(entry):
+    """보관함 항목을 처음과 같은 Idempotency-Key로 한 번 보냅니다."""
+    return await _post_command(entry["command"], entry["deviceId"], entry["idempotencyKey"],
+                               entry["createdAt"], DEFAULT_TIMEOUT_SECONDS, 1, None)
+
+
+async def _post_command(command, device_id, idempotency_key, timestamp, timeout_seconds, max_attempts, trace):
+    """RESULT_SENT / RESULT_REJECTED(다시 보내도 소용없음) / RESULT_RETRY(닿지 못함) 중 하나를 반환합니다."""
+    function_url = os.getenv("AZURE_FUNCTION_URL")
+    if not function_url:
+        print("❌ Azure Function 요청 오류: AZURE_FUNCTION_URL 환경 변수가 설정되지 않았습니다.")
+        return RESULT_REJECTED
+
+    payload = {
+        "command": command,
+        "deviceId": device_id,
+        "timestamp": timestamp
+    }
+
+    print(f"🌐 Azure Function으로 요청 전송: {function_url}")
+    if trace is not None:
+        print(f"🧭 trace ID: {trace.trace_id}")
+    print(f"📄 요청 데이터: {json.dumps(payload, indent=2)}")
+
+    for attempt in range(1, max_attempts + 1):
+        if trace is not None:
+            payload["trace"] = trace.mark("http_sent").to_dict()
+        state = _get_loop_session()
+        state.last_used = time.monotonic()
+        try:
+            async with state.session.post(
+                function_url,
+                json=payload,
+                headers={
+                    "Content-Type": "application/json",
+                    "Idempotency-Key": idempotency_key
+                },
+                timeout=aiohttp.ClientTimeout(total=timeout_seconds)
+            ) as response:
+                return _handle_response(response.status, await response.text(), response.headers)
+
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            reason = f"시간 초과 ({timeout_seconds}초)" if isinstance(e, asyncio.TimeoutError) else f"연결 오류: {e}"
+            print(f"❌ Azure Function 요청 {reason}")
+            if attempt < max_attempts:
+                print(f"🔁 같은 Idempotency-Key로 다시 보냅니다... ({attempt + 1}/{max_attempts})")
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+        except aiohttp.ClientError as e:
+            print(f"❌ HTTP 요청 오류: {e}")
+            return RESULT_RETRY
+        except Exception as e:
+            print(f"❌ Azure Function 요청 오류: {e}")
+            return RESULT_REJECTED
+    return RESULT_RETRY
+
+
+def _handle_response(status_code, response_text, headers):
+    print(f"📊 응답 상태 코드: {status_code}")
+    print(f"📨 응답 내용: {response_text}")
+
+    if headers.get("Idempotent-Replayed") == "true":
+        print("♻️ 이미 처리된 명령입니다 (이전 응답 반환)")
+
+    if status_code not in (200, 202):
+        print(f"❌ Azure Function 요청 실패 (상태 코드: {status_code})")
+        # 속도 제한(429)과 서버 오류(5xx)는 나중에 다시 보내면 성공할 수 있음
+        return RESULT_RETRY if status_code == 429 or status_code >= 500 else RESULT_REJECTED
+
+    print("✅ Azure Function 요청 성공!")
+    try:
+        response_json = json.loads(response_text)
+    except json.JSONDecodeError:
+        print("✅ 응답을 텍스트로 받았습니다.")
+        return RESULT_SENT
+    if response_json.get("success"):
+        print("✅ IoT Hub 메시지 전송 완료!")
+        return RESULT_SENT
+    print(f"❌ IoT Hub 전송 실패: {response_json.get('error', '알 수 없는 오류')}")
+    return RESULT_REJECTED
@@ -0,0 +1,110 @@
+"""
+음성/텍스트 클라이언트 시작 시간 벤치마크
+
+클라이언트 진입점마다 새 파이썬 프로세스를 띄워 다음을 측정합니다.
+  - import: 진입점 모듈 import 시간 (무거운 모듈은 LazyModule로 지연, 사용자 입력 대기 전까지)
+  - ready:  프로세스 시작 후 백그라운드 preload까지 모두 끝난 시간 (모든 모듈 사용 가능)
+  - eager:  무거운 모듈을 기존처럼 맨 위에서 차례로 import했을 때의 시간 (비교 기준)
+
+마이크/오디오 장치는 사용하지 않습니다. 설치되지 않은 모듈은 결과에 함께 표시됩니다.
+
+실행: python benchmarks/bench_client_startup.py [--runs 5] [--entry plus_reservation]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 진입점 → 기존에 맨 위에서 import하던 무거운 모듈
+ENTRY_POINTS = {
+    "azurefunction": ["speech_recognition", "aiohttp"],
+    "txt_azurefuction": ["aiohttp"],
+    "sesac_with_voice_ver2": ["speech_recognition", "pyttsx3", "aiohttp"],
+    "plus_reservation": ["speech_recognition", "pyttsx3", "schedule", "pvporcupine", "pyaudio", "aiohttp"],
+}
+
+
+def _child_lazy(entry):
+    import importlib
+
+    started = time.perf_counter()
+    importlib.import_module(entry)
+    imported = time.perf_counter()
+    import lazy_import
+    results = lazy_import.wait_for_preload()
+    ready = time.perf_counter()
+    return {
+        "importMs": (imported - started) * 1000,
+        "readyMs": (ready - started) * 1000,
+        "missing": sorted(name for name, result in results.items() if isinstance(result, str)),
+    }
+
+
+def _child_eager(entry):
+    import importlib
+
+    missing = []
+    started = time.perf_counter()
+    for name in ENTRY_POINTS[entry]:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            missing.append(name)
+    importlib.import_module(entry)
+    return {"eagerMs": (time.perf_counter() - started) * 1000, "missing": missing}
+
+
+def _run_child(*args):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, env.get("PYTHONPATH", "")])
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", *args],
+        capture_output=True, text=True, env=env, cwd=ROOT,
+    )
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ["알 수 없는 오류"])[-1]
+        raise RuntimeError(error)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _summary(values):
+    return f"중앙값 {statistics.median(values):8.1f} ms  (최소 {min(values):.1f} / 최대 {max(values):.1f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="측정마다 새로 띄울 프로세스 수")
+    parser.add_argument("--entry", choices=sorted(ENTRY_POINTS), action="append", help="측정할 진입점 (여러 번 지정 가능)")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, entry = args.child
+        result = _child_lazy(entry) if kind == "lazy" else _child_eager(entry)
+        print(json.dumps(result))
+        return
+
+    for entry in args.entry or ENTRY_POINTS:
+        print(f"🚀 {entry}")
+        try:
+            lazy = [_run_child("lazy", entry) for _ in range(args.runs)]
+            eager = [_run_child("eager", entry) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"  ⚠️ 실행할 수 없습니다: {e}\n")
+            continue
+        print(f"  import (지연 로딩)     {_summary([r['importMs'] for r in lazy])}")
+        print(f"  ready (preload 완료)   {_summary([r['readyMs'] for r in lazy])}")
+        print(f"  eager (기존 방식)      {_summary([r['eagerMs'] for r in eager])}")
+        missing = sorted(set(lazy[0]["missing"]) | set(eager[0]["missing"]))
+        if missing:
+            print(f"  ⚠️ 설치되지 않은 모듈 (측정에서 빠짐): {', '.join(missing)}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+C2D 전송 vs 다이렉트 메서드(direct) 전달 모드 지연 시간 비교
+
+SendIoTCommand를 같은 프로세스에서 호출하고, IoT Hub는 benchmarks/fake_iot_hub.py로 대체합니다.
+  - c2d:            IoT Hub가 메시지를 접수하면 응답 (디바이스 처리 여부는 알 수 없음)
+  - direct:         디바이스가 명령을 처리하고 응답할 때까지 기다림
+  - direct-offline: 디바이스가 오프라인이라 C2D로 대체 전송
+
+--hub-ms는 서비스 API 호출 지연, --device-ms는 디바이스가 메서드를 처리하는 시간입니다.
+C2D 모드에서 실제 디바이스 도착 시간은 여기에 C2D 전달 지연(디바이스 폴링/연결 상태)이 더해집니다.
+
+실행: python benchmarks/bench_delivery_modes.py [--requests 200] [--hub-ms 20] [--device-ms 30]
+(azure-functions, azure-iot-hub 등 requirements.txt 패키지가 설치되어 있어야 합니다.)
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ.setdefault("IOTHUB_SERVICE_CONNECTION_STRING", "HostName=bench.azure-devices.net;SharedAccessKeyName=bench;SharedAccessKey=YmVuY2g=")
+
+import azure.functions as func  # noqa: E402
+
+import function_app  # noqa: E402
+import iot_hub_pool  # noqa: E402
+from bench_startup import _user_function  # noqa: E402
+from fake_iot_hub import FakeRegistryManager  # noqa: E402
+
+OFFLINE_PREFIX = "offline-"
+MODES = {
+    "c2d": ("c2d", ""),
+    "direct": ("direct", ""),
+    "direct-offline": ("direct", OFFLINE_PREFIX),
+}
+
+
+async def _run_mode(handler, delivery, device_prefix, requests):
+    latencies = []
+    statuses = {}
+    for index in range(requests):
+        # 디바이스별 전송 한도에 걸리지 않도록 요청마다 다른 디바이스 사용
+        body = {"command": "불 켜줘", "deviceId": f"{device_prefix}bench-{index}", "delivery": delivery}
+        request = func.HttpRequest(
+            method="POST",
+            url="http://localhost/api/send-command",
+            headers={"Content-Type": "application/json"},
+            body=json.dumps(body).encode("utf-8"),
+        )
+        started = time.perf_counter()
+        response = await handler(request)
+        latencies.append((time.perf_counter() - started) * 1000)
+        payload = json.loads(response.get_body())
+        key = f"{response.status_code} {payload.get('status')}/{payload.get('delivery')}"
+        statuses[key] = statuses.get(key, 0) + 1
+    return latencies, statuses
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="모드별 요청 수")
+    parser.add_argument("--hub-ms", type=float, default=20.0, help="IoT Hub 서비스 API 호출 지연(ms)")
+    parser.add_argument("--device-ms", type=float, default=30.0, help="디바이스 메서드 처리 시간(ms)")
+    args = parser.parse_args()
+    # 오프라인 대체 전송 경고 로그가 결과 출력을 가리지 않도록
+    logging.getLogger().setLevel(logging.ERROR)
+
+    offline_devices = {f"{OFFLINE_PREFIX}bench-{index}" for index in range(args.requests)}
+    iot_hub_pool.set_registry_manager_factory(functools.partial(
+        FakeRegistryManager,
+        latency=args.hub_ms / 1000,
+        device_latency=args.device_ms / 1000,
+        offline_devices=offline_devices,
+    ))
+    handler = _user_function(function_app.send_iot_command)
+
+    print(f"📡 허브 지연 {args.hub_ms:.0f}ms, 디바이스 처리 {args.device_ms:.0f}ms, 모드별 {args.requests}건\n")
+    for mode, (delivery, device_prefix) in MODES.items():
+        latencies, statuses = asyncio.run(_run_mode(handler, delivery, device_prefix, args.requests))
+        print(
+            f"  {mode:<15} 중앙값 {statistics.median(latencies):7.1f} ms  "
+            f"p95 {_percentile(latencies, 0.95):7.1f} ms  p99 {_percentile(latencies, 0.99):7.1f} ms  "
+            f"응답 {statuses}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+조명 의도 분석 마이크로 벤치마크
+
+기존 방식(키워드 목록마다 any(keyword in text) 반복)과 intent_engine의 Aho-Corasick
+오토마톤(문장을 한 번만 훑음), 그리고 그 앞단의 LRU 캐시(IntentCache) 적중 시 비용을
+비교합니다. 키워드 수를 늘려 가며, 그리고 어휘 파일에 디바이스/동작을 수백 개 추가한 경우의
+비용 증가도 측정합니다. 일치 결과에서 동작/디바이스/방을 정하는 단계(resolve, entities)도
+어휘의 모든 이름을 훑던 방식과 미리 계산한 비트마스크(IntentResolver) 방식으로 비교합니다.
+
+실행: python benchmarks/bench_intent_matcher.py [--number 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_engine import (  # noqa: E402
+    DEFAULT_INTENT_INDEX,
+    ROOM_LABEL_PREFIX,
+    IntentIndex,
+    IntentResolver,
+    KeywordMatcher,
+    Vocabulary,
+    analyze_light_command,
+)
+
+SAMPLE_TEXTS = [
+    "불 켜줘",
+    "불 꺼",
+    "turn off the light",
+    "Turn on the light please",
+    "거실 조명 좀 켜 줄래",
+    "라이트 오프",
+    "오늘 오후 7시에 불 꺼줘",
+    "예약 취소해줘",
+    "안녕하세요 오늘 날씨 어때요",
+    "전등 꺼 주세요 그리고 음악도 꺼",
+]
+
+
+def legacy_analyze_command(text):
+    """function_app.py 기존 구현 (비교 기준)"""
+    if not text:
+        return None
+
+    text_lower = text.lower()
+    turn_on_keywords = ["turn on the light", "켜", "키", "on", "온"]
+    turn_off_keywords = ["turn off the light", "꺼", "끄", "off", "오프"]
+    light_keywords = ["불", "라이트", "light", "조명", "전등"]
+
+    has_light_keyword = any(keyword in text_lower for keyword in light_keywords)
+    has_turn_on = any(keyword in text_lower for keyword in turn_on_keywords)
+    has_turn_off = any(keyword in text_lower for keyword in turn_off_keywords)
+
+    if "turn on the light" in text_lower or (has_turn_on and not has_turn_off):
+        return "turn_on"
+    elif "turn off the light" in text_lower or (has_turn_off and not has_turn_on):
+        return "turn_off"
+    elif has_light_keyword and has_turn_on:
+        return "turn_on"
+    elif has_light_keyword and has_turn_off:
+        return "turn_off"
+    else:
+        return None
+
+
+def legacy_scan(keyword_groups, text):
+    text_lower = text.lower()
+    return {label for label, keywords in keyword_groups.items()
+            if any(keyword in text_lower for keyword in keywords)}
+
+
+def legacy_resolve(vocabulary, flags, use_default_action=False):
+    """이전 Vocabulary.resolve_action (모든 동작/디바이스 이름을 훑음, 비교 기준)"""
+    for name in vocabulary.actions:
+        if f"{name}_phrase" in flags:
+            return name
+    matched = [name for name in vocabulary.actions if name in flags]
+    if len(matched) == 1:
+        return matched[0]
+    matched_devices = [name for name in vocabulary.devices if name in flags]
+    if matched and matched_devices:
+        return matched[0]
+    if use_default_action and not matched:
+        for name in matched_devices:
+            if vocabulary.devices[name]["defaultAction"]:
+                return vocabulary.devices[name]["defaultAction"]
+    return None
+
+
+def legacy_entities(vocabulary, flags):
+    """이전 Vocabulary.entities (모든 디바이스/방 이름을 훑음, 비교 기준)"""
+    return {
+        "devices": [name for name in vocabulary.devices if name in flags],
+        "rooms": [name for name in vocabulary.rooms if f"{ROOM_LABEL_PREFIX}{name}" in flags],
+    }
+
+
+def synthetic_vocabulary(device_count):
+    """기본 어휘에 디바이스 device_count개(디바이스마다 동의어 2개, 기본 동작 켜기)와 방 device_count // 10개를 추가합니다."""
+    base = DEFAULT_INTENT_INDEX.vocabulary
+    return Vocabulary({
+        "actions": {name: dict(spec) for name, spec in base.actions.items()},
+        "devices": {
+            **{name: dict(spec) for name, spec in base.devices.items()},
+            **{f"device-{i}": {"synonyms": [f"device{i}", f"장치{i}호"], "defaultAction": "turn_on"}
+               for i in range(device_count)},
+        },
+        "rooms": {**base.rooms, **{f"room-{i}": [f"{i}호실"] for i in range(device_count // 10)}},
+        "keywordGroups": base.keyword_groups_extra,
+    })
+
+
+def synthetic_groups(extra_per_label):
+    """라벨마다 실제로는 일치하지 않는 키워드를 extra_per_label개씩 추가합니다."""
+    groups = DEFAULT_INTENT_INDEX.vocabulary.keyword_groups()
+    for label in groups:
+        groups[label].extend(f"{label}-synonym-{i}" for i in range(extra_per_label))
+    return groups
+
+
+def synthetic_device_groups(device_count):
+    """어휘에 디바이스 device_count개(디바이스마다 동의어 3개)와 그만큼의 동작을 추가합니다."""
+    groups = DEFAULT_INTENT_INDEX.vocabulary.keyword_groups()
+    for i in range(device_count):
+        groups[f"device-{i}"] = [f"device{i}", f"디바이스{i}번", f"장치{i}호"]
+        groups[f"action-{i}"] = [f"verb{i}", f"동작{i}번"]
+    return groups
+
+
+def bench(label, func, number):
+    seconds = timeit.timeit(lambda: [func(text) for text in SAMPLE_TEXTS], number=number)
+    per_call_us = seconds / (number * len(SAMPLE_TEXTS)) * 1e6
+    print(f"  {label:<34} {per_call_us:8.2f} µs/문장")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="반복 횟수")
+    args = parser.parse_args()
+
+    # 캐시 없이 매처 + 결정만 거치는 인덱스 (어휘 파일은 같음)
+    uncached_index = IntentIndex(DEFAULT_INTENT_INDEX.path, cache_size=0, reload_interval=0)
+    mismatches = [text for text in SAMPLE_TEXTS
+                  if legacy_analyze_command(text) != analyze_light_command(text, matcher=uncached_index)]
+    print(f"결과 일치 확인: {len(SAMPLE_TEXTS) - len(mismatches)}/{len(SAMPLE_TEXTS)}")
+    for text in mismatches:
+        print(f"  ⚠️ 불일치: '{text}' legacy={legacy_analyze_command(text)} engine={analyze_light_command(text)}")
+
+    print("\nanalyze_command (기본 키워드)")
+    bench("legacy any() scans", legacy_analyze_command, args.number)
+    bench("intent_engine (Aho-Corasick)",
+          lambda text: analyze_light_command(text, matcher=uncached_index), args.number)
+    bench("intent_engine + IntentCache", analyze_light_command, args.number)
+
+    print("\n키워드 수 증가에 따른 전체 라벨 스캔 비용")
+    for extra in (0, 50, 200, 1000):
+        groups = synthetic_groups(extra)
+        matcher = KeywordMatcher(groups)
+        total = sum(len(keywords) for keywords in groups.values())
+        print(f" 키워드 {total}개")
+        bench("legacy any() scans", lambda text, g=groups: legacy_scan(g, text), max(1, args.number // 10))
+        bench("KeywordMatcher.match", matcher.match, max(1, args.number // 10))
+
+    print("\n어휘의 디바이스/동작 수 증가에 따른 KeywordMatcher.match 비용")
+    for devices in (0, 100, 500, 2000):
+        groups = synthetic_device_groups(devices)
+        matcher = KeywordMatcher(groups)
+        print(f" 디바이스 {devices}개 (라벨 {len(groups)}개)")
+        bench("KeywordMatcher.match", matcher.match, max(1, args.number // 10))
+
+    print("\n어휘의 디바이스 수 증가에 따른 동작 결정 + 엔티티 조회 비용 (일치 결과는 미리 계산)")
+    for devices in (100, 1000, 5000):
+        vocabulary = synthetic_vocabulary(devices)
+        matcher = KeywordMatcher(vocabulary.keyword_groups())
+        resolver = IntentResolver(vocabulary, matcher)
+        flags = {text: matcher.match(text) for text in SAMPLE_TEXTS + [f"device{devices - 1} 켜", f"{devices // 10 - 1}호실 불"]}
+        mismatched = [text for text, labels in flags.items()
+                      if legacy_resolve(vocabulary, labels, True) != resolver.resolve_action(labels, True)
+                      or legacy_entities(vocabulary, labels) != resolver.entities(labels)]
+        print(f" 디바이스 {devices}개 (라벨 {len(matcher.labels)}개, 결과 불일치 {len(mismatched)}개)")
+        bench("이름 전체 훑기 (이전 방식)",
+              lambda text, v=vocabulary: (legacy_resolve(v, flags[text], True), legacy_entities(v, flags[text])),
+              max(1, args.number // 100))
+        bench("IntentResolver (비트마스크)",
+              lambda text: (resolver.resolve_action(flags[text], True), resolver.entities(flags[text])),
+              max(1, args.number // 10))
+
+
+if __name__ == "__main__":
+    main()
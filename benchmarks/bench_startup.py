@@ -0,0 +1,119 @@
+"""
+Azure Function 앱 콜드 스타트 벤치마크
+
+새 파이썬 프로세스마다 다음을 측정합니다.
+  - function_app 모듈 import 시간 (+ 지연 로딩되는 azure.iot.hub import 시간 참고치)
+  - 라우트별 첫 응답까지의 시간 (import 포함, IoT Hub는 benchmarks/fake_iot_hub.py 사용)
+
+실행: python benchmarks/bench_startup.py [--runs 5]
+(azure-functions 등 requirements.txt 패키지가 설치되어 있어야 합니다.)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = {
+    "SendIoTCommand": ("send_iot_command", "POST", {"command": "불 켜줘", "deviceId": "bench-device"}),
+    "SendIoTCommandBatch": ("send_iot_command_batch", "POST",
+                            {"command": "불 꺼", "deviceIds": ["bench-1", "bench-2", "bench-3"]}),
+    "ReceiveIoTMessages": ("receive_iot_messages", "GET", None),
+}
+
+
+def _user_function(handler):
+    """데코레이터가 FunctionBuilder를 돌려주는 버전과 원래 함수를 돌려주는 버전을 모두 지원"""
+    if hasattr(handler, "build"):
+        return handler.build().get_user_function()
+    return handler
+
+
+def _child_import():
+    started = time.perf_counter()
+    import function_app  # noqa: F401
+    imported = time.perf_counter()
+    import azure.iot.hub  # noqa: F401
+    hub_imported = time.perf_counter()
+    return {
+        "importMs": (imported - started) * 1000,
+        "hubSdkImportMs": (hub_imported - imported) * 1000,
+    }
+
+
+def _child_route(route_name):
+    import asyncio
+
+    started = time.perf_counter()
+    import azure.functions as func
+    import function_app
+    import iot_hub_pool
+    from fake_iot_hub import FakeRegistryManager
+    imported = time.perf_counter()
+
+    iot_hub_pool.set_registry_manager_factory(FakeRegistryManager)
+    attr, method, body = ROUTES[route_name]
+    handler = _user_function(getattr(function_app, attr))
+    request = func.HttpRequest(
+        method=method,
+        url=f"http://localhost/api/{route_name}",
+        headers={"Content-Type": "application/json"},
+        body=json.dumps(body).encode("utf-8") if body is not None else b"",
+    )
+    response = handler(request)
+    if asyncio.iscoroutine(response):
+        response = asyncio.run(response)
+    responded = time.perf_counter()
+    return {
+        "importMs": (imported - started) * 1000,
+        "firstResponseMs": (responded - started) * 1000,
+        "statusCode": response.status_code,
+    }
+
+
+def _run_child(*args):
+    env = dict(os.environ)
+    env.setdefault("IOTHUB_SERVICE_CONNECTION_STRING", "HostName=bench.azure-devices.net;SharedAccessKeyName=bench;SharedAccessKey=YmVuY2g=")
+    env.setdefault("IOTHUB_RECEIVER_CONNECTION_STRING", "HostName=bench.azure-devices.net;DeviceId=bench-probe;SharedAccessKey=YmVuY2g=")
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, os.path.join(ROOT, "benchmarks"), env.get("PYTHONPATH", "")])
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", *args],
+        check=True, capture_output=True, text=True, env=env, cwd=ROOT,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summary(values):
+    return f"중앙값 {statistics.median(values):8.1f} ms  (최소 {min(values):.1f} / 최대 {max(values):.1f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="측정마다 새로 띄울 프로세스 수")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind = args.child[0]
+        result = _child_import() if kind == "import" else _child_route(args.child[1])
+        print(json.dumps(result))
+        return
+
+    imports = [_run_child("import") for _ in range(args.runs)]
+    print("📦 import 시간")
+    print(f"  function_app           {_summary([r['importMs'] for r in imports])}")
+    print(f"  azure.iot.hub (지연)   {_summary([r['hubSdkImportMs'] for r in imports])}")
+
+    print("\n🚀 라우트별 첫 응답까지의 시간 (프로세스 시작 후 import 포함)")
+    for route_name in ROUTES:
+        results = [_run_child("route", route_name) for _ in range(args.runs)]
+        status_codes = sorted({r["statusCode"] for r in results})
+        print(f"  {route_name:<22} {_summary([r['firstResponseMs'] for r in results])}  상태 코드 {status_codes}")
+
+
+if __name__ == "__main__":
+    main()
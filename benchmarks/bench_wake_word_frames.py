@@ -0,0 +1,174 @@
+"""
+호출어 감지 프레임 처리 벤치마크 (CPU / 메모리 할당)
+
+녹음된 PCM(16비트 모노, 16kHz의 raw 또는 WAV, 없으면 무작위 잡음)을 512샘플 프레임으로 나눠
+PorcupineWakeWordDetector.process_frame()에 그대로 흘려 보내고, 기존 방식
+(struct.unpack_from("h" * frame_length, pcm) → porcupine.process(tuple))과 비교합니다.
+  - CPU: 프레임당 처리 시간(µs)과 실시간 대비 CPU 사용률
+  - 할당: 재생 중 tracemalloc 최대 사용량 - 시작 시 사용량 (프레임마다 생기는 임시 객체 크기)
+
+--access-key를 주면 실제 pvporcupine 엔진을 사용하고, 엔진 두 개에 같은 녹음을 넣어 C 함수 직접 호출과
+process()의 프레임별 감지 결과가 같은지도 확인합니다. 없으면 바인딩과 같은 방식으로 ctypes 배열을
+만드는 녹음 재생용 엔진(C 함수 호출만 빠짐)을 사용합니다.
+
+실행: python benchmarks/bench_wake_word_frames.py [--pcm recording.wav] [--seconds 60] [--access-key ...]
+"""
+import argparse
+import ctypes
+import os
+import random
+import struct
+import sys
+import time
+import tracemalloc
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wake_word import PorcupineWakeWordDetector, _self_check_frames  # noqa: E402
+
+FRAME_LENGTH = 512
+SAMPLE_RATE = 16000
+
+
+class ReplayPorcupine:
+    """pvporcupine.Porcupine과 같은 인터페이스 (process()는 바인딩처럼 프레임마다 ctypes 배열 생성)"""
+
+    class PicovoiceStatuses:
+        SUCCESS = object()
+
+    frame_length = FRAME_LENGTH
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self):
+        self._handle = object()
+
+    def _process_func(self, handle, pcm, result):
+        result.contents.value = -1
+        return self.PicovoiceStatuses.SUCCESS
+
+    def process(self, pcm):
+        if len(pcm) != self.frame_length:
+            raise ValueError("Invalid frame length")
+        result = ctypes.c_int()
+        self._process_func(self._handle, (ctypes.c_short * len(pcm))(*pcm), ctypes.pointer(result))
+        return result.value
+
+    def delete(self):
+        pass
+
+
+def _load_frames(path, seconds, frame_length):
+    if path:
+        if path.endswith(".wav"):
+            with wave.open(path, "rb") as f:
+                if f.getnchannels() != 1 or f.getsampwidth() != 2:
+                    raise SystemExit("16비트 모노 WAV만 지원합니다.")
+                data = f.readframes(f.getnframes())
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+    else:
+        rng = random.Random(1)
+        data = bytes(rng.getrandbits(8) for _ in range(int(seconds * SAMPLE_RATE) * 2))
+    frame_bytes = frame_length * 2
+    return [data[offset:offset + frame_bytes] for offset in range(0, len(data) - frame_bytes + 1, frame_bytes)]
+
+
+def _legacy_process(porcupine):
+    def process(pcm):
+        return porcupine.process(struct.unpack_from("h" * porcupine.frame_length, pcm))
+    return process
+
+
+def _check_equivalence(access_key, frames):
+    """엔진 두 개(직접 호출 / process())에 같은 프레임을 넣고 프레임별 감지 결과를 비교합니다."""
+    import pvporcupine
+
+    direct_engine = pvporcupine.create(access_key=access_key, keywords=["bumblebee"])
+    public_engine = pvporcupine.create(access_key=access_key, keywords=["bumblebee"])
+    try:
+        detector = PorcupineWakeWordDetector(access_key=None)
+        detector.attach_engine(direct_engine)
+        if detector._direct_process is None:
+            print("  (직접 호출을 쓰지 않는 환경이라 결과 비교 생략)\n")
+            return True
+        unpack = struct.Struct(f"{public_engine.frame_length}h").unpack_from
+        # attach_engine()의 자체 확인이 넣은 프레임(프레임마다 두 번)을 비교 엔진에도 넣어 상태를 맞춤
+        for pcm in _self_check_frames(public_engine.frame_length):
+            public_engine.process(unpack(pcm))
+            public_engine.process(unpack(pcm))
+        mismatches = detections = 0
+        for pcm in frames:
+            expected = public_engine.process(unpack(pcm))
+            mismatches += detector.process_frame(pcm) != expected
+            detections += expected >= 0
+        print(f"  직접 호출 vs process() 결과 불일치: {mismatches}/{len(frames)}프레임 (감지 {detections}회)\n")
+        return mismatches == 0
+    finally:
+        direct_engine.delete()
+        public_engine.delete()
+
+
+def _measure(label, process, frames, sample_rate, frame_length):
+    # 첫 호출(지연 초기화) 제외
+    process(frames[0])
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for pcm in frames[:200]:
+        process(pcm)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.process_time()
+    for pcm in frames:
+        process(pcm)
+    cpu = time.process_time() - started
+    per_frame_us = cpu / len(frames) * 1e6
+    realtime_percent = per_frame_us / (frame_length / sample_rate * 1e6) * 100
+    print(f"  {label:<32} {per_frame_us:7.2f} µs/프레임  실시간 대비 CPU {realtime_percent:6.3f}%  "
+          f"프레임 임시 할당 {max(0, peak - baseline) / 1024:6.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pcm", help="16비트 모노 PCM 녹음 (raw 또는 .wav, 엔진 샘플레이트와 같아야 함)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="녹음이 없을 때 만들 잡음 길이(초)")
+    parser.add_argument("--access-key", help="Picovoice 액세스 키 (실제 Porcupine 엔진 사용)")
+    args = parser.parse_args()
+
+    if args.access_key:
+        import pvporcupine
+        porcupine = pvporcupine.create(access_key=args.access_key, keywords=["bumblebee"])
+        engine_label = f"pvporcupine {porcupine.version}"
+    else:
+        porcupine = ReplayPorcupine()
+        engine_label = "녹음 재생용 엔진 (C 호출 제외)"
+
+    frames = _load_frames(args.pcm, args.seconds, porcupine.frame_length)
+    print(f"🎙️ {len(frames)}프레임 ({len(frames) * porcupine.frame_length / porcupine.sample_rate:.1f}초), {engine_label}\n")
+
+    direct = PorcupineWakeWordDetector(access_key=None)
+    direct.attach_engine(porcupine)
+    public = PorcupineWakeWordDetector(access_key=None)
+    public.attach_engine(porcupine, direct=False)
+
+    if args.access_key and not _check_equivalence(args.access_key, frames):
+        print("❌ 직접 호출 결과가 process()와 다릅니다. DIRECT_PROCESS_VERSIONS를 확인하세요.")
+        porcupine.delete()
+        sys.exit(1)
+
+    measure_args = (frames, porcupine.sample_rate, porcupine.frame_length)
+    _measure("기존 struct.unpack_from + process", _legacy_process(porcupine), *measure_args)
+    _measure("struct.Struct + process()", public.process_frame, *measure_args)
+    if direct._direct_process is not None:
+        _measure("버퍼 재사용 + C 함수 직접 호출", direct.process_frame, *measure_args)
+    else:
+        print("  (바인딩 내부 C 함수를 찾지 못해 직접 호출은 측정하지 않음)")
+
+    porcupine.delete()
+
+
+if __name__ == "__main__":
+    main()
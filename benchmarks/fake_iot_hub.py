@@ -0,0 +1,81 @@
+"""
+벤치마크용 로컬 IoT Hub 대체품
+
+IoTHubRegistryManager 대신 iot_hub_pool에 끼워 넣어, 실제 IoT Hub 없이 함수 앱을 실행합니다.
+사용: iot_hub_pool.set_registry_manager_factory(FakeRegistryManager)
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeDeviceOfflineError(Exception):
+    """IoT Hub가 연결되지 않은 디바이스에 돌려주는 404 (404103 DeviceNotOnline) 오류 흉내"""
+
+    def __init__(self, device_id):
+        super().__init__(f"404103 DeviceNotOnline: {device_id}")
+        self.response = SimpleNamespace(status_code=404)
+
+
+class FakeIoTHubError(Exception):
+    """실패 주입 시 발생시키는 IoT Hub 서비스 오류 흉내 (기본: 429 ThrottlingException)"""
+
+    def __init__(self, status_code=429, message="ThrottlingException"):
+        super().__init__(f"{status_code} {message}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class FakeRegistryManager:
+    """
+    send_c2d_message / invoke_device_method를 흉내 내고 전송된 메시지를 기록하는 가짜 IoTHubRegistryManager
+
+    latency: 서비스 API 호출 한 번의 지연 시간(초)
+    device_latency: 다이렉트 메서드 호출 시 디바이스가 명령을 처리하고 응답하는 데 걸리는 시간(초)
+    offline_devices: 다이렉트 메서드 호출 시 오프라인으로 처리할 디바이스 ID
+    latency_jitter: 호출마다 latency에 더하는 0~latency_jitter초 사이의 무작위 지연
+    failure_rate: 호출이 FakeIoTHubError로 실패할 확률 (0~1)
+    record_messages: False면 부하 테스트 중 메모리가 늘지 않도록 전송 기록을 남기지 않음
+    """
+
+    sent_messages = []
+    invoked_methods = []
+    _lock = threading.Lock()
+
+    def __init__(self, connection_string=None, latency=0.0, device_latency=0.0, offline_devices=(),
+                 latency_jitter=0.0, failure_rate=0.0, seed=None, record_messages=True):
+        self.connection_string = connection_string
+        self.latency = latency
+        self.device_latency = device_latency
+        self.offline_devices = set(offline_devices)
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.record_messages = record_messages
+
+    def _simulate_call(self):
+        delay = self.latency
+        if self.latency_jitter:
+            delay += self._random.uniform(0, self.latency_jitter)
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise FakeIoTHubError()
+
+    def send_c2d_message(self, device_id, message, properties=None):
+        self._simulate_call()
+        if not self.record_messages:
+            return
+        with self._lock:
+            self.sent_messages.append((device_id, message, properties or {}))
+
+    def invoke_device_method(self, device_id, direct_method_request):
+        self._simulate_call()
+        if device_id in self.offline_devices:
+            raise FakeDeviceOfflineError(device_id)
+        if self.device_latency:
+            time.sleep(self.device_latency)
+        if self.record_messages:
+            with self._lock:
+                self.invoked_methods.append((device_id, direct_method_request.method_name, direct_method_request.payload))
+        return SimpleNamespace(status=200, payload={"result": "ok", "command": direct_method_request.payload.get("command")})
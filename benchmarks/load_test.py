@@ -0,0 +1,164 @@
+"""
+SendIoTCommand 부하 테스트 (오프라인, 로컬 IoT Hub 대체품 사용)
+
+같은 프로세스에서 SendIoTCommand를 초당 --rps건씩 일정한 간격으로 호출하고(open-loop),
+동시에 진행 중인 요청은 --concurrency개로 제한합니다. IoT Hub는 benchmarks/fake_iot_hub.py의
+FakeRegistryManager로 대체하며 지연(--hub-ms, --hub-jitter-ms)과 실패(--failure-rate)를 주입합니다.
+
+명령 문장은 실제 음성 인식 결과와 비슷한 비율로 섞습니다(알 수 없는 문장 포함 → 400 예상).
+처리량, 지연 시간 p50/p95/p99, 상태 코드별 응답 수와 오류율을 출력합니다.
+  - 지연(서비스): 핸들러 호출 → 응답
+  - 지연(예정 시각 기준): 요청이 원래 보내졌어야 할 시각 → 응답 (동시 실행 제한으로 밀린 대기 포함)
+
+실행: python benchmarks/load_test.py --rps 200 --duration 10 --concurrency 64 --hub-ms 20 --failure-rate 0.01
+함수 앱 설정은 환경 변수로 바꿉니다 (예: IOTHUB_POOL_SIZE=8 RATE_LIMIT_HUB_PER_SECOND=100 ...).
+(azure-functions 등 requirements.txt 패키지가 설치되어 있어야 합니다.)
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ.setdefault("IOTHUB_SERVICE_CONNECTION_STRING", "HostName=bench.azure-devices.net;SharedAccessKeyName=bench;SharedAccessKey=YmVuY2g=")
+
+import azure.functions as func  # noqa: E402
+
+import function_app  # noqa: E402
+import iot_hub_pool  # noqa: E402
+from bench_startup import _user_function  # noqa: E402
+from fake_iot_hub import FakeRegistryManager  # noqa: E402
+
+# (문장, 비중) - 음성 인식 결과에서 흔한 표현 위주, 일부는 조명 명령이 아님
+COMMAND_MIX = [
+    ("불 켜줘", 20),
+    ("불 꺼줘", 20),
+    ("불 좀 켜", 8),
+    ("불 꺼", 8),
+    ("거실 조명 켜 줄래", 6),
+    ("전등 꺼 주세요", 6),
+    ("라이트 온", 4),
+    ("라이트 오프", 4),
+    ("turn on the light", 8),
+    ("turn off the light", 8),
+    ("Turn off the lights please", 3),
+    ("오늘 날씨 어때", 3),
+    ("음악 틀어줘", 2),
+]
+
+
+def _percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _request(command, device_id, extra):
+    body = {"command": command, "deviceId": device_id, "timestamp": time.time(), **extra}
+    return func.HttpRequest(
+        method="POST",
+        url="http://localhost/api/send-command",
+        headers={"Content-Type": "application/json"},
+        body=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+    )
+
+
+async def _run(handler, args, rng):
+    commands, weights = zip(*COMMAND_MIX)
+    extra = {}
+    if args.delivery != "c2d":
+        extra["delivery"] = args.delivery
+    if args.mode != "direct":
+        extra["mode"] = args.mode
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    service_ms = []
+    scheduled_ms = []
+    status_codes = {}
+
+    async def one(scheduled_at, command, device_id):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await handler(_request(command, device_id, extra))
+                status_code = response.status_code
+            except Exception:
+                status_code = "exception"
+            finished = time.perf_counter()
+        service_ms.append((finished - started) * 1000)
+        scheduled_ms.append((finished - scheduled_at) * 1000)
+        status_codes[status_code] = status_codes.get(status_code, 0) + 1
+
+    total = int(args.rps * args.duration)
+    interval = 1.0 / args.rps
+    tasks = []
+    started = time.perf_counter()
+    for index in range(total):
+        scheduled_at = started + index * interval
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        command = rng.choices(commands, weights)[0]
+        device_id = f"load-device-{rng.randrange(args.devices)}"
+        tasks.append(asyncio.create_task(one(scheduled_at, command, device_id)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return elapsed, service_ms, scheduled_ms, status_codes
+
+
+def _report(args, elapsed, service_ms, scheduled_ms, status_codes):
+    total = sum(status_codes.values())
+    ok = sum(count for code, count in status_codes.items() if isinstance(code, int) and code < 300)
+    rejected = status_codes.get(400, 0)
+    errors = total - ok - rejected
+
+    print(f"🎯 목표 {args.rps:.0f} RPS × {args.duration:.0f}초, 동시 실행 {args.concurrency}, 디바이스 {args.devices}개")
+    print(f"📡 허브 지연 {args.hub_ms:.0f}ms (+0~{args.hub_jitter_ms:.0f}ms), 실패율 {args.failure_rate:.1%}\n")
+    print(f"  요청 수        {total}건 / {elapsed:.2f}초")
+    print(f"  처리량         {total / elapsed:8.1f} req/s  (성공 {ok / elapsed:.1f} req/s)")
+    for label, values in (("지연(서비스)", service_ms), ("지연(예정 시각 기준)", scheduled_ms)):
+        print(
+            f"  {label:<14} p50 {_percentile(values, 0.5):7.1f} ms  p95 {_percentile(values, 0.95):7.1f} ms  "
+            f"p99 {_percentile(values, 0.99):7.1f} ms  최대 {max(values, default=float('nan')):7.1f} ms"
+        )
+    print(f"  상태 코드      {dict(sorted(status_codes.items(), key=lambda item: str(item[0])))}")
+    print(f"  오류율         {errors / total:.2%}  (알 수 없는 명령 400 {rejected}건 제외)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=100.0, help="초당 요청 수")
+    parser.add_argument("--duration", type=float, default=10.0, help="부하 시간(초)")
+    parser.add_argument("--concurrency", type=int, default=64, help="동시에 진행할 최대 요청 수")
+    parser.add_argument("--devices", type=int, default=1000, help="요청을 나눠 보낼 디바이스 수")
+    parser.add_argument("--hub-ms", type=float, default=20.0, help="IoT Hub 호출 지연(ms)")
+    parser.add_argument("--hub-jitter-ms", type=float, default=10.0, help="IoT Hub 호출 지연에 더할 무작위 지연 상한(ms)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="IoT Hub 호출 실패 확률 (0~1)")
+    parser.add_argument("--delivery", choices=["c2d", "direct"], default="c2d", help="전달 방식")
+    parser.add_argument("--mode", choices=["direct", "queue"], default="direct", help="즉시 전송 또는 queue 모드")
+    parser.add_argument("--seed", type=int, default=1, help="명령/디바이스 선택 난수 시드")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    iot_hub_pool.set_registry_manager_factory(functools.partial(
+        FakeRegistryManager,
+        latency=args.hub_ms / 1000,
+        latency_jitter=args.hub_jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+        record_messages=False,
+    ))
+    handler = _user_function(function_app.send_iot_command)
+    elapsed, service_ms, scheduled_ms, status_codes = asyncio.run(_run(handler, args, random.Random(args.seed)))
+    _report(args, elapsed, service_ms, scheduled_ms, status_codes)
+
+
+if __name__ == "__main__":
+    main()
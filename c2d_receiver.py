@@ -0,0 +1,269 @@
+"""
+C2D 메시지 수신 루프와 IoT Hub 전달 피드백 소비자
+
+ReceiveIoTMessages 라우트가 처음 호출될 때 백그라운드 스레드로 시작합니다.
+  - DeviceMessageReceiver: 수신 루프 전용 디바이스 ID(IOTHUB_RECEIVER_CONNECTION_STRING)로 접속해
+    C2D 메시지를 받고(측정용 디바이스 역할) 받은 시각을 DeliveryTracker에 기록합니다.
+    IoT Hub는 같은 ID의 연결을 하나만 허용하므로 실제 조명 디바이스의 ID를 쓰면 안 됩니다.
+  - FeedbackConsumer: 서비스 연결 문자열로 messages/servicebound/feedback 을 AMQP로 구독해
+    "iothub-ack: full"로 보낸 메시지의 완료(Success)/만료/거부 결과를 기록합니다.
+
+IoT Hub SDK(azure.iot.device, uamqp)는 루프가 시작될 때 불러옵니다.
+"""
+import abc
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+import urllib.parse
+from collections import deque
+from datetime import datetime, timezone
+
+RECONNECT_DELAY_SECONDS = 5
+MAX_RECONNECT_DELAY_SECONDS = 60
+# 이 시간 이상 연결되어 있다가 끊기면 재연결 지연을 처음 값으로 되돌림
+STABLE_CONNECTION_SECONDS = 60
+FEEDBACK_TOKEN_TTL_SECONDS = 3600
+DEFAULT_HISTORY_SIZE = 50
+
+
+def parse_connection_string(conn_str):
+    """연결 문자열(HostName=...;DeviceId=...;SharedAccessKey=...) → dict"""
+    return dict(part.split("=", 1) for part in conn_str.split(";") if "=" in part)
+
+
+def _parse_utc(text):
+    """IoT Hub 시각("2024-05-01T12:00:00.1234567Z") → UNIX 시간(초). 해석할 수 없으면 None"""
+    if not text:
+        return None
+    match = re.match(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?", text)
+    if not match:
+        return None
+    parsed = datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    fraction = float(f"0.{match.group(2)}") if match.group(2) else 0.0
+    return parsed.timestamp() + fraction
+
+
+class _BackgroundLoop(abc.ABC):
+    """재연결 지연(지수 백오프)과 상태를 공유하는 백그라운드 스레드 기반 클래스"""
+
+    thread_name = "iot-background"
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.connected = False
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run_forever, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run_forever(self):
+        delay = RECONNECT_DELAY_SECONDS
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self._run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"{self.thread_name} 오류: {str(e)}")
+            finally:
+                self.connected = False
+            if time.monotonic() - started > STABLE_CONNECTION_SECONDS:
+                delay = RECONNECT_DELAY_SECONDS
+            self._stopped.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    @abc.abstractmethod
+    def _run_once(self):
+        """연결해서 끊기거나 stop()될 때까지 실행합니다 (예외가 나면 백오프 뒤 다시 호출)."""
+
+    def status(self):
+        return {"running": self.running, "connected": self.connected, "lastError": self.last_error}
+
+
+class DeviceMessageReceiver(_BackgroundLoop):
+    """IoTHubDeviceClient(비동기)로 C2D 메시지를 받아 DeliveryTracker에 기록하는 수신 루프"""
+
+    thread_name = "c2d-receiver"
+
+    def __init__(self, device_conn_str, tracker, history_size=DEFAULT_HISTORY_SIZE):
+        super().__init__()
+        self._device_conn_str = device_conn_str
+        self.device_id = parse_connection_string(device_conn_str).get("DeviceId")
+        self._tracker = tracker
+        self._history = deque(maxlen=history_size)
+        self.received_count = 0
+
+    def _run_once(self):
+        asyncio.run(self._receive())
+
+    async def _receive(self):
+        from azure.iot.device.aio import IoTHubDeviceClient
+
+        client = IoTHubDeviceClient.create_from_connection_string(self._device_conn_str)
+
+        def on_connection_state_change():
+            # SDK가 연결을 잃거나 다시 연결할 때마다 호출됨 (status()가 실제 연결 상태를 보고하도록)
+            self.connected = client.connected
+            if client.connected:
+                logging.info(f"C2D 수신 루프 다시 연결됨 (디바이스: {self.device_id})")
+            else:
+                logging.warning(f"C2D 수신 루프 연결 끊김, SDK가 재연결 중 (디바이스: {self.device_id})")
+
+        try:
+            client.on_message_received = self._on_message
+            client.on_connection_state_change = on_connection_state_change
+            await client.connect()
+            self.connected = client.connected
+            logging.info(f"C2D 수신 루프 연결됨 (디바이스: {self.device_id})")
+            # 연결 유지(재연결은 SDK가 담당), stop() 호출을 주기적으로 확인
+            while not self._stopped.is_set():
+                await asyncio.sleep(1)
+        finally:
+            await client.shutdown()
+
+    def _on_message(self, message):
+        received_at = time.time()
+        self.received_count += 1
+        message_id = message.message_id
+        data = message.data.decode("utf-8") if isinstance(message.data, bytes) else message.data
+        try:
+            data = json.loads(data)
+        except (TypeError, ValueError):
+            pass
+        if isinstance(data, dict) and isinstance(data.get("trace"), dict):
+            # 마이크 → 디바이스 전체 경로 시각에 디바이스 수신 단계를 덧붙임
+            data["trace"].setdefault("stages", {})["device_received"] = received_at
+        if message_id:
+            self._tracker.record_delivered(message_id, self.device_id, at=received_at)
+            if isinstance(data, dict) and isinstance(data.get("trace"), dict):
+                self._tracker.record_trace(message_id, data["trace"])
+        self._history.append({"messageId": message_id, "receivedAt": received_at, "data": data})
+        logging.info(f"C2D 메시지 수신 ({message_id}): {data}")
+
+    def recent_messages(self):
+        return list(reversed(self._history))
+
+    def status(self):
+        return {**super().status(), "deviceId": self.device_id, "receivedCount": self.received_count}
+
+
+class FeedbackConsumer(_BackgroundLoop):
+    """IoT Hub C2D 전달 피드백(messages/servicebound/feedback)을 AMQP로 받아 기록하는 소비자"""
+
+    thread_name = "c2d-feedback"
+
+    def __init__(self, service_conn_str, tracker):
+        super().__init__()
+        parts = parse_connection_string(service_conn_str)
+        self._hostname = parts["HostName"]
+        self._key_name = parts["SharedAccessKeyName"]
+        self._key = parts["SharedAccessKey"]
+        self._tracker = tracker
+        self.feedback_count = 0
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def stop(self, timeout=None):
+        # 메시지를 기다리며 막혀 있는 수신 반복을 끝내도록 수신 클라이언트를 닫음
+        self._stopped.set()
+        with self._client_lock:
+            client = self._client
+        if client is not None:
+            client.close()
+        super().stop(timeout)
+
+    def _sas_token(self):
+        expiry = int(time.time() + FEEDBACK_TOKEN_TTL_SECONDS)
+        string_to_sign = f"{self._hostname}\n{expiry}".encode("utf-8")
+        signature = hmac.new(base64.b64decode(self._key), string_to_sign, hashlib.sha256).digest()
+        encoded = urllib.parse.quote(base64.b64encode(signature))
+        return (
+            f"SharedAccessSignature sr={self._hostname}&sig={encoded}&se={expiry}&skn={self._key_name}",
+            expiry,
+        )
+
+    def _run_once(self):
+        import uamqp
+        from uamqp import authentication
+
+        def get_token():
+            token, expiry = self._sas_token()
+            return authentication.AccessToken(token, expiry)
+
+        auth = authentication.JWTTokenAuth(
+            audience=f"https://{self._hostname}",
+            uri=f"https://{self._hostname}",
+            get_token=get_token,
+            token_type=b"servicebus.windows.net:sastoken",
+        )
+        auth.update_token()
+        client = uamqp.ReceiveClient(f"amqps://{self._hostname}/messages/servicebound/feedback", auth=auth)
+        with self._client_lock:
+            if self._stopped.is_set():
+                return
+            self._client = client
+        try:
+            client.open()
+            # CBS 인증과 링크 연결이 끝날 때까지 진행 (인증/연결 실패는 예외로 올라옴)
+            while not client.client_ready():
+                if self._stopped.is_set():
+                    return
+                client.do_work()
+            self.connected = True
+            logging.info("C2D 전달 피드백 구독 시작")
+            for message in client.receive_messages_iter():
+                self._handle_feedback(b"".join(message.get_data()))
+                message.accept()
+                if self._stopped.is_set():
+                    break
+        except Exception:
+            # stop()이 클라이언트를 닫아서 난 오류는 무시
+            if not self._stopped.is_set():
+                raise
+        finally:
+            with self._client_lock:
+                self._client = None
+            client.close()
+
+    def _handle_feedback(self, body):
+        try:
+            records = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError) as e:
+            logging.warning(f"전달 피드백 해석 실패: {str(e)}")
+            return
+        for record in records if isinstance(records, list) else [records]:
+            message_id = record.get("originalMessageId")
+            if not message_id:
+                continue
+            self.feedback_count += 1
+            self._tracker.record_feedback(
+                message_id,
+                record.get("statusCode"),
+                device_id=record.get("deviceId"),
+                description=record.get("description"),
+                at=_parse_utc(record.get("enqueuedTimeUtc")),
+            )
+
+    def status(self):
+        return {**super().status(), "feedbackCount": self.feedback_count}
@@ -0,0 +1,47 @@
+"""
+디바이스별 명령 병합(coalescing) 창
+
+짧은 시간 안에 같은 디바이스로 여러 켜기/끄기 명령이 오면(사용자 반복 발화, 클라이언트 재시도)
+마지막 명령만 IoT Hub로 보내고 앞선 명령들은 "coalesced"로 응답합니다.
+각 요청은 창(window) 동안 기다리며, 그 사이 같은 디바이스로 새 요청이 오면 바로 밀려납니다.
+
+병합은 워커 프로세스(이벤트 루프) 단위로 동작합니다.
+"""
+import asyncio
+
+
+class _Ticket:
+    __slots__ = ("command_id", "superseded", "superseded_by")
+
+    def __init__(self, command_id):
+        self.command_id = command_id
+        self.superseded = asyncio.Event()
+        self.superseded_by = None
+
+
+class CommandCoalescer:
+    """디바이스 ID별로 가장 최근 요청 하나만 살아남게 하는 디바운서"""
+
+    def __init__(self):
+        self._pending = {}
+
+    async def wait_for_turn(self, device_id, command_id, window_seconds):
+        """
+        window_seconds 동안 같은 디바이스의 더 최근 요청이 없으면 None을 반환합니다(전송 진행).
+        더 최근 요청에 밀리면 그 요청의 command_id를 반환합니다(전송 생략).
+        """
+        ticket = _Ticket(command_id)
+        previous = self._pending.get(device_id)
+        self._pending[device_id] = ticket
+        if previous is not None:
+            previous.superseded_by = command_id
+            previous.superseded.set()
+
+        try:
+            await asyncio.wait_for(ticket.superseded.wait(), timeout=window_seconds)
+            return ticket.superseded_by
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if self._pending.get(device_id) is ticket:
+                del self._pending[device_id]
@@ -0,0 +1,247 @@
+"""
+클라이언트 오프라인 보관함 (append-only JSONL)
+
+Azure Function에 닿지 못해 보내지 못한 명령(시간 초과, 연결 오류, 429/5xx)을 디스크에 보관했다가
+연결이 돌아오면 지수 백오프 + 지터로 다시 보냅니다. 예약 실행(execute_scheduled_command)처럼
+사용자가 지켜보지 않는 명령도 잃어버리지 않습니다.
+
+플래시 저장소(SD 카드) 쓰기를 줄이도록 파일은 한 줄씩 덧붙이기만 합니다.
+  {"op": "add", "id": ..., "deviceId": ..., "command": ..., "idempotencyKey": ..., "createdAt": ...}
+  {"op": "done", "id": ..., "reason": "sent" / "rejected" / "superseded" / "expired"}
+재시도 횟수와 다음 시도 시각은 메모리에만 둡니다(재시작하면 바로 한 번 다시 시도).
+끝난 줄이 쌓이면 남은 명령만 새 파일에 쓰고 교체(compaction)합니다.
+
+디바이스별로 마지막 명령만 남깁니다. 같은 디바이스에 새 명령이 들어오거나 새 명령이 바로
+전송되면 이전 명령("켜기" 뒤의 "끄기" 등)은 superseded로 버리고, max_age_seconds보다 오래된
+명령은 다시 보내지 않고 expired로 버립니다.
+
+다시 보내기와 새 명령 전송은 device_lock(device_id)으로 디바이스마다 한 번에 하나씩만 진행합니다.
+이미 보내는 중인 이전 명령이 새 명령보다 늦게 도착해 상태를 되돌리는 일을 막습니다.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+DEFAULT_OUTBOX_PATH = os.path.join(os.path.expanduser("~"), ".voice_to_iot_outbox.jsonl")
+# 이보다 오래된 명령은 다시 보내지 않음 (사용자가 이미 잊었거나 상황이 바뀐 명령)
+DEFAULT_MAX_AGE_SECONDS = 15 * 60
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 300.0
+# 끝난 줄이 이 수 이상이고 남은 명령보다 많으면 파일을 다시 씀
+COMPACT_MIN_DEAD_LINES = 100
+# 보낼 명령이 없을 때도 다른 스레드(스케줄러)가 넣은 명령을 확인하는 간격
+IDLE_POLL_SECONDS = 5.0
+
+RESULT_SENT = "sent"
+RESULT_REJECTED = "rejected"
+RESULT_RETRY = "retry"
+
+
+class CommandOutbox:
+    """디바이스별 마지막 미전송 명령을 보관하는 append-only 보관함 (스레드 안전)"""
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH, max_age_seconds=DEFAULT_MAX_AGE_SECONDS, clock=time.time):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # 항목 ID → 항목 (디바이스당 하나)
+        self._entries = {}
+        # 디바이스 ID → 전송 직렬화 락 (스케줄러 스레드의 이벤트 루프와도 공유하므로 threading.Lock)
+        self._device_locks = {}
+        self._dead_lines = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        torn = False
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 전원이 나가 마지막 줄이 잘린 경우
+                    torn = True
+                    continue
+                if record.get("op") == "add":
+                    self._supersede(record["deviceId"])
+                    self._entries[record["id"]] = {
+                        **{key: record[key] for key in ("id", "deviceId", "command", "idempotencyKey", "createdAt")},
+                        "attempts": 0,
+                        "nextAttemptAt": 0.0,
+                    }
+                elif record.get("op") == "done":
+                    self._entries.pop(record.get("id"), None)
+                    self._dead_lines += 2
+        if torn:
+            # 잘린 줄 뒤에 이어 쓰지 않도록 남은 명령만으로 파일을 다시 씀
+            self._compact()
+
+    def _supersede(self, device_id):
+        """메모리에서 같은 디바이스의 이전 항목을 지우고 그 ID 목록을 반환합니다."""
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry["deviceId"] == device_id]
+        for entry_id in stale:
+            del self._entries[entry_id]
+        return stale
+
+    def _append(self, records, sync=False):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def add(self, device_id, command, idempotency_key, created_at=None):
+        """명령을 보관합니다. 같은 디바이스의 이전 명령은 superseded로 버립니다."""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "deviceId": device_id,
+            "command": command,
+            "idempotencyKey": idempotency_key,
+            "createdAt": created_at or self._clock(),
+        }
+        with self._lock:
+            stale = self._supersede(device_id)
+            records = [{"op": "done", "id": entry_id, "reason": "superseded"} for entry_id in stale]
+            records.append({"op": "add", **entry})
+            # 전원이 나가도 남도록 추가할 때만 디스크에 동기화
+            self._append(records, sync=True)
+            self._dead_lines += 2 * len(stale)
+            self._entries[entry["id"]] = {**entry, "attempts": 0, "nextAttemptAt": 0.0}
+            self._maybe_compact()
+        return dict(entry)
+
+    def discard_device(self, device_id, reason="superseded"):
+        """디바이스의 미전송 명령을 버립니다 (새 명령이 바로 전송된 경우)."""
+        with self._lock:
+            stale = self._supersede(device_id)
+            if stale:
+                self._append([{"op": "done", "id": entry_id, "reason": reason} for entry_id in stale])
+                self._dead_lines += 2 * len(stale)
+                self._maybe_compact()
+        return len(stale)
+
+    @contextlib.asynccontextmanager
+    async def device_lock(self, device_id):
+        """디바이스로 보내는 동안 잡는 락. 다른 이벤트 루프가 잡고 있으면 작업 스레드에서 기다립니다."""
+        with self._lock:
+            lock = self._device_locks.setdefault(device_id, threading.Lock())
+        if not lock.acquire(blocking=False):
+            acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+            try:
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # 기다리다 취소되어도 작업 스레드는 결국 락을 잡으므로 그때 바로 놓아 줌
+                acquiring.add_done_callback(lambda _: lock.release())
+                raise
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def is_pending(self, entry_id):
+        """항목이 아직 보관 중인지 (새 명령에 밀려 버려졌으면 False)"""
+        with self._lock:
+            return entry_id in self._entries
+
+    def mark_done(self, entry_id, reason=RESULT_SENT):
+        with self._lock:
+            if self._entries.pop(entry_id, None) is None:
+                return
+            self._append([{"op": "done", "id": entry_id, "reason": reason}])
+            self._dead_lines += 2
+            self._maybe_compact()
+
+    def record_failure(self, entry_id):
+        """다시 보내기 실패: 지수 백오프(+지터) 뒤 다음 시도 시각을 정하고 반환합니다."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return None
+            entry["attempts"] += 1
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (entry["attempts"] - 1))
+            # 같은 시각에 연결이 돌아온 여러 클라이언트가 한꺼번에 보내지 않도록 절반은 무작위
+            entry["nextAttemptAt"] = self._clock() + delay / 2 + random.uniform(0, delay / 2)
+            return entry["nextAttemptAt"]
+
+    def due(self):
+        """
+        지금 보낼 차례인 항목 목록. max_age_seconds보다 오래된 항목은 expired로 버립니다.
+        """
+        now = self._clock()
+        with self._lock:
+            expired = [entry_id for entry_id, entry in self._entries.items()
+                       if now - entry["createdAt"] > self.max_age_seconds]
+            for entry_id in expired:
+                del self._entries[entry_id]
+            if expired:
+                self._append([{"op": "done", "id": entry_id, "reason": "expired"} for entry_id in expired])
+                self._dead_lines += 2 * len(expired)
+                self._maybe_compact()
+            return [dict(entry) for entry in self._entries.values() if entry["nextAttemptAt"] <= now]
+
+    def next_attempt_in(self):
+        """가장 이른 다음 시도까지 남은 초 (항목이 없으면 None)"""
+        with self._lock:
+            if not self._entries:
+                return None
+            return max(0.0, min(entry["nextAttemptAt"] for entry in self._entries.values()) - self._clock())
+
+    def _maybe_compact(self):
+        if self._dead_lines >= COMPACT_MIN_DEAD_LINES and self._dead_lines > len(self._entries):
+            self._compact()
+
+    def _compact(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                record = {"op": "add", **{key: entry[key] for key in
+                                          ("id", "deviceId", "command", "idempotencyKey", "createdAt")}}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._dead_lines = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+async def replay_forever(outbox, send):
+    """
+    보관된 명령을 계속 다시 보냅니다 (클라이언트 이벤트 루프의 백그라운드 작업).
+    send(entry)는 RESULT_SENT / RESULT_REJECTED / RESULT_RETRY 중 하나를 돌려주는 코루틴 함수입니다.
+    보낼 차례인 명령(디바이스당 하나)은 한꺼번에 동시에 보냅니다.
+    """
+    while True:
+        entries = outbox.due()
+        if entries:
+            print(f"📤 오프라인 보관함의 명령 {len(entries)}건을 다시 보냅니다...")
+            await asyncio.gather(*(_replay_entry(outbox, entry, send) for entry in entries))
+        wait = outbox.next_attempt_in()
+        await asyncio.sleep(IDLE_POLL_SECONDS if wait is None else min(max(wait, 0.1), IDLE_POLL_SECONDS))
+
+
+async def _replay_entry(outbox, entry, send):
+    """디바이스 락을 잡은 채로 항목 하나를 다시 보내고 결과를 기록합니다."""
+    async with outbox.device_lock(entry["deviceId"]):
+        # 락을 기다리는 사이 새 명령이 전송되었으면 이전 명령은 보내지 않음
+        if not outbox.is_pending(entry["id"]):
+            return
+        try:
+            result = await send(entry)
+        except Exception as e:
+            print(f"❌ 보관함 명령 재전송 오류: {e}")
+            result = RESULT_RETRY
+        if result in (RESULT_SENT, RESULT_REJECTED):
+            outbox.mark_done(entry["id"], result)
+        else:
+            outbox.record_failure(entry["id"])
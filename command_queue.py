@@ -0,0 +1,290 @@
+"""
+명령 접수 큐 (SQLite)
+
+SendIoTCommand의 queue 모드에서 사용합니다. HTTP 요청은 명령을 검증/분석해 큐에 넣고 바로
+202로 응답하며, 백그라운드 드레이너(CommandQueueDrainer)가 큐에서 여러 건씩 꺼내 IoT Hub로
+보냅니다. 명령별 상태(queued → sending → accepted / failed)는 command ID로 조회합니다.
+accepted는 IoT Hub가 C2D 메시지를 받아들였다는 뜻이며, 디바이스 수신 여부는 전달 피드백
+(c2d_receiver.FeedbackConsumer)으로 확인합니다.
+
+큐 파일은 워커 인스턴스의 로컬 디스크에 있으므로, 여러 인스턴스로 확장할 때는 같은
+인터페이스로 공유 저장소(Azure Storage Queue/Table 등) 구현을 사용해야 합니다.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import wait
+
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_ACCEPTED = "accepted"
+STATUS_FAILED = "failed"
+
+DEFAULT_QUEUE_PATH = os.path.join(tempfile.gettempdir(), "voice_to_iot_commands.db")
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_POLL_INTERVAL_SECONDS = 1.0
+DEFAULT_MAX_ATTEMPTS = 3
+# 완료된 명령 기록 보관 시간
+DEFAULT_RETENTION_SECONDS = 24 * 60 * 60
+# 드레이너가 죽어 sending 상태로 남은 명령을 다시 보낼 때까지의 시간 (전송 제한 시간보다 길어야 함).
+# 살아 있는 드레이너는 전송이 끝날 때까지 lease_seconds / LEASE_RENEW_DIVISOR마다 임대를 연장합니다.
+DEFAULT_LEASE_SECONDS = 60
+LEASE_RENEW_DIVISOR = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS commands (
+    command_id TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    final_command TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    accepted_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_commands_ready ON commands (status, next_attempt_at);
+"""
+
+
+class RetryLater(Exception):
+    """
+    지금은 보낼 수 없으니 retry_after초 뒤에 다시 보내라는 신호 (전송 속도 제한 등).
+    시도 횟수에 넣지 않고 큐로 되돌립니다.
+    """
+
+    def __init__(self, retry_after, reason=None):
+        super().__init__(reason or f"{retry_after:.2f}초 후 재시도")
+        self.retry_after = retry_after
+
+
+class CommandQueue:
+    """SQLite 기반의 내구성 있는 명령 큐 (스레드 안전)"""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+
+    def _migrate(self):
+        # 이전 버전 큐 파일: delivered 상태/열 이름을 accepted로 변경
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(commands)")}
+        if "delivered_at" in columns:
+            self._conn.execute("ALTER TABLE commands RENAME COLUMN delivered_at TO accepted_at")
+            self._conn.execute("UPDATE commands SET status = ? WHERE status = 'delivered'", (STATUS_ACCEPTED,))
+
+    def enqueue(self, command_id, device_id, message, final_command=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO commands (command_id, device_id, message, final_command, status,"
+                " created_at, updated_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (command_id, device_id, message, final_command, STATUS_QUEUED, now, now, now),
+            )
+
+    def enqueue_many(self, commands):
+        """(command_id, device_id, message, final_command) 목록을 한 트랜잭션으로 넣습니다 (그룹 전송)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO commands (command_id, device_id, message, final_command, status,"
+                    " created_at, updated_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(*command, STATUS_QUEUED, now, now, now) for command in commands],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def claim_batch(self, limit):
+        """보낼 차례가 된 명령을 최대 limit개 꺼내 sending 상태로 바꿉니다."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 오래된 sending 상태는 드레이너가 중단된 것으로 보고 다시 보냄
+                self._conn.execute(
+                    "UPDATE commands SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                    (STATUS_QUEUED, now, STATUS_SENDING, now - self.lease_seconds),
+                )
+                rows = self._conn.execute(
+                    "SELECT command_id, device_id, message, attempts FROM commands"
+                    " WHERE status = ? AND next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+                    (STATUS_QUEUED, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE commands SET status = ?, attempts = attempts + 1, updated_at = ? WHERE command_id = ?",
+                    [(STATUS_SENDING, now, row["command_id"]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [dict(row, attempts=row["attempts"] + 1) for row in rows]
+
+    def renew(self, command_ids):
+        """아직 전송 중인 명령의 임대(sending 상태의 updated_at)를 연장합니다."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE commands SET updated_at = ? WHERE command_id = ? AND status = ?",
+                [(now, command_id, STATUS_SENDING) for command_id in command_ids],
+            )
+
+    def mark_accepted(self, command_ids):
+        """IoT Hub가 C2D 메시지를 받아들인 명령 (디바이스 수신은 보장하지 않음)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE commands SET status = ?, error = NULL, updated_at = ?, accepted_at = ? WHERE command_id = ?",
+                [(STATUS_ACCEPTED, now, now, command_id) for command_id in command_ids],
+            )
+
+    def mark_failed(self, command_id, error, retry_at=None):
+        """retry_at이 있으면 그 시각에 다시 보내고, 없으면 최종 실패로 기록합니다."""
+        now = time.time()
+        status = STATUS_QUEUED if retry_at is not None else STATUS_FAILED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE commands SET status = ?, error = ?, updated_at = ?, next_attempt_at = ? WHERE command_id = ?",
+                (status, error, now, retry_at if retry_at is not None else now, command_id),
+            )
+
+    def defer(self, command_id, retry_at, reason=None):
+        """sending 상태의 명령을 시도 횟수를 늘리지 않고 retry_at에 다시 보내도록 되돌립니다."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE commands SET status = ?, attempts = MAX(attempts - 1, 0), error = ?, updated_at = ?,"
+                " next_attempt_at = ? WHERE command_id = ?",
+                (STATUS_QUEUED, reason, now, retry_at, command_id),
+            )
+
+    def get(self, command_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT command_id, device_id, final_command, status, attempts, error, created_at,"
+                " updated_at, accepted_at FROM commands WHERE command_id = ?",
+                (command_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM commands GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge_finished(self, older_than_seconds=DEFAULT_RETENTION_SECONDS):
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM commands WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_ACCEPTED, STATUS_FAILED, cutoff),
+            )
+        return cursor.rowcount
+
+
+class CommandQueueDrainer:
+    """
+    큐에서 명령을 batch_size개씩 꺼내 executor에서 동시에 보내는 백그라운드 스레드
+
+    send(device_id, message, command_id)는 블로킹 전송 함수입니다. 실패한 명령은 지수 백오프로
+    max_attempts번까지 다시 시도합니다. send가 RetryLater를 던지면(속도 제한 등) 그 시간 뒤로
+    미루기만 하고 시도 횟수에는 넣지 않습니다(전송 스레드에서 기다리지 않음).
+    executor는 실시간 전송과 나눠 쓰지 않는 드레이너 전용 풀이어야 합니다.
+    전송이 오래 걸려도 다른 드레이너가 같은 명령을 다시 보내지 않도록, 끝날 때까지 임대를 연장합니다.
+    """
+
+    def __init__(self, queue, send, executor, batch_size=DEFAULT_BATCH_SIZE,
+                 poll_interval=DEFAULT_POLL_INTERVAL_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self._queue = queue
+        self._send = send
+        self._executor = executor
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="command-queue-drainer", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """새 명령이 들어왔음을 알려 대기 중인 드레이너를 깨웁니다."""
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def drain_once(self):
+        """한 배치를 보내고 처리한 명령 수를 반환합니다."""
+        batch = self._queue.claim_batch(self._batch_size)
+        if not batch:
+            return 0
+
+        futures = {
+            self._executor.submit(self._send, row["device_id"], row["message"], row["command_id"]): row
+            for row in batch
+        }
+        renew_interval = self._queue.lease_seconds / LEASE_RENEW_DIVISOR
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=renew_interval)
+            if pending:
+                self._queue.renew([futures[future]["command_id"] for future in pending])
+
+        accepted = []
+        for future, row in futures.items():
+            error = future.exception()
+            if error is None:
+                accepted.append(row["command_id"])
+                continue
+            if isinstance(error, RetryLater):
+                self._queue.defer(row["command_id"], time.time() + error.retry_after, str(error))
+                continue
+            retry_at = None
+            if row["attempts"] < self._max_attempts:
+                retry_at = time.time() + 2 ** row["attempts"]
+            logging.error(f"큐 명령 전송 실패 ({row['command_id']}, 시도 {row['attempts']}): {str(error)}")
+            self._queue.mark_failed(row["command_id"], str(error), retry_at)
+        if accepted:
+            self._queue.mark_accepted(accepted)
+        return len(batch)
+
+    def _run(self):
+        logging.info("명령 큐 드레이너 시작")
+        while not self._stopped.is_set():
+            try:
+                processed = self.drain_once()
+                if time.time() - self._last_purge > 60 * 60:
+                    self._last_purge = time.time()
+                    self._queue.purge_finished()
+            except Exception as e:
+                logging.error(f"명령 큐 처리 오류: {str(e)}")
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self._poll_interval)
+                self._wakeup.clear()
@@ -0,0 +1,98 @@
+"""
+C2D 메시지 전달 시각 추적
+
+메시지 ID(messageId)별로 세 시각을 기록해 실제 전달 지연을 계산합니다.
+  - enqueuedAt:  함수 앱이 IoT Hub에 C2D 메시지를 보낸 시각
+  - deliveredAt: 디바이스 수신 루프(c2d_receiver.DeviceMessageReceiver)가 메시지를 받은 시각
+  - completedAt: IoT Hub 전달 피드백(messages/servicebound/feedback)에서 디바이스가 메시지를
+                 완료(Success)했다고 알려 준 시각
+
+시각은 모두 UNIX 시간(초)입니다. 기록은 최근 max_entries개까지만 보관합니다.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class DeliveryTracker:
+    """메시지 ID → 전달 단계별 시각 기록 (스레드 안전)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, observe=None):
+        """observe(단계, 초)가 있으면 enqueue→delivered / enqueue→completed 지연 시간을 넘겨줍니다."""
+        self._max_entries = max(1, max_entries)
+        self._observe = observe
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record_enqueued(self, message_id, device_id, at=None):
+        record = self._update(message_id, deviceId=device_id, enqueuedAt=at or time.time())
+        # 전송 호출이 끝나기 전에 수신/피드백이 먼저 기록된 경우
+        self._observe_latency("c2d_delivered", record, "deliveredAt")
+        self._observe_latency("c2d_completed", record, "completedAt")
+
+    def record_delivered(self, message_id, device_id=None, at=None):
+        record = self._update(message_id, deviceId=device_id, deliveredAt=at or time.time())
+        self._observe_latency("c2d_delivered", record, "deliveredAt")
+
+    def record_feedback(self, message_id, status_code, device_id=None, description=None, at=None):
+        fields = {"deviceId": device_id, "feedbackStatus": status_code, "feedbackDescription": description}
+        if status_code == "Success":
+            fields["completedAt"] = at or time.time()
+        record = self._update(message_id, **fields)
+        if status_code == "Success":
+            self._observe_latency("c2d_completed", record, "completedAt")
+
+    def record_trace(self, message_id, trace):
+        """
+        디바이스가 받은 메시지의 파이프라인 trace({"traceId", "stages"})를 기록하고,
+        첫 단계(호출어 감지 등) → device_received 지연을 observe("pipeline_end_to_end", 초)로 넘깁니다.
+        """
+        stages = trace.get("stages") or {}
+        self._update(message_id, traceId=trace.get("traceId"), traceStages=dict(stages))
+        if self._observe and "device_received" in stages and len(stages) > 1:
+            self._observe("pipeline_end_to_end", max(0.0, stages["device_received"] - min(stages.values())))
+
+    def _update(self, message_id, **fields):
+        with self._lock:
+            record = self._records.get(message_id)
+            if record is None:
+                record = self._records[message_id] = {"messageId": message_id}
+                while len(self._records) > self._max_entries:
+                    self._records.popitem(last=False)
+            for key, value in fields.items():
+                # 수신/피드백이 deviceId 없이 올 수 있으므로 빈 값으로 덮어쓰지 않음
+                if value is not None:
+                    record[key] = value
+            return dict(record)
+
+    def _observe_latency(self, stage, record, field):
+        if self._observe and "enqueuedAt" in record and field in record:
+            self._observe(stage, max(0.0, record[field] - record["enqueuedAt"]))
+
+    def get(self, message_id):
+        with self._lock:
+            record = self._records.get(message_id)
+            return _with_latency(record) if record else None
+
+    def recent(self, limit=20):
+        """최근에 추가된 메시지부터 limit개"""
+        with self._lock:
+            records = list(self._records.values())[-limit:] if limit > 0 else []
+            return [_with_latency(record) for record in reversed(records)]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+
+def _with_latency(record):
+    result = dict(record)
+    enqueued_at = record.get("enqueuedAt")
+    if enqueued_at is not None:
+        if "deliveredAt" in record:
+            result["deliveredMs"] = round((record["deliveredAt"] - enqueued_at) * 1000, 1)
+        if "completedAt" in record:
+            result["completedMs"] = round((record["completedAt"] - enqueued_at) * 1000, 1)
+    return result
@@ -0,0 +1,165 @@
+"""
+디바이스 그룹(방/층/태그) → 디바이스 ID 목록 조회
+
+IoT Hub 디바이스 트윈의 tags를 한 번에 조회해 그룹 색인을 만들고 TTL 동안 캐시합니다.
+TTL이 가까워지면 백그라운드 스레드에서 새로 고치고, 그동안은 기존 색인으로 응답합니다
+(첫 조회만 IoT Hub 응답을 기다립니다). 새로 고침이 계속 실패해 색인이 max_stale_seconds보다
+오래되면 더 이상 쓰지 않고, 요청이 다시 IoT Hub 조회를 기다립니다(실패하면 오류로 응답).
+
+그룹 이름은 "태그키:값" 형식입니다. 예를 들어 트윈 tags가
+    {"room": "living", "floor": 3, "groups": ["hall", "night"], "location": {"building": "A"}}
+이면 "room:living", "floor:3", "groups:hall", "groups:night", "location.building:A" 그룹에 속합니다.
+(그룹 이름은 대소문자를 구분하지 않습니다.)
+"""
+import logging
+import threading
+import time
+
+from iot_hub_pool import get_registry_manager_pool
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_QUERY_PAGE_SIZE = 1000
+# TTL의 이 비율이 지나면 요청은 기존 색인으로 처리하고 백그라운드에서 새로 고칩니다.
+REFRESH_AHEAD_RATIO = 0.8
+# 새로 고침이 실패해도 기존 색인을 쓰는 최대 나이 (기본: TTL의 이 배수)
+DEFAULT_MAX_STALE_RATIO = 3
+
+
+class UnknownDeviceGroupError(LookupError):
+    """등록된 디바이스가 없는 그룹을 요청했을 때 발생합니다."""
+
+
+def _twin_fields(twin):
+    if isinstance(twin, dict):
+        return twin.get("deviceId") or twin.get("device_id"), twin.get("tags") or {}
+    return getattr(twin, "device_id", None), getattr(twin, "tags", None) or {}
+
+
+def _iter_tag_groups(tags, prefix=""):
+    for key, value in tags.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _iter_tag_groups(value, prefix=f"{name}.")
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if not isinstance(item, (dict, list, tuple)):
+                    yield f"{name}:{item}"
+        elif value is not None:
+            yield f"{name}:{value}"
+
+
+def build_group_index(twins):
+    """디바이스 트윈 목록으로 그룹 이름(소문자) → 정렬된 디바이스 ID 목록 색인을 만듭니다."""
+    index = {}
+    for twin in twins:
+        device_id, tags = _twin_fields(twin)
+        if not device_id:
+            continue
+        for group in _iter_tag_groups(tags):
+            index.setdefault(group.lower(), set()).add(device_id)
+    return {group: sorted(device_ids) for group, device_ids in index.items()}
+
+
+def query_device_twins(service_conn_str, page_size=DEFAULT_QUERY_PAGE_SIZE):
+    """IoT Hub 레지스트리에서 모든 디바이스 트윈의 deviceId, tags만 페이지 단위로 조회합니다."""
+    from azure.iot.hub.models import QuerySpecification
+
+    # 색인에는 두 필드만 필요하므로 properties 등 트윈 전체를 받지 않음
+    query = QuerySpecification(query="SELECT deviceId, tags FROM devices")
+    twins = []
+    continuation_token = None
+    with get_registry_manager_pool().lease(service_conn_str) as registry_manager:
+        while True:
+            result = registry_manager.query_iot_hub(query, continuation_token, page_size)
+            twins.extend(result.items or [])
+            continuation_token = result.continuation_token
+            if not continuation_token:
+                break
+    return twins
+
+
+class DeviceGroupResolver:
+    """TTL 캐시와 백그라운드 새로 고침을 갖춘 그룹 → 디바이스 목록 조회기"""
+
+    def __init__(self, loader, ttl_seconds=DEFAULT_TTL_SECONDS, max_stale_seconds=None):
+        self._loader = loader
+        self._ttl = ttl_seconds
+        self._max_stale = max_stale_seconds if max_stale_seconds else ttl_seconds * DEFAULT_MAX_STALE_RATIO
+        self._lock = threading.Lock()
+        self._blocking_load_lock = threading.Lock()
+        self._index = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+
+    def resolve(self, group):
+        """그룹에 속한 디바이스 ID 목록을 반환합니다. 없으면 UnknownDeviceGroupError."""
+        index = self._current_index()
+        device_ids = index.get(group.strip().lower())
+        if not device_ids:
+            raise UnknownDeviceGroupError(group)
+        return list(device_ids)
+
+    def refresh(self):
+        """IoT Hub에서 다시 조회해 색인을 교체합니다."""
+        started = time.monotonic()
+        index = build_group_index(self._loader())
+        with self._lock:
+            self._index = index
+            self._loaded_at = time.monotonic()
+        logging.info(f"디바이스 그룹 색인 갱신: 그룹 {len(index)}개 ({(time.monotonic() - started) * 1000:.0f}ms)")
+        return index
+
+    def _current_index(self):
+        with self._lock:
+            index = self._index
+            age = time.monotonic() - self._loaded_at
+            if index is not None and age >= self._max_stale:
+                # 새로 고침이 계속 실패한 색인은 버리고 조회를 기다림 (백그라운드 새로 고침은 시작하지 않음)
+                logging.warning(f"디바이스 그룹 색인이 너무 오래되었습니다 ({age:.0f}초). 다시 조회합니다.")
+                index = None
+            start_background = (
+                index is not None
+                and age >= self._ttl * REFRESH_AHEAD_RATIO
+                and not self._refreshing
+            )
+            if start_background:
+                self._refreshing = True
+
+        if index is None:
+            # 첫 조회(또는 만료된 색인)는 결과가 필요하므로 기다립니다(동시 요청은 한 번만 조회).
+            with self._blocking_load_lock:
+                with self._lock:
+                    index = self._index
+                    usable = index is not None and time.monotonic() - self._loaded_at < self._max_stale
+                return index if usable else self.refresh()
+        if start_background:
+            threading.Thread(target=self._background_refresh, name="device-group-refresh", daemon=True).start()
+        return index
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # 실패해도 기존 색인을 계속 사용하고 다음 요청에서 다시 시도
+            logging.error(f"디바이스 그룹 색인 갱신 실패: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_device_group_resolver(service_conn_str, ttl_seconds=DEFAULT_TTL_SECONDS, max_stale_seconds=None):
+    """연결 문자열별로 하나의 조회기를 공유합니다."""
+    with _resolvers_lock:
+        resolver = _resolvers.get(service_conn_str)
+        if resolver is None:
+            # 연결 문자열이 바뀌면 이전 조회기는 버립니다.
+            _resolvers.clear()
+            resolver = DeviceGroupResolver(
+                lambda: query_device_twins(service_conn_str), ttl_seconds, max_stale_seconds
+            )
+            _resolvers[service_conn_str] = resolver
+        return resolver
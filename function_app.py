@@ -2,204 +2,947 @@ import azure.functions as func
 import json
 import logging
 import os
+import time
 import asyncio
-from azure.iot.hub import IoTHubRegistryManager
-from azure.iot.device.aio import IoTHubDeviceClient
+import hashlib
+import math
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from intent_engine import ACTION_COMMANDS, DEFAULT_INTENT_INDEX, ROOM_LABEL_PREFIX, analyze_light_command
+from c2d_receiver import DeviceMessageReceiver, FeedbackConsumer, parse_connection_string
+from command_coalescer import CommandCoalescer
+from command_queue import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_QUEUE_PATH,
+    CommandQueue,
+    CommandQueueDrainer,
+    RetryLater,
+)
+from delivery_tracker import DeliveryTracker
+from device_groups import UnknownDeviceGroupError, get_device_group_resolver
+from function_metrics import METRICS
+from idempotency import MAX_KEY_LENGTH, IdempotencyCache, IdempotencyKeyConflict
+from iot_hub_pool import PoolExhaustedError, get_registry_manager_pool
+from pipeline_trace import PipelineTrace
+from rate_limiter import CommandRateLimiter
 
 app = func.FunctionApp()
 
+# 배치 전송 제한
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "8"))
+
+# IoT Hub 전송 타임아웃(초)과 전송 스레드 수 (기본값: 클라이언트 풀 크기)
+IOTHUB_SEND_TIMEOUT_SECONDS = float(os.environ.get("IOTHUB_SEND_TIMEOUT_SECONDS", "15"))
+IOTHUB_SEND_MAX_WORKERS = int(os.environ.get("IOTHUB_SEND_MAX_WORKERS", "0"))
+
+# 디바이스 그룹 색인(트윈 tags) 캐시 유지 시간(초)
+DEVICE_GROUP_TTL_SECONDS = float(os.environ.get("DEVICE_GROUP_TTL_SECONDS", "300"))
+# 새로 고침이 계속 실패할 때 기존 색인을 쓰는 최대 나이(초). 0이면 TTL의 3배
+DEVICE_GROUP_MAX_STALE_SECONDS = float(os.environ.get("DEVICE_GROUP_MAX_STALE_SECONDS", "0"))
+
+# 디바이스별 명령 병합 창(ms). 0이면 병합하지 않음. 요청의 coalesceMs로 개별 지정 가능
+COMMAND_COALESCE_WINDOW_MS = float(os.environ.get("COMMAND_COALESCE_WINDOW_MS", "0"))
+COMMAND_COALESCE_MAX_MS = float(os.environ.get("COMMAND_COALESCE_MAX_MS", "5000"))
+
+# 접수 후 큐 처리(queue) 모드: 요청의 mode 또는 기본 모드(COMMAND_DEFAULT_MODE)가 "queue"이면 202로 응답
+COMMAND_DEFAULT_MODE = os.environ.get("COMMAND_DEFAULT_MODE", "direct")
+COMMAND_QUEUE_PATH = os.environ.get("COMMAND_QUEUE_PATH")
+COMMAND_QUEUE_BATCH_SIZE = int(os.environ.get("COMMAND_QUEUE_BATCH_SIZE", "32"))
+# 큐 드레이너 전용 전송 스레드 수 (실시간 전송 스레드 풀과 나눠 쓰지 않음)
+COMMAND_QUEUE_MAX_WORKERS = int(os.environ.get("COMMAND_QUEUE_MAX_WORKERS", "2"))
+
+# Idempotency-Key 중복 제거: 같은 키로 다시 온 요청에 처음 응답을 그대로 반환
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# C2D 전송 속도 제한 (토큰 버킷, 초당 개수 / 버스트). 0이면 해당 범위는 제한하지 않음
+RATE_LIMIT_DEVICE_PER_SECOND = float(os.environ.get("RATE_LIMIT_DEVICE_PER_SECOND", "5"))
+RATE_LIMIT_DEVICE_BURST = int(os.environ.get("RATE_LIMIT_DEVICE_BURST", "10"))
+RATE_LIMIT_HUB_PER_SECOND = float(os.environ.get("RATE_LIMIT_HUB_PER_SECOND", "0"))
+RATE_LIMIT_HUB_BURST = int(os.environ.get("RATE_LIMIT_HUB_BURST", "0"))
+
+# direct 전달 모드: C2D 대신 디바이스의 다이렉트 메서드를 호출해 디바이스 응답까지 기다림
+COMMAND_DEFAULT_DELIVERY = os.environ.get("COMMAND_DEFAULT_DELIVERY", "c2d")
+DIRECT_METHOD_NAME = os.environ.get("DIRECT_METHOD_NAME", "lightCommand")
+DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS = int(os.environ.get("DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS", "10"))
+DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS = int(os.environ.get("DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS", "5"))
+DIRECT_METHOD_MAX_TIMEOUT_SECONDS = 60
+
+# C2D 수신 루프 전용 디바이스 ID의 연결 문자열. 실제 조명 디바이스의 ID로 접속하면 IoT Hub가
+# 같은 ID의 기존 연결(실제 디바이스)을 끊으므로 반드시 별도 ID(예: "delivery-probe")를 등록해 사용
+IOTHUB_RECEIVER_CONNECTION_STRING = os.environ.get("IOTHUB_RECEIVER_CONNECTION_STRING")
+
+# C2D 전달 피드백 요청 수준 ("full": 완료/만료/거부 모두, "positive", "negative", "none")
+C2D_DELIVERY_ACK = os.environ.get("C2D_DELIVERY_ACK", "full")
+
+_c2d_executor = None
+_c2d_executor_lock = threading.Lock()
+_coalescer = CommandCoalescer()
+_idempotency_cache = IdempotencyCache(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES)
+_rate_limiter = CommandRateLimiter(
+    RATE_LIMIT_DEVICE_PER_SECOND, RATE_LIMIT_DEVICE_BURST,
+    RATE_LIMIT_HUB_PER_SECOND, RATE_LIMIT_HUB_BURST
+)
+_delivery_tracker = DeliveryTracker(observe=METRICS.observe)
+_device_receiver = None
+_feedback_consumer = None
+_receiver_lock = threading.Lock()
+_command_queue = None
+_queue_drainer = None
+_command_queue_lock = threading.Lock()
+
+
+def _json_response(payload, status_code=200, headers=None):
+    return func.HttpResponse(
+        json.dumps(payload, ensure_ascii=False),
+        status_code=status_code,
+        headers={"Content-Type": "application/json; charset=utf-8", **(headers or {})}
+    )
+
+
+def _rate_limited_response(device_id, retry_after, scope):
+    """토큰이 부족할 때 SDK를 호출하지 않고 바로 보내는 429 응답"""
+    target = "IoT Hub 전체" if scope == "hub" else f"디바이스 {device_id}"
+    logging.warning(f"전송 속도 제한 ({target}) - {retry_after:.2f}초 후 재시도 가능")
+    return _json_response({
+        "success": False,
+        "error": f"{target}의 명령 전송 한도를 초과했습니다. 잠시 후 다시 시도하세요.",
+        "deviceId": device_id,
+        "limit": scope,
+        "retryAfterMs": round(retry_after * 1000)
+    }, 429, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def _get_c2d_executor():
+    """
+    블로킹 SDK 호출(send_c2d_message)을 실행할 스레드 풀.
+    기본적으로 클라이언트 풀 크기만큼만 스레드를 두어 풀 대기 없이 바로 전송하도록 합니다.
+    """
+    global _c2d_executor
+    if _c2d_executor is None:
+        with _c2d_executor_lock:
+            if _c2d_executor is None:
+                _c2d_executor = ThreadPoolExecutor(
+                    max_workers=IOTHUB_SEND_MAX_WORKERS or get_registry_manager_pool().max_size,
+                    thread_name_prefix="c2d-send"
+                )
+    return _c2d_executor
+
+
+def _build_c2d_message(final_command, original_command, timestamp, trace=None):
+    message_data = {
+        "command": final_command,
+        "originalCommand": original_command,
+        "timestamp": timestamp,
+        "source": "AzureFunction"
+    }
+    if trace is not None:
+        # 클라이언트 단계 + Function 단계 시각을 디바이스까지 전달
+        message_data["trace"] = trace.to_dict()
+    return json.dumps(message_data, ensure_ascii=False)
+
+
+def _send_c2d_message(service_conn_str, device_id, message_str, message_id=None):
+    """
+    워커 프로세스에서 재사용하는 IoT Hub Registry Manager로 C2D 메시지를 전송합니다.
+    messageId(기본: 새 UUID)로 전달 시각을 추적하고, iothub-ack로 전달 피드백을 요청합니다.
+    """
+    message_id = message_id or uuid.uuid4().hex
+    properties = {
+        "content-type": "application/json",
+        "content-encoding": "utf-8",
+        "messageId": message_id
+    }
+    if C2D_DELIVERY_ACK != "none":
+        properties["iothub-ack"] = C2D_DELIVERY_ACK
+
+    acquire_started = time.perf_counter()
+    with get_registry_manager_pool().lease(service_conn_str) as registry_manager:
+        METRICS.observe("acquire", time.perf_counter() - acquire_started)
+        enqueued_at = time.time()
+        with METRICS.time("send"):
+            registry_manager.send_c2d_message(device_id, message_str, properties)
+    _delivery_tracker.record_enqueued(message_id, device_id, at=enqueued_at)
+    return message_id
+
+
+async def _send_c2d_message_async(service_conn_str, device_id, message_str, message_id=None):
+    """
+    C2D 전송을 전용 스레드 풀에서 실행해 이벤트 루프(워커 스레드)를 막지 않습니다.
+    IOTHUB_SEND_TIMEOUT_SECONDS 안에 끝나지 않으면 asyncio.TimeoutError가 발생합니다.
+    (이미 시작된 SDK 호출은 백그라운드에서 마저 끝난 뒤 클라이언트를 풀에 반납합니다.)
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(
+            _get_c2d_executor(), _send_c2d_message, service_conn_str, device_id, message_str, message_id
+        ),
+        timeout=IOTHUB_SEND_TIMEOUT_SECONDS
+    )
+
+
+class DeviceOfflineError(Exception):
+    """다이렉트 메서드 호출 시 디바이스가 IoT Hub에 연결되어 있지 않은 경우"""
+
+
+def _is_device_offline_error(error):
+    # IoT Hub는 연결되지 않은 디바이스에 404 (오류 코드 404103 DeviceNotOnline)를 반환
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 404 or "404103" in str(error)
+
+
+def _invoke_direct_method(service_conn_str, device_id, payload, response_timeout):
+    """디바이스의 다이렉트 메서드를 호출하고 (디바이스 상태 코드, 응답 payload)를 반환합니다."""
+    from azure.iot.hub.models import CloudToDeviceMethod
+
+    method = CloudToDeviceMethod(
+        method_name=DIRECT_METHOD_NAME,
+        payload=payload,
+        response_timeout_in_seconds=response_timeout,
+        connect_timeout_in_seconds=DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS
+    )
+    acquire_started = time.perf_counter()
+    with get_registry_manager_pool().lease(service_conn_str) as registry_manager:
+        METRICS.observe("acquire", time.perf_counter() - acquire_started)
+        try:
+            with METRICS.time("direct_method"):
+                result = registry_manager.invoke_device_method(device_id, method)
+        except Exception as error:
+            if _is_device_offline_error(error):
+                raise DeviceOfflineError(str(error)) from error
+            raise
+    return result.status, result.payload
+
+
+async def _invoke_direct_method_async(service_conn_str, device_id, payload, response_timeout):
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(
+            _get_c2d_executor(), _invoke_direct_method, service_conn_str, device_id, payload, response_timeout
+        ),
+        # IoT Hub가 연결/응답 대기 시간을 지키므로 그보다 조금 길게 기다림
+        timeout=response_timeout + DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS + IOTHUB_SEND_TIMEOUT_SECONDS
+    )
+
+
+def _direct_method_timeout(req_body):
+    value = req_body.get("methodTimeoutSeconds", DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS)
+    try:
+        timeout = int(value)
+    except (TypeError, ValueError):
+        timeout = DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS
+    return max(5, min(timeout, DIRECT_METHOD_MAX_TIMEOUT_SECONDS))
+
+
+def _send_queued_message(device_id, message_str, command_id):
+    # 토큰이 없으면 전송 스레드에서 기다리지 않고 큐로 되돌림 (드레이너가 retry_after 뒤에 다시 꺼냄)
+    retry_after, limited_scope = _rate_limiter.try_acquire(device_id)
+    if retry_after:
+        target = "IoT Hub 전체" if limited_scope == "hub" else f"디바이스 {device_id}"
+        raise RetryLater(retry_after, f"{target} 전송 한도 초과")
+    _send_c2d_message(os.environ.get("IOTHUB_SERVICE_CONNECTION_STRING"), device_id, message_str, command_id)
+
+
+def _get_command_queue():
+    """명령 큐와 드레이너를 첫 사용 시 만들고 시작합니다."""
+    global _command_queue, _queue_drainer
+    if _command_queue is None:
+        with _command_queue_lock:
+            if _command_queue is None:
+                # 임대 시간은 전송 제한 시간보다 길게 (전송 중에는 드레이너가 계속 연장)
+                lease_seconds = max(DEFAULT_LEASE_SECONDS, 2 * IOTHUB_SEND_TIMEOUT_SECONDS)
+                queue = CommandQueue(COMMAND_QUEUE_PATH or DEFAULT_QUEUE_PATH, lease_seconds=lease_seconds)
+                # 밀린 큐가 실시간 전송(SendIoTCommand) 스레드를 차지하지 않도록 전용 풀 사용
+                executor = ThreadPoolExecutor(max_workers=max(1, COMMAND_QUEUE_MAX_WORKERS),
+                                              thread_name_prefix="c2d-queue")
+                _queue_drainer = CommandQueueDrainer(
+                    queue, _send_queued_message, executor,
+                    batch_size=COMMAND_QUEUE_BATCH_SIZE
+                )
+                _queue_drainer.start()
+                _command_queue = queue
+    return _command_queue
+
+
+def _coalesce_window_seconds(req_body):
+    value = req_body.get("coalesceMs", COMMAND_COALESCE_WINDOW_MS)
+    try:
+        window_ms = float(value)
+    except (TypeError, ValueError):
+        window_ms = COMMAND_COALESCE_WINDOW_MS
+    return max(0.0, min(window_ms, COMMAND_COALESCE_MAX_MS)) / 1000
+
+
+def _direct_send_only_option(req, req_body):
+    """
+    단일 디바이스 즉시 전송에서만 쓰는 요청 옵션 중 지정된 것의 이름 (없으면 None).
+    그룹 전송과 queue 모드는 이 옵션을 지원하지 않습니다. 요청에 명시한 값만 검사하며,
+    환경 변수 기본값(병합 창/전달 방식)은 단일 디바이스 즉시 전송에만 적용됩니다.
+    """
+    if "coalesceMs" in req_body and _coalesce_window_seconds(req_body) > 0:
+        return "coalesceMs"
+    if (req_body.get("delivery") or req.params.get("delivery")) == "direct":
+        return "delivery=direct"
+    return None
+
+
 def analyze_command(text):
     """
     텍스트를 분석하여 조명 제어 명령인지 판단합니다.
+    ("turn_on" / "turn_off" / None, 키워드 매칭은 intent_engine 공용 오토마톤 사용)
     """
-    if not text:
-        return None
-    
-    text_lower = text.lower()
-    
-    # 불 켜기 관련 키워드들
-    turn_on_keywords = ["turn on the light", "켜", "키", "on", "온"]
-    
-    # 불 끄기 관련 키워드들  
-    turn_off_keywords = ["turn off the light", "꺼", "끄", "off", "오프"]
-    
-    # 조명 관련 키워드들
-    light_keywords = ["불", "라이트", "light", "조명", "전등"]
-    
-    has_light_keyword = any(keyword in text_lower for keyword in light_keywords)
-    has_turn_on = any(keyword in text_lower for keyword in turn_on_keywords)
-    has_turn_off = any(keyword in text_lower for keyword in turn_off_keywords)
-    
-    if "turn on the light" in text_lower or (has_turn_on and not has_turn_off):
-        return "turn_on"
-    elif "turn off the light" in text_lower or (has_turn_off and not has_turn_on):
-        return "turn_off"
-    elif has_light_keyword and has_turn_on:
-        return "turn_on"
-    elif has_light_keyword and has_turn_off:
-        return "turn_off"
-    else:
-        return None
+    return analyze_light_command(text)
+
+def _room_group(text):
+    """문장에서 찾은 방이 하나뿐이면 그 방의 디바이스 그룹 이름, 아니면 None"""
+    rooms = DEFAULT_INTENT_INDEX.entities(DEFAULT_INTENT_INDEX.match(text))["rooms"]
+    return f"{ROOM_LABEL_PREFIX}{rooms[0]}" if len(rooms) == 1 else None
+
 
 @app.function_name(name="SendIoTCommand")
 @app.route(route="send-command", methods=["POST"])
-def send_iot_command(req: func.HttpRequest) -> func.HttpResponse:
+async def send_iot_command(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP 요청을 받아서 IoT Hub로 C2D 메시지를 전송하는 Azure Function
     """
+    with METRICS.time("total"):
+        idempotency_key = (req.headers.get("Idempotency-Key") or "").strip()
+        if not idempotency_key:
+            response = await _send_iot_command(req)
+        elif len(idempotency_key) > MAX_KEY_LENGTH:
+            response = _json_response(
+                {"success": False, "error": f"Idempotency-Key는 {MAX_KEY_LENGTH}자 이하여야 합니다."}, 400
+            )
+        else:
+            response = await _send_idempotent(idempotency_key, req)
+    METRICS.count_response("SendIoTCommand", response.status_code)
+    return response
+
+
+async def _send_idempotent(idempotency_key, req):
+    async def handler():
+        response = await _send_iot_command(req)
+        return response.status_code, response.get_body()
+
+    try:
+        (status_code, body), replayed = await _idempotency_cache.run(
+            idempotency_key, handler, cacheable=lambda result: result[0] < 500 and result[0] != 429,
+            fingerprint=_request_fingerprint(req)
+        )
+    except IdempotencyKeyConflict:
+        logging.warning(f"Idempotency-Key 재사용 (다른 요청 본문): {idempotency_key}")
+        return _json_response(
+            {"success": False, "error": "같은 Idempotency-Key로 다른 요청이 이미 처리되었습니다."}, 422
+        )
+    if replayed:
+        logging.info(f"중복 요청 (Idempotency-Key: {idempotency_key}) - 이전 응답 반환")
+    return func.HttpResponse(
+        body,
+        status_code=status_code,
+        headers={
+            "Content-Type": "application/json; charset=utf-8",
+            "Idempotent-Replayed": "true" if replayed else "false"
+        }
+    )
+
+
+def _request_fingerprint(req):
+    """Idempotency-Key 재사용 확인용 요청 해시 (재시도마다 시각이 바뀌는 trace는 제외)"""
+    try:
+        body = req.get_json()
+    except ValueError:
+        body = req.get_body().decode("utf-8", "replace")
+    if isinstance(body, dict):
+        body = {key: value for key, value in body.items() if key != "trace"}
+    canonical = json.dumps([body, sorted(req.params.items())], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def _send_iot_command(req):
     logging.info('SendIoTCommand HTTP trigger function processed a request.')
-    
+    received_at = time.time()
+
     try:
         # 요청 본문에서 JSON 데이터 파싱
         try:
-            req_body = req.get_json()
+            with METRICS.time("parse"):
+                req_body = req.get_json()
             if not req_body:
-                return func.HttpResponse(
-                    json.dumps({"success": False, "error": "요청 본문이 비어있습니다."}, ensure_ascii=False),
-                    status_code=400,
-                    headers={"Content-Type": "application/json; charset=utf-8"}
-                )
+                return _json_response({"success": False, "error": "요청 본문이 비어있습니다."}, 400)
         except ValueError as e:
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": f"JSON 파싱 오류: {str(e)}"}, ensure_ascii=False),
-                status_code=400,
-                headers={"Content-Type": "application/json; charset=utf-8"}
-            )
-        
-        # 필수 파라미터 확인
+            return _json_response({"success": False, "error": f"JSON 파싱 오류: {str(e)}"}, 400)
+
+        # 클라이언트가 보낸 trace(없으면 새로 생성)에 Function 단계 시각을 덧붙임
+        trace = PipelineTrace.from_dict(req_body.get('trace'), req.headers.get("X-Trace-Id"))
+        trace.mark("function_received", received_at)
+
+        # 필수 파라미터 확인 (deviceId 대신 group으로 그룹 전체에 보낼 수 있음)
         command = req_body.get('command')
         device_id = req_body.get('deviceId')
-        
+        group = req_body.get('group')
+
         if not command:
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": "command 파라미터가 필요합니다."}, ensure_ascii=False),
-                status_code=400,
-                headers={"Content-Type": "application/json; charset=utf-8"}
-            )
-            
-        if not device_id:
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": "deviceId 파라미터가 필요합니다."}, ensure_ascii=False),
-                status_code=400,
-                headers={"Content-Type": "application/json; charset=utf-8"}
-            )
-        
+            return _json_response({"success": False, "error": "command 파라미터가 필요합니다."}, 400)
+
+        if not device_id and not group:
+            # 문장에 방 이름이 하나 있으면 그 방 그룹(room:<방>)으로 보냄 ("거실 불 꺼" → room:living)
+            group = _room_group(command)
+            if not group:
+                return _json_response({"success": False, "error": "deviceId 파라미터가 필요합니다."}, 400)
+            logging.info(f"문장의 방 이름으로 그룹 결정: {command} -> {group}")
+
         # 환경 변수에서 IoT Hub 연결 문자열 가져오기
         service_conn_str = os.environ.get("IOTHUB_SERVICE_CONNECTION_STRING")
         if not service_conn_str:
             logging.error("IOTHUB_SERVICE_CONNECTION_STRING 환경 변수가 설정되지 않았습니다.")
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": "IoT Hub 연결 문자열이 설정되지 않았습니다."}, ensure_ascii=False),
-                status_code=500,
-                headers={"Content-Type": "application/json; charset=utf-8"}
-            )
-        
+            return _json_response({"success": False, "error": "IoT Hub 연결 문자열이 설정되지 않았습니다."}, 500)
+
         # 명령어 분석
-        command_action = analyze_command(command)
+        with METRICS.time("analyze"):
+            command_action = analyze_command(command)
+        trace.mark("function_analyzed")
         if command_action:
             # 표준화된 명령어로 변환
-            if command_action == "turn_on":
-                final_command = "turn on the light"
-            elif command_action == "turn_off":
-                final_command = "turn off the light"
-                
-            logging.info(f"명령 처리: {command} -> {final_command} -> 디바이스: {device_id}")
+            final_command = ACTION_COMMANDS[command_action]
+            logging.info(f"명령 처리: {command} -> {final_command} -> 디바이스: {device_id or f'그룹 {group}'}")
         else:
             logging.warning(f"알 수 없는 명령: {command}")
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": f"알 수 없는 조명 제어 명령입니다: {command}"}, ensure_ascii=False),
-                status_code=400,
-                headers={"Content-Type": "application/json; charset=utf-8"}
+            return _json_response({"success": False, "error": f"알 수 없는 조명 제어 명령입니다: {command}"}, 400)
+
+        mode = req_body.get("mode") or req.params.get("mode") or COMMAND_DEFAULT_MODE
+
+        if not device_id:
+            # 그룹 전송: queue 모드는 디바이스별로 큐에 넣음. 병합/다이렉트 메서드는 단일 디바이스 전용
+            unsupported = _direct_send_only_option(req, req_body)
+            if unsupported:
+                return _json_response({
+                    "success": False,
+                    "error": f"그룹 전송에서는 {unsupported}을(를) 지원하지 않습니다. deviceId로 보내세요."
+                }, 400)
+            return await _send_to_group(
+                command, command_action, group, req_body.get('timestamp'), service_conn_str, trace,
+                queue_mode=mode == "queue"
             )
-        
-        try:
-            # IoT Hub Registry Manager 생성
-            registry_manager = IoTHubRegistryManager(service_conn_str)
-            
-            # C2D 메시지 데이터 생성
-            message_data = {
-                "command": final_command,
+
+        command_id = uuid.uuid4().hex
+
+        # queue 모드: 큐에 넣고 바로 202 응답, 전송은 백그라운드 드레이너가 담당
+        if mode == "queue":
+            unsupported = _direct_send_only_option(req, req_body)
+            if unsupported:
+                return _json_response({
+                    "success": False,
+                    "error": f"queue 모드에서는 {unsupported}을(를) 지원하지 않습니다."
+                }, 400)
+            message_str = _build_c2d_message(final_command, command, req_body.get('timestamp'), trace.mark("queued"))
+            loop = asyncio.get_running_loop()
+            with METRICS.time("enqueue"):
+                command_queue = await loop.run_in_executor(None, _get_command_queue)
+                await loop.run_in_executor(
+                    None, command_queue.enqueue, command_id, device_id, message_str, final_command
+                )
+            _queue_drainer.notify()
+            logging.info(f"명령 접수 (queue): {command_id} -> 디바이스: {device_id}")
+            return _json_response({
+                "success": True,
+                "status": "queued",
+                "message": "명령이 접수되었습니다. 상태는 statusUrl로 확인하세요.",
+                "commandId": command_id,
+                "statusUrl": f"/api/command-status/{command_id}",
+                "traceId": trace.trace_id,
                 "originalCommand": command,
-                "timestamp": req_body.get('timestamp'),
-                "source": "AzureFunction"
-            }
-            message_str = json.dumps(message_data, ensure_ascii=False)
-            
-            # C2D 메시지 전송
-            registry_manager.send_c2d_message(
-                device_id, 
-                message_str, 
-                {
-                    "content-type": "application/json",
-                    "content-encoding": "utf-8"
-                }
-            )
-            
-            logging.info(f"IoT Hub로 메시지 전송 완료: {message_str}")
-            
-            # 성공 응답
-            return func.HttpResponse(
-                json.dumps({
+                "finalCommand": final_command,
+                "deviceId": device_id,
+                "action": "조명 켜기" if command_action == "turn_on" else "조명 끄기"
+            }, 202)
+
+        # 병합 창 안에 같은 디바이스로 더 최근 명령이 오면 이 명령은 보내지 않음
+        coalesce_window = _coalesce_window_seconds(req_body)
+        if coalesce_window > 0:
+            with METRICS.time("coalesce_wait"):
+                superseded_by = await _coalescer.wait_for_turn(device_id, command_id, coalesce_window)
+            if superseded_by:
+                logging.info(f"명령 병합: {command_id} -> {superseded_by} (디바이스: {device_id})")
+                return _json_response({
                     "success": True,
-                    "message": "IoT Hub로 메시지가 성공적으로 전송되었습니다.",
+                    "status": "coalesced",
+                    "message": "같은 디바이스로 더 최근 명령이 들어와 이 명령은 전송하지 않았습니다.",
+                    "commandId": command_id,
+                    "supersededBy": superseded_by,
                     "originalCommand": command,
                     "finalCommand": final_command,
                     "deviceId": device_id,
                     "action": "조명 켜기" if command_action == "turn_on" else "조명 끄기"
-                }, ensure_ascii=False),
-                status_code=200,
-                headers={"Content-Type": "application/json; charset=utf-8"}
+                }, 200)
+
+        # 디바이스/허브 전송 한도를 넘으면 SDK 호출 없이 바로 429
+        retry_after, limited_scope = _rate_limiter.try_acquire(device_id)
+        if retry_after:
+            return _rate_limited_response(device_id, retry_after, limited_scope)
+
+        try:
+            # direct 모드: 디바이스가 명령을 처리하고 응답할 때까지 기다림 (오프라인이면 C2D로 대체)
+            fallback_reason = None
+            delivery = req_body.get("delivery") or req.params.get("delivery") or COMMAND_DEFAULT_DELIVERY
+
+            # C2D 메시지 데이터 생성 및 전송 (trace 단계 이름은 전송 방식을 따름)
+            message_str = _build_c2d_message(
+                final_command, command, req_body.get('timestamp'),
+                trace.mark("direct_sent" if delivery == "direct" else "c2d_sent")
             )
-            
+
+            if delivery == "direct":
+                try:
+                    device_status, device_response = await _invoke_direct_method_async(
+                        service_conn_str, device_id, json.loads(message_str), _direct_method_timeout(req_body)
+                    )
+                except DeviceOfflineError:
+                    logging.warning(f"디바이스가 오프라인입니다. C2D 메시지로 대체 전송: {device_id}")
+                    fallback_reason = "device_offline"
+                    message_str = _build_c2d_message(
+                        final_command, command, req_body.get('timestamp'), trace.mark("c2d_sent")
+                    )
+                else:
+                    acknowledged = 200 <= device_status < 300
+                    logging.info(f"다이렉트 메서드 응답 ({device_id}): {device_status} {device_response}")
+                    return _json_response({
+                        "success": acknowledged,
+                        "status": "acknowledged" if acknowledged else "rejected",
+                        "delivery": "direct",
+                        "message": "디바이스가 명령을 처리했습니다." if acknowledged else "디바이스가 명령을 거부했습니다.",
+                        "commandId": command_id,
+                        "traceId": trace.trace_id,
+                        "deviceStatus": device_status,
+                        "deviceResponse": device_response,
+                        "originalCommand": command,
+                        "finalCommand": final_command,
+                        "deviceId": device_id,
+                        "action": "조명 켜기" if command_action == "turn_on" else "조명 끄기"
+                    }, 200 if acknowledged else 502)
+
+            await _send_c2d_message_async(service_conn_str, device_id, message_str, command_id)
+
+            logging.info(f"IoT Hub로 메시지 전송 완료: {message_str}")
+
+            # 성공 응답
+            response = {
+                "success": True,
+                "status": "sent",
+                "delivery": "c2d",
+                "message": "IoT Hub로 메시지가 성공적으로 전송되었습니다.",
+                "commandId": command_id,
+                "traceId": trace.trace_id,
+                "originalCommand": command,
+                "finalCommand": final_command,
+                "deviceId": device_id,
+                "action": "조명 켜기" if command_action == "turn_on" else "조명 끄기"
+            }
+            if fallback_reason:
+                response["fallback"] = fallback_reason
+            return _json_response(response, 200)
+
+        except PoolExhaustedError as pool_error:
+            logging.error(f"IoT Hub 클라이언트 풀 대기 시간 초과: {str(pool_error)}")
+            return _json_response({"success": False, "error": f"IoT Hub 연결이 모두 사용 중입니다: {str(pool_error)}"}, 503)
+
+        except asyncio.TimeoutError:
+            logging.error(f"IoT Hub 전송 시간 초과 ({IOTHUB_SEND_TIMEOUT_SECONDS}초) - 디바이스: {device_id}")
+            return _json_response({"success": False, "error": f"IoT Hub 전송 시간 초과 ({IOTHUB_SEND_TIMEOUT_SECONDS}초)"}, 504)
+
         except Exception as iot_error:
             logging.error(f"IoT Hub 통신 오류: {str(iot_error)}")
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": f"IoT Hub 통신 오류: {str(iot_error)}"}, ensure_ascii=False),
-                status_code=500,
-                headers={"Content-Type": "application/json; charset=utf-8"}
-            )
-        
+            return _json_response({"success": False, "error": f"IoT Hub 통신 오류: {str(iot_error)}"}, 500)
+
     except Exception as e:
         error_msg = f"Azure Function 실행 오류: {str(e)}"
         logging.error(error_msg)
-        return func.HttpResponse(
-            json.dumps({"success": False, "error": error_msg}, ensure_ascii=False),
-            status_code=500,
-            headers={"Content-Type": "application/json; charset=utf-8"}
-        )
+        return _json_response({"success": False, "error": error_msg}, 500)
+
+
+def _parse_batch_items(req_body):
+    """
+    배치 요청 본문을 (command, deviceId) 목록으로 변환합니다.
+
+    지원 형식:
+      {"commands": [{"command": "불 꺼", "deviceId": "light-1"}, ...]}
+      {"command": "불 꺼", "deviceIds": ["light-1", "light-2", ...]}
+    ({"command": ..., "group": ...} 형식은 그룹을 조회한 뒤 deviceIds 형식으로 처리)
+    """
+    if "commands" in req_body:
+        commands = req_body.get("commands")
+        if not isinstance(commands, list):
+            raise ValueError("commands 파라미터는 배열이어야 합니다.")
+        return [
+            (item.get("command"), item.get("deviceId")) if isinstance(item, dict) else (None, None)
+            for item in commands
+        ]
+
+    device_ids = req_body.get("deviceIds")
+    if not isinstance(device_ids, list):
+        raise ValueError("commands 또는 command + deviceIds 파라미터가 필요합니다.")
+    command = req_body.get("command")
+    return [(command, device_id) for device_id in device_ids]
+
+
+async def _send_batch_item(index, command, device_id, command_action, timestamp,
+                           service_conn_str, semaphore, trace=None):
+    result = {
+        "index": index,
+        "deviceId": device_id,
+        "originalCommand": command,
+        "success": False,
+    }
+    if not command or not device_id:
+        result["error"] = "command와 deviceId가 필요합니다."
+        return result
+    if not isinstance(command, str) or not isinstance(device_id, str):
+        result["error"] = "command와 deviceId는 문자열이어야 합니다."
+        return result
+    if not command_action:
+        result["error"] = f"알 수 없는 조명 제어 명령입니다: {command}"
+        return result
+
+    final_command = ACTION_COMMANDS[command_action]
+    result["finalCommand"] = final_command
+    message_str = _build_c2d_message(final_command, command, timestamp, trace)
+
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            retry_after, limited_scope = _rate_limiter.try_acquire(device_id)
+            if retry_after:
+                result["error"] = "IoT Hub 전체 전송 한도 초과" if limited_scope == "hub" else "디바이스 전송 한도 초과"
+                result["retryAfterMs"] = round(retry_after * 1000)
+                return result
+            result["messageId"] = await _send_c2d_message_async(service_conn_str, device_id, message_str)
+            result["success"] = True
+        except asyncio.TimeoutError:
+            logging.error(f"IoT Hub 전송 시간 초과 (디바이스: {device_id})")
+            result["error"] = f"IoT Hub 전송 시간 초과 ({IOTHUB_SEND_TIMEOUT_SECONDS}초)"
+        except Exception as iot_error:
+            logging.error(f"IoT Hub 통신 오류 (디바이스: {device_id}): {str(iot_error)}")
+            result["error"] = f"IoT Hub 통신 오류: {str(iot_error)}"
+        result["elapsedMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+async def _fan_out(items, actions, timestamp, service_conn_str, concurrency, trace=None):
+    """(command, deviceId) 목록을 최대 concurrency개씩 동시에 전송하고 항목별 결과를 반환합니다."""
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(
+        _send_batch_item(index, command, device_id, actions.get(command) if isinstance(command, str) else None,
+                         timestamp, service_conn_str, semaphore, trace)
+        for index, (command, device_id) in enumerate(items)
+    ))
+
+
+def _batch_response(results, started, **extra):
+    succeeded = sum(1 for result in results if result["success"])
+    logging.info(f"배치 전송 완료: {succeeded}/{len(results)} 성공")
+    return _json_response({
+        "success": succeeded == len(results),
+        **extra,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+        "results": results
+    }, 200 if succeeded == len(results) else 207)
+
+
+async def _resolve_device_group(service_conn_str, group):
+    """그룹 → 디바이스 ID 목록 (색인이 캐시에 없을 때만 IoT Hub 조회를 기다림)"""
+    resolver = get_device_group_resolver(
+        service_conn_str, DEVICE_GROUP_TTL_SECONDS, DEVICE_GROUP_MAX_STALE_SECONDS
+    )
+    loop = asyncio.get_running_loop()
+    with METRICS.time("group_resolve"):
+        return await loop.run_in_executor(None, resolver.resolve, str(group))
+
+
+async def _send_to_group(command, command_action, group, timestamp, service_conn_str, trace=None,
+                         queue_mode=False):
+    """
+    그룹에 속한 모든 디바이스로 같은 명령을 병렬 전송합니다.
+    queue_mode이면 디바이스마다 큐에 넣고 202로 응답합니다 (명령 ID는 디바이스별).
+    """
+    started = time.perf_counter()
+    try:
+        device_ids = await _resolve_device_group(service_conn_str, group)
+    except UnknownDeviceGroupError:
+        return _json_response({"success": False, "error": f"등록된 디바이스가 없는 그룹입니다: {group}"}, 404)
+    except Exception as iot_error:
+        logging.error(f"디바이스 그룹 조회 오류: {str(iot_error)}")
+        return _json_response({"success": False, "error": f"IoT Hub 통신 오류: {str(iot_error)}"}, 500)
+
+    if queue_mode:
+        return await _enqueue_group(command, command_action, group, device_ids, timestamp, trace)
+
+    items = [(command, device_id) for device_id in device_ids]
+    if trace is not None:
+        trace.mark("c2d_sent")
+    results = await _fan_out(
+        items, {command: command_action}, timestamp, service_conn_str, BATCH_MAX_CONCURRENCY, trace
+    )
+    return _batch_response(
+        results, started,
+        group=group,
+        traceId=trace.trace_id if trace else None,
+        originalCommand=command,
+        finalCommand=ACTION_COMMANDS[command_action],
+        action="조명 켜기" if command_action == "turn_on" else "조명 끄기"
+    )
+
+
+async def _enqueue_group(command, command_action, group, device_ids, timestamp, trace=None):
+    """그룹의 디바이스별 명령을 한 번에 큐에 넣습니다 (전송/재시도/속도 제한은 드레이너가 디바이스별로 처리)."""
+    final_command = ACTION_COMMANDS[command_action]
+    if trace is not None:
+        trace.mark("queued")
+    message_str = _build_c2d_message(final_command, command, timestamp, trace)
+    commands = [(uuid.uuid4().hex, device_id, message_str, final_command) for device_id in device_ids]
+    loop = asyncio.get_running_loop()
+    with METRICS.time("enqueue"):
+        command_queue = await loop.run_in_executor(None, _get_command_queue)
+        await loop.run_in_executor(None, command_queue.enqueue_many, commands)
+    _queue_drainer.notify()
+    logging.info(f"그룹 명령 접수 (queue): {group} -> 디바이스 {len(commands)}대")
+    return _json_response({
+        "success": True,
+        "status": "queued",
+        "message": "그룹의 디바이스별 명령이 접수되었습니다. 상태는 각 statusUrl로 확인하세요.",
+        "group": group,
+        "traceId": trace.trace_id if trace else None,
+        "originalCommand": command,
+        "finalCommand": final_command,
+        "action": "조명 켜기" if command_action == "turn_on" else "조명 끄기",
+        "total": len(commands),
+        "commands": [
+            {"deviceId": device_id, "commandId": command_id, "statusUrl": f"/api/command-status/{command_id}"}
+            for command_id, device_id, _, _ in commands
+        ]
+    }, 202)
+
+
+@app.function_name(name="SendIoTCommandBatch")
+@app.route(route="send-command-batch", methods=["POST"])
+async def send_iot_command_batch(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    여러 디바이스로 C2D 메시지를 동시에 전송하는 Azure Function
+    (동시 전송 수는 concurrency 파라미터 / BATCH_MAX_CONCURRENCY로 제한)
+    """
+    with METRICS.time("batch_total"):
+        response = await _send_iot_command_batch(req)
+    METRICS.count_response("SendIoTCommandBatch", response.status_code)
+    return response
+
+
+async def _send_iot_command_batch(req):
+    logging.info('SendIoTCommandBatch HTTP trigger function processed a request.')
+    started = time.perf_counter()
+
+    try:
+        service_conn_str = os.environ.get("IOTHUB_SERVICE_CONNECTION_STRING")
+        if not service_conn_str:
+            logging.error("IOTHUB_SERVICE_CONNECTION_STRING 환경 변수가 설정되지 않았습니다.")
+            return _json_response({"success": False, "error": "IoT Hub 연결 문자열이 설정되지 않았습니다."}, 500)
+
+        try:
+            req_body = req.get_json()
+            if not req_body:
+                return _json_response({"success": False, "error": "요청 본문이 비어있습니다."}, 400)
+            if req_body.get("group") and "commands" not in req_body:
+                device_ids = await _resolve_device_group(service_conn_str, req_body["group"])
+                req_body = dict(req_body, deviceIds=device_ids)
+            items = _parse_batch_items(req_body)
+        except ValueError as e:
+            return _json_response({"success": False, "error": f"요청 형식 오류: {str(e)}"}, 400)
+        except UnknownDeviceGroupError as e:
+            return _json_response({"success": False, "error": f"등록된 디바이스가 없는 그룹입니다: {str(e)}"}, 404)
+
+        if not items:
+            return _json_response({"success": False, "error": "전송할 명령이 없습니다."}, 400)
+        if len(items) > BATCH_MAX_ITEMS:
+            return _json_response({"success": False, "error": f"한 번에 최대 {BATCH_MAX_ITEMS}개까지 전송할 수 있습니다."}, 400)
+
+        try:
+            concurrency = int(req_body.get("concurrency", BATCH_MAX_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = BATCH_MAX_CONCURRENCY
+        concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+        # 같은 문장은 한 번만 분석 (문자열이 아닌 항목은 항목별 오류로 처리)
+        actions = {command: analyze_command(command) for command in {c for c, _ in items if isinstance(c, str) and c}}
+
+        results = await _fan_out(items, actions, req_body.get('timestamp'), service_conn_str, concurrency)
+        extra = {"group": req_body["group"]} if req_body.get("group") and "commands" not in req_body else {}
+        return _batch_response(results, started, **extra)
+
+    except Exception as e:
+        error_msg = f"Azure Function 실행 오류: {str(e)}"
+        logging.error(error_msg)
+        return _json_response({"success": False, "error": error_msg}, 500)
+
+def _receiver_identity_error(receiver_conn_str):
+    """수신 루프가 실제 디바이스 ID로 접속하려 하면 오류 메시지, 아니면 None"""
+    receiver_id = parse_connection_string(receiver_conn_str).get("DeviceId")
+    physical_conn_str = os.environ.get("IOTHUB_DEVICE_CONNECTION_STRING")
+    if physical_conn_str and parse_connection_string(physical_conn_str).get("DeviceId") == receiver_id:
+        return (f"IOTHUB_RECEIVER_CONNECTION_STRING이 실제 디바이스({receiver_id})와 같은 ID입니다. "
+                "수신 루프 전용 디바이스 ID를 등록해 사용하세요.")
+    return None
+
+
+def _start_delivery_listeners(receiver_conn_str, service_conn_str):
+    """
+    C2D 수신 루프(전용 ID가 설정된 경우)와 전달 피드백 소비자를 첫 호출 때 시작합니다
+    (이미 실행 중이면 그대로 둠).
+    """
+    global _device_receiver, _feedback_consumer
+    with _receiver_lock:
+        if receiver_conn_str and _device_receiver is None:
+            _device_receiver = DeviceMessageReceiver(receiver_conn_str, _delivery_tracker)
+        if _device_receiver is not None:
+            _device_receiver.start()
+        if service_conn_str and _feedback_consumer is None:
+            _feedback_consumer = FeedbackConsumer(service_conn_str, _delivery_tracker)
+        if _feedback_consumer is not None:
+            _feedback_consumer.start()
+
 
 @app.function_name(name="ReceiveIoTMessages")
 @app.route(route="receive-messages", methods=["GET", "POST"])
 def receive_iot_messages(req: func.HttpRequest) -> func.HttpResponse:
     """
-    IoT Hub로부터 C2D 메시지 수신을 시뮬레이션하는 엔드포인트 (테스트용)
+    수신 루프 전용 디바이스(IOTHUB_RECEIVER_CONNECTION_STRING)로 C2D 메시지를 받는 수신 루프와
+    IoT Hub 전달 피드백 소비자를 (처음 호출 시) 시작하고, 메시지별 전송 → 수신(delivered) → 완료(completed)
+    시각을 반환합니다. 실제 디바이스로 보낸 메시지의 완료 시각은 전달 피드백으로 기록됩니다.
+    ?messageId=<commandId>로 한 메시지만 조회합니다.
     """
     logging.info('ReceiveIoTMessages HTTP trigger function processed a request.')
-    
+
     try:
-        device_conn_str = os.environ.get("IOTHUB_DEVICE_CONNECTION_STRING")
-        if not device_conn_str:
-            return func.HttpResponse(
-                json.dumps({"success": False, "error": "IOTHUB_DEVICE_CONNECTION_STRING 환경 변수가 필요합니다."}, ensure_ascii=False),
-                status_code=500,
-                headers={"Content-Type": "application/json; charset=utf-8"}
-            )
-        
-        return func.HttpResponse(
-            json.dumps({
-                "success": True,
-                "message": "C2D 메시지 수신 기능은 별도의 디바이스 클라이언트에서 실행하세요.",
-                "info": "이 엔드포인트는 테스트용입니다."
-            }, ensure_ascii=False),
-            status_code=200,
-            headers={"Content-Type": "application/json; charset=utf-8"}
-        )
-        
+        service_conn_str = os.environ.get("IOTHUB_SERVICE_CONNECTION_STRING")
+        receiver_conn_str = IOTHUB_RECEIVER_CONNECTION_STRING
+        if not receiver_conn_str and not service_conn_str:
+            return _json_response({
+                "success": False,
+                "error": "IOTHUB_RECEIVER_CONNECTION_STRING 또는 IOTHUB_SERVICE_CONNECTION_STRING 환경 변수가 필요합니다."
+            }, 500)
+        if receiver_conn_str:
+            identity_error = _receiver_identity_error(receiver_conn_str)
+            if identity_error:
+                logging.error(identity_error)
+                return _json_response({"success": False, "error": identity_error}, 500)
+
+        _start_delivery_listeners(receiver_conn_str, service_conn_str)
+
+        message_id = req.params.get("messageId")
+        if message_id:
+            record = _delivery_tracker.get(message_id)
+            if not record:
+                return _json_response({"success": False, "error": f"추적 중인 메시지가 아닙니다: {message_id}"}, 404)
+            return _json_response({"success": True, "delivery": record}, 200)
+
+        try:
+            limit = max(0, min(int(req.params.get("limit", "20")), 200))
+        except ValueError:
+            limit = 20
+        return _json_response({
+            "success": True,
+            "receiver": _device_receiver.status() if _device_receiver else None,
+            "feedback": _feedback_consumer.status() if _feedback_consumer else None,
+            "receivedMessages": _device_receiver.recent_messages()[:limit] if _device_receiver else [],
+            "deliveries": _delivery_tracker.recent(limit)
+        }, 200)
+
     except Exception as e:
         error_msg = f"메시지 수신 오류: {str(e)}"
         logging.error(error_msg)
-        return func.HttpResponse(
-            json.dumps({"success": False, "error": error_msg}, ensure_ascii=False),
-            status_code=500,
-            headers={"Content-Type": "application/json; charset=utf-8"}
-        )
\ No newline at end of file
+        return _json_response({"success": False, "error": error_msg}, 500)
+
+
+@app.function_name(name="GetCommandStatus")
+@app.route(route="command-status/{commandId}", methods=["GET"])
+def get_command_status(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    queue 모드로 접수된 명령의 처리 상태(queued / sending / accepted / failed)를 반환합니다.
+    accepted는 IoT Hub가 메시지를 받아들였다는 뜻입니다(디바이스 수신은 /api/receive-messages로 확인).
+    """
+    command_id = req.route_params.get("commandId")
+    try:
+        record = _get_command_queue().get(command_id)
+    except Exception as e:
+        error_msg = f"명령 상태 조회 오류: {str(e)}"
+        logging.error(error_msg)
+        return _json_response({"success": False, "error": error_msg}, 500)
+
+    if not record:
+        return _json_response({"success": False, "error": f"알 수 없는 명령 ID입니다: {command_id}"}, 404)
+
+    return _json_response({
+        "success": True,
+        "commandId": record["command_id"],
+        "status": record["status"],
+        "deviceId": record["device_id"],
+        "finalCommand": record["final_command"],
+        "attempts": record["attempts"],
+        "error": record["error"],
+        "createdAt": record["created_at"],
+        "updatedAt": record["updated_at"],
+        "acceptedAt": record["accepted_at"]
+    }, 200)
+
+
+def _collect_runtime_metrics():
+    """명령 분석 캐시와 IoT Hub 클라이언트 풀 상태"""
+    cache = DEFAULT_INTENT_INDEX.stats()
+    pool = get_registry_manager_pool().stats()
+    metrics = [
+        ("intent_cache_hits_total", "counter", "명령 분석 캐시 적중 수", [({}, cache["hits"])]),
+        ("intent_cache_misses_total", "counter", "명령 분석 캐시 미스 수", [({}, cache["misses"])]),
+        ("intent_cache_evictions_total", "counter", "명령 분석 캐시 제거 수", [({}, cache["evictions"])]),
+        ("intent_cache_entries", "gauge", "명령 분석 캐시 항목 수", [({}, cache["size"])]),
+        ("intent_vocabulary_labels", "gauge", "의도 어휘 키워드 라벨 수", [({}, cache["labels"])]),
+        ("intent_vocabulary_reloads_total", "counter", "의도 어휘 파일을 다시 불러온 횟수", [({}, cache["reloads"])]),
+        ("iothub_pool_clients", "gauge", "IoT Hub 클라이언트 풀 상태",
+         [({"state": "total"}, pool["size"]), ({"state": "idle"}, pool["idle"])]),
+    ]
+    idempotency = _idempotency_cache.stats()
+    metrics.append(("idempotency_replays_total", "counter", "Idempotency-Key 중복으로 이전 응답을 반환한 횟수",
+                    [({}, idempotency["replays"])]))
+    metrics.append(("idempotency_cache_entries", "gauge", "보관 중인 Idempotency-Key 응답 수",
+                    [({}, idempotency["size"])]))
+    limiter = _rate_limiter.stats()
+    metrics.append(("rate_limit_rejections_total", "counter", "전송 속도 제한으로 거절한 요청 수",
+                    [({"scope": scope}, count) for scope, count in sorted(limiter["rejections"].items())]))
+    metrics.append(("rate_limit_device_buckets", "gauge", "디바이스 토큰 버킷 수 (state=throttled: 토큰 부족)",
+                    [({"state": "total"}, limiter["deviceBuckets"]),
+                     ({"state": "throttled"}, limiter["throttledDevices"])]))
+    if limiter["hubTokens"] is not None:
+        metrics.append(("rate_limit_hub_tokens", "gauge", "허브 전체 토큰 버킷의 남은 토큰 수",
+                        [({}, round(limiter["hubTokens"], 3))]))
+    if _command_queue is not None:
+        counts = _command_queue.counts()
+        metrics.append(("command_queue_commands", "gauge", "명령 큐 상태별 명령 수",
+                        [({"status": status}, count) for status, count in sorted(counts.items())]))
+    return metrics
+
+
+METRICS.register_collector(_collect_runtime_metrics)
+
+
+@app.function_name(name="Metrics")
+@app.route(route="metrics", methods=["GET"])
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    단계별 지연 시간(p50/p95/p99)과 상태 코드별 응답 수를 Prometheus 텍스트 형식으로 반환합니다.
+    (워커 프로세스 단위 지표)
+    """
+    return func.HttpResponse(
+        METRICS.render_prometheus(),
+        status_code=200,
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
@@ -0,0 +1,114 @@
+"""
+Azure Function 인프로세스 지표 수집 (Prometheus 텍스트 형식)
+
+SendIoTCommand의 단계별 지연 시간(JSON 파싱, 명령 분석, IoT Hub 클라이언트 획득, C2D 전송)과
+라우트/상태 코드별 응답 수를 워커 프로세스 메모리에 모아 /metrics 라우트로 내보냅니다.
+지연 시간은 최근 샘플 창(window)에서 p50/p95/p99를 계산하는 summary로 노출합니다.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_WINDOW_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "iot_function"
+
+
+class LatencyWindow:
+    """최근 window_size개 샘플로 분위수를 계산하고, 누적 합계/개수를 유지합니다."""
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE):
+        self._samples = deque(maxlen=window_size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        samples = sorted(self._samples)
+        if not samples:
+            return {q: float("nan") for q in quantiles}
+        last = len(samples) - 1
+        return {q: samples[min(last, int(q * len(samples)))] for q in quantiles}
+
+
+class MetricsRegistry:
+    """스레드 안전한 지연 시간/응답 수 집계기"""
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE):
+        self._window_size = window_size
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._responses = {}
+        self._collectors = []
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            window = self._stages.get(stage)
+            if window is None:
+                window = self._stages[stage] = LatencyWindow(self._window_size)
+            window.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count_response(self, route, status_code):
+        key = (route, int(status_code))
+        with self._lock:
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def register_collector(self, collector):
+        """
+        render_prometheus() 때 호출할 수집 함수를 등록합니다.
+        collector()는 (이름, 유형, 설명, [(라벨 dict, 값), ...]) 튜플 목록을 반환합니다.
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                stage: {"count": window.count, "sum": window.total, "quantiles": window.quantiles()}
+                for stage, window in self._stages.items()
+            }
+            responses = dict(self._responses)
+        return stages, responses
+
+    def render_prometheus(self):
+        stages, responses = self.snapshot()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_latency_seconds 요청 처리 단계별 지연 시간 (최근 {self._window_size}개 샘플 기준 분위수)",
+            f"# TYPE {METRIC_PREFIX}_stage_latency_seconds summary",
+        ]
+        for stage in sorted(stages):
+            data = stages[stage]
+            for q, value in data["quantiles"].items():
+                lines.append(f'{METRIC_PREFIX}_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_seconds_sum{{stage="{stage}"}} {data["sum"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_seconds_count{{stage="{stage}"}} {data["count"]}')
+
+        lines.append(f"# HELP {METRIC_PREFIX}_responses_total 라우트/상태 코드별 응답 수")
+        lines.append(f"# TYPE {METRIC_PREFIX}_responses_total counter")
+        for (route, status_code), count in sorted(responses.items()):
+            lines.append(f'{METRIC_PREFIX}_responses_total{{route="{route}",status_code="{status_code}"}} {count}')
+
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+                for labels, value in samples:
+                    label_text = ",".join(f'{key}="{val}"' for key, val in sorted(labels.items()))
+                    label_part = f"{{{label_text}}}" if label_text else ""
+                    lines.append(f"{METRIC_PREFIX}_{name}{label_part} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
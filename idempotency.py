@@ -0,0 +1,104 @@
+"""
+Idempotency-Key 기반 중복 요청 제거
+
+클라이언트는 발화 하나(명령 하나)마다 키를 만들어 Idempotency-Key 헤더로 보내고, 시간 초과나
+연결 오류로 다시 보낼 때도 같은 키를 씁니다. 같은 키로 다시 온 요청은 IoT Hub를 거치지 않고
+처음 요청의 응답을 그대로 돌려받습니다. 처음 요청이 아직 처리 중이면 그 결과를 기다립니다.
+
+응답은 TTL 동안, 최대 max_entries개까지(오래된 것부터 제거) 워커 프로세스 메모리에 보관합니다.
+5xx 응답은 보관하지 않으므로 서버 오류 뒤의 재시도는 다시 처리됩니다.
+응답과 함께 요청 지문(본문 해시)을 보관해, 같은 키가 다른 요청에 재사용되면 IdempotencyKeyConflict를 냅니다.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_MAX_ENTRIES = 10000
+MAX_KEY_LENGTH = 200
+
+
+class IdempotencyKeyConflict(Exception):
+    """같은 Idempotency-Key로 보관된 요청과 다른 요청이 온 경우"""
+
+
+class IdempotencyCache:
+    """키 → 보관된 응답의 TTL/개수 제한 캐시와 처리 중인 요청 목록"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self._ttl = ttl_seconds
+        self._max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.evictions = 0
+
+    async def run(self, key, handler, cacheable=lambda result: True, fingerprint=None):
+        """
+        key로 처음 온 요청이면 await handler()를 실행하고, cacheable(결과)이면 fingerprint와 함께 보관합니다.
+        (결과, 중복 여부)를 반환합니다. 보관된 fingerprint와 다르면 IdempotencyKeyConflict.
+        """
+        while True:
+            with self._lock:
+                entry = self._get(key)
+                if entry is not None:
+                    stored_fingerprint, result = entry
+                    if stored_fingerprint != fingerprint:
+                        raise IdempotencyKeyConflict(key)
+                    self.replays += 1
+                    return result, True
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    waiter = self._inflight[key] = asyncio.get_running_loop().create_future()
+                    break
+
+            # 같은 키의 처음 요청이 끝날 때까지 기다린 뒤 캐시를 다시 확인
+            # (처음 요청이 보관되지 않는 결과로 끝났다면 이 요청이 다시 처리)
+            await asyncio.shield(waiter)
+
+        try:
+            result = await handler()
+            if cacheable(result):
+                with self._lock:
+                    self._store(key, fingerprint, result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, fingerprint, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return fingerprint, result
+
+    def _store(self, key, fingerprint, result):
+        self._entries[key] = (time.monotonic() + self._ttl, fingerprint, result)
+        self._entries.move_to_end(key)
+        now = time.monotonic()
+        # 가장 오래된 항목부터 만료된 것과 개수 초과분을 제거
+        while self._entries:
+            oldest_key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self._max_entries:
+                break
+            del self._entries[oldest_key]
+            if expires_at > now:
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "inflight": len(self._inflight),
+                "maxEntries": self._max_entries,
+                "replays": self.replays,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,501 @@
+"""
+조명 제어 의도(intent) 분석 엔진
+
+Azure Function과 음성/텍스트 클라이언트가 함께 사용합니다.
+동작(켜기/끄기 …), 디바이스, 방, 예약 키워드는 어휘 파일(intent_vocabulary.json)에 선언하고,
+불러올 때 모든 키워드를 하나의 Aho-Corasick 오토마톤(실패 링크가 있는 접두사 트라이)으로
+컴파일합니다. 입력 문장을 한 번만 훑어 모든 라벨의 일치 여부를 한꺼번에 구하므로,
+디바이스와 동사가 수백 개로 늘어나도 문장당 비용은 문장 길이에만 비례합니다.
+
+음성 인식 결과는 같은 문장이 자주 반복되므로("불 켜줘", "불 꺼", "turn off"), 정규화한
+문장 → 분석 결과를 크기 제한이 있는 LRU 캐시(IntentCache)에 보관합니다.
+어휘 파일이 바뀌면 IntentIndex가 다시 컴파일하고 캐시를 비웁니다(프로세스 재시작 불필요).
+
+동작/디바이스/방 결정(IntentResolver)도 컴파일할 때 라벨 종류별 비트마스크를 미리 만들어 두고,
+훑은 결과 비트마스크에서 바로 구하므로 어휘 크기가 아니라 일치한 라벨 수에만 비례합니다.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# 정규화 시 문장 끝에서 제거하는 어미/조사와 문장 부호
+TRAILING_PARTICLES = ("주세요", "줄래요", "줄래", "줘요", "줘", "요")
+TRAILING_PUNCTUATION = ".,!?~… "
+
+DEFAULT_INTENT_CACHE_SIZE = 256
+# 비트마스크 → 라벨 집합 캐시 크기 (라벨 조합 수는 라벨 수에 따라 크게 늘 수 있음)
+DEFAULT_LABEL_SET_CACHE_SIZE = 1024
+DEFAULT_VOCABULARY_PATH = os.environ.get(
+    "INTENT_VOCABULARY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_vocabulary.json")
+)
+# 어휘 파일 변경 여부를 확인하는 최소 간격(초). 0이면 자동으로 다시 불러오지 않음
+DEFAULT_RELOAD_INTERVAL_SECONDS = float(os.environ.get("INTENT_VOCABULARY_RELOAD_SECONDS", "5"))
+ROOM_LABEL_PREFIX = "room:"
+
+
+def normalize_command_text(text):
+    """
+    캐시 키로 쓰기 위해 문장을 정규화합니다.
+    소문자 변환, 공백 정리, 끝의 문장 부호와 "줘/요/주세요" 같은 어미를 제거합니다.
+    ("불 켜줘!" / "불  켜 줘요" / "불 켜" → "불 켜")
+    """
+    if not text:
+        return ""
+    text = " ".join(text.lower().split()).rstrip(TRAILING_PUNCTUATION)
+    while text.endswith(TRAILING_PARTICLES):
+        particle = next(p for p in TRAILING_PARTICLES if text.endswith(p))
+        if len(text) <= len(particle):
+            break
+        text = text[:-len(particle)].rstrip(TRAILING_PUNCTUATION)
+    return text
+
+
+def _iter_bits(mask):
+    """비트마스크의 켜진 비트를 낮은 것부터 하나씩 (켜진 비트 수만큼만 반복)"""
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+class LabelSet(frozenset):
+    """일치한 라벨 집합 + 만든 매처의 비트마스크 (IntentResolver가 라벨을 다시 훑지 않도록)"""
+
+    __slots__ = ("mask", "matcher")
+
+    def __new__(cls, labels, mask, matcher):
+        label_set = super().__new__(cls, labels)
+        label_set.mask = mask
+        label_set.matcher = matcher
+        return label_set
+
+
+class KeywordMatcher:
+    """
+    라벨별 키워드 목록을 Aho-Corasick 오토마톤으로 컴파일한 매처
+
+    scan()은 문장에서 일치한 라벨들의 비트마스크를, match()는 라벨 집합(LabelSet)을 반환합니다.
+    라벨 비트는 keyword_groups에 선언한 순서대로 낮은 비트부터 배정합니다.
+    키워드도 normalize_command_text()로 정규화해서 컴파일하므로, 정규화된 문장을 넣어도
+    원래 문장과 같은 라벨이 일치합니다(예: "알려줘" → "알려").
+    """
+
+    def __init__(self, keyword_groups, label_set_cache_size=DEFAULT_LABEL_SET_CACHE_SIZE):
+        self.labels = tuple(keyword_groups)
+        self._bits = {label: 1 << index for index, label in enumerate(self.labels)}
+        self._full_mask = (1 << len(self.labels)) - 1
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [0]
+        self._label_set_cache_size = max(0, label_set_cache_size)
+        self._label_sets = OrderedDict()
+        self._label_sets_lock = threading.Lock()
+
+        for label, keywords in keyword_groups.items():
+            for keyword in keywords:
+                self._add_keyword(normalize_command_text(keyword), self._bits[label])
+        self._build_fail_links()
+
+    def _add_keyword(self, keyword, bit):
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(0)
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._out[state] |= bit
+
+    def _build_fail_links(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(ch, 0)
+                fail[next_state] = target if target != next_state else 0
+                # 접미사로 끝나는 키워드의 라벨도 함께 출력
+                out[next_state] |= out[fail[next_state]]
+
+    def scan(self, text):
+        """소문자 변환된 문장을 한 번 훑어 일치한 라벨 비트마스크를 반환합니다."""
+        goto, fail, out = self._goto, self._fail, self._out
+        full_mask = self._full_mask
+        state = 0
+        mask = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                mask |= out[state]
+                if mask == full_mask:
+                    break
+        return mask
+
+    def match(self, text):
+        """문장에서 일치한 라벨 집합(frozenset)을 반환합니다."""
+        if not text:
+            return frozenset()
+        mask = self.scan(text.lower())
+        with self._label_sets_lock:
+            labels = self._label_sets.get(mask)
+            if labels is not None:
+                self._label_sets.move_to_end(mask)
+                return labels
+        labels = LabelSet((self.label_of(bit) for bit in _iter_bits(mask)), mask, self)
+        if self._label_set_cache_size:
+            with self._label_sets_lock:
+                self._label_sets[mask] = labels
+                while len(self._label_sets) > self._label_set_cache_size:
+                    self._label_sets.popitem(last=False)
+        return labels
+
+    def bit(self, label):
+        """라벨의 비트 (어휘에 없는 라벨이면 0)"""
+        return self._bits.get(label, 0)
+
+    def label_of(self, bit):
+        return self.labels[bit.bit_length() - 1]
+
+    def mask_of(self, labels):
+        """라벨 집합 → 비트마스크 (LabelSet이 아닌 집합을 받았을 때)"""
+        if isinstance(labels, LabelSet) and labels.matcher is self:
+            return labels.mask
+        mask = 0
+        for label in labels:
+            mask |= self._bits.get(label, 0)
+        return mask
+
+
+class IntentCache:
+    """
+    정규화된 문장 → 키워드 일치 결과를 보관하는 크기 제한 LRU 캐시
+    (정규화 전 원문도 별칭으로 함께 보관해, 똑같은 문장은 정규화 없이 바로 반환)
+
+    KeywordMatcher와 같은 match() 인터페이스를 제공하므로 매처 대신 그대로 쓸 수 있습니다.
+    stats()로 적중/미스/제거 횟수를 확인해 캐시 크기를 정할 수 있습니다.
+    """
+
+    def __init__(self, matcher, maxsize=DEFAULT_INTENT_CACHE_SIZE):
+        self.matcher = matcher
+        self.maxsize = max(0, maxsize)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def match(self, text):
+        if not text:
+            return frozenset()
+
+        # 1) 원문 그대로 캐시에 있으면 정규화 비용도 건너뜀
+        with self._lock:
+            flags = self._entries.get(text)
+            if flags is not None:
+                self._entries.move_to_end(text)
+                self.hits += 1
+                return flags
+
+        # 2) 정규화한 문장으로 조회, 없으면 매처로 분석
+        key = normalize_command_text(text)
+        with self._lock:
+            flags = self._entries.get(key)
+            if flags is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if flags is None:
+            flags = self.matcher.match(key)
+
+        if self.maxsize:
+            with self._lock:
+                self._store(key, flags)
+                if text != key:
+                    self._store(text, flags)
+        return flags
+
+    def _store(self, key, flags):
+        self._entries[key] = flags
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class Vocabulary:
+    """
+    어휘 파일 내용(동작, 디바이스, 방, 기타 키워드 그룹)
+
+    라벨 규칙:
+      동작 이름(turn_on)        - 동의어 / "<동작>_phrase" - 표준 문장(다른 키워드보다 우선)
+      디바이스 이름(light)      - 동의어
+      "room:<방 이름>"          - 방 동의어 (디바이스 그룹 "room:<값>"과 같은 이름)
+      keywordGroups의 이름      - 예약/취소/확인 등
+    """
+
+    def __init__(self, data):
+        self.version = data.get("version")
+        self.actions = OrderedDict(
+            (name, {
+                "command": spec["command"],
+                "phrases": list(spec.get("phrases", [])),
+                "synonyms": list(spec.get("synonyms", [])),
+            })
+            for name, spec in data.get("actions", {}).items()
+        )
+        self.devices = OrderedDict(
+            (name, {
+                "synonyms": list(spec.get("synonyms", [])),
+                "defaultAction": spec.get("defaultAction"),
+            })
+            for name, spec in data.get("devices", {}).items()
+        )
+        self.rooms = OrderedDict((name, list(synonyms)) for name, synonyms in data.get("rooms", {}).items())
+        self.keyword_groups_extra = {
+            label: list(keywords) for label, keywords in data.get("keywordGroups", {}).items()
+        }
+        self._validate()
+
+    def _validate(self):
+        if not self.actions:
+            raise ValueError("어휘 파일에 actions가 없습니다.")
+        labels = list(self.actions) + [f"{name}_phrase" for name in self.actions] + list(self.devices)
+        labels += list(self.keyword_groups_extra)
+        duplicates = {label for label in labels if labels.count(label) > 1}
+        if duplicates:
+            raise ValueError(f"어휘 파일의 라벨 이름이 겹칩니다: {sorted(duplicates)}")
+        for name, spec in self.devices.items():
+            if spec["defaultAction"] and spec["defaultAction"] not in self.actions:
+                raise ValueError(f"디바이스 {name}의 defaultAction이 actions에 없습니다: {spec['defaultAction']}")
+
+    @property
+    def commands(self):
+        """동작 이름 → IoT 디바이스로 보내는 표준 명령어"""
+        return {name: spec["command"] for name, spec in self.actions.items()}
+
+    def keyword_groups(self):
+        """라벨 → 키워드 목록"""
+        groups = {}
+        for name, spec in self.actions.items():
+            groups[f"{name}_phrase"] = list(spec["phrases"])
+        for name, spec in self.actions.items():
+            groups[name] = list(spec["synonyms"])
+        for name, spec in self.devices.items():
+            groups[name] = list(spec["synonyms"])
+        for name, synonyms in self.rooms.items():
+            groups[f"{ROOM_LABEL_PREFIX}{name}"] = list(synonyms)
+        for label, keywords in self.keyword_groups_extra.items():
+            groups[label] = list(keywords)
+        return groups
+
+
+class IntentResolver:
+    """
+    라벨 일치 결과 → 동작 이름 / 디바이스·방 이름
+
+    어휘의 라벨 종류(표준 문장, 동작, 디바이스, 방)를 매처의 비트 배치에 맞춘 비트마스크로 미리
+    계산해 두고, 결정은 일치 비트마스크의 비트 연산과 켜진 비트 조회만으로 합니다.
+    라벨 비트는 선언 순서대로 배정되므로 가장 낮은 비트가 먼저 선언된 동작/디바이스입니다.
+    """
+
+    def __init__(self, vocabulary, matcher):
+        self._matcher = matcher
+        self._phrase_mask = self._action_mask = self._device_mask = self._room_mask = 0
+        self._default_device_mask = 0
+        self._names = {}
+        self._default_actions = {}
+        for name in vocabulary.actions:
+            phrase_bit = matcher.bit(f"{name}_phrase")
+            action_bit = matcher.bit(name)
+            self._phrase_mask |= phrase_bit
+            self._action_mask |= action_bit
+            self._names[phrase_bit] = self._names[action_bit] = name
+        for name, spec in vocabulary.devices.items():
+            bit = matcher.bit(name)
+            self._device_mask |= bit
+            self._names[bit] = name
+            if spec["defaultAction"]:
+                self._default_device_mask |= bit
+                self._default_actions[bit] = spec["defaultAction"]
+        for name in vocabulary.rooms:
+            bit = matcher.bit(f"{ROOM_LABEL_PREFIX}{name}")
+            self._room_mask |= bit
+            self._names[bit] = name
+
+    def resolve_action(self, flags, use_default_action=False):
+        """
+        키워드 일치 결과로 동작 이름(또는 None)을 결정합니다.
+          1) 표준 문장("turn off the light")이 있으면 그 동작
+          2) 동작 키워드가 하나뿐이면 그 동작
+          3) 여러 동작이 섞여 있으면 디바이스 키워드가 있을 때만 먼저 선언된 동작
+          4) use_default_action=True 이고 디바이스 키워드만 있으면 그 디바이스의 defaultAction
+        """
+        mask = self._matcher.mask_of(flags)
+        phrases = mask & self._phrase_mask
+        if phrases:
+            return self._names[phrases & -phrases]
+        actions = mask & self._action_mask
+        if actions and (actions & (actions - 1) == 0 or mask & self._device_mask):
+            return self._names[actions & -actions]
+        if use_default_action and not actions:
+            devices = mask & self._default_device_mask
+            if devices:
+                return self._default_actions[devices & -devices]
+        return None
+
+    def entities(self, flags):
+        """문장에서 찾은 디바이스/방 이름 (선언 순서)"""
+        mask = self._matcher.mask_of(flags)
+        return {
+            "devices": [self._names[bit] for bit in _iter_bits(mask & self._device_mask)],
+            "rooms": [self._names[bit] for bit in _iter_bits(mask & self._room_mask)],
+        }
+
+
+def load_vocabulary(path=DEFAULT_VOCABULARY_PATH):
+    with open(path, encoding="utf-8") as f:
+        return Vocabulary(json.load(f))
+
+
+class IntentIndex:
+    """
+    어휘 파일 → 컴파일된 매처(KeywordMatcher) + 캐시(IntentCache)
+
+    match()와 resolve()를 제공하므로 analyze_light_command()에 넘기면 이 인덱스의 어휘로 분석합니다.
+    reload_interval초마다 파일 수정 시각을 확인해 바뀌었으면 다시 컴파일하고 통째로 교체합니다
+    (교체 전까지는 이전 인덱스로 응답, 새 파일에 오류가 있으면 이전 인덱스를 계속 사용).
+    """
+
+    def __init__(self, path=DEFAULT_VOCABULARY_PATH, cache_size=DEFAULT_INTENT_CACHE_SIZE, reload_interval=DEFAULT_RELOAD_INTERVAL_SECONDS):
+        self.path = path
+        self._cache_size = cache_size
+        self._reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._failed_mtime = None
+        self.reloads = 0
+        self._state = self._compile()
+
+    def _compile(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        vocabulary = load_vocabulary(self.path)
+        matcher = KeywordMatcher(vocabulary.keyword_groups())
+        return vocabulary, IntentCache(matcher, self._cache_size), IntentResolver(vocabulary, matcher), mtime
+
+    def reload(self):
+        """어휘 파일을 다시 불러와 인덱스와 캐시를 교체합니다."""
+        with self._reload_lock:
+            state = self._compile()
+            self._state = state
+            self.reloads += 1
+            if self.path == DEFAULT_VOCABULARY_PATH:
+                _replace_action_commands(state[0].commands)
+        logging.info(f"의도 어휘 다시 불러옴: {self.path} (키워드 라벨 {len(state[1].matcher.labels)}개)")
+
+    def _maybe_reload(self):
+        if not self._reload_interval:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self._reload_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            # 같은 파일로 이미 실패했으면 파일이 다시 바뀔 때까지 시도하지 않음
+            if mtime in (self._state[3], self._failed_mtime):
+                return
+            self._failed_mtime = mtime
+            self.reload()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.error(f"의도 어휘 다시 불러오기 실패 (이전 어휘 유지): {str(e)}")
+
+    @property
+    def vocabulary(self):
+        return self._state[0]
+
+    @property
+    def matcher(self):
+        return self._state[1].matcher
+
+    @property
+    def commands(self):
+        return self._state[0].commands
+
+    def match(self, text):
+        self._maybe_reload()
+        return self._state[1].match(text)
+
+    def resolve(self, flags, use_default_action=False):
+        return self._state[2].resolve_action(flags, use_default_action)
+
+    def entities(self, flags):
+        return self._state[2].entities(flags)
+
+    def stats(self):
+        vocabulary, cache, _, _ = self._state
+        return {
+            **cache.stats(),
+            "labels": len(cache.matcher.labels),
+            "version": vocabulary.version,
+            "reloads": self.reloads,
+        }
+
+
+DEFAULT_INTENT_INDEX = IntentIndex(
+    cache_size=int(os.environ.get("INTENT_CACHE_SIZE", DEFAULT_INTENT_CACHE_SIZE))
+)
+
+# 분석 결과(동작 이름) → IoT 디바이스로 보내는 표준 명령어 (어휘 파일을 다시 불러오면 함께 갱신)
+ACTION_COMMANDS = dict(DEFAULT_INTENT_INDEX.commands)
+
+
+def _replace_action_commands(commands):
+    """
+    ACTION_COMMANDS를 새 어휘의 명령어로 다시 만듭니다 (파일에서 지운 동작도 제거).
+    다른 모듈이 import한 같은 dict 객체를 바꾸며, 새 항목을 먼저 넣어 비어 있는 순간이 없게 합니다.
+    """
+    ACTION_COMMANDS.update(commands)
+    for name in [name for name in ACTION_COMMANDS if name not in commands]:
+        ACTION_COMMANDS.pop(name, None)
+
+
+def analyze_light_command(text, matcher=DEFAULT_INTENT_INDEX, light_only_turns_on=False):
+    """
+    텍스트를 분석하여 조명 동작("turn_on" / "turn_off" / None)을 반환합니다.
+    기본적으로 프로세스 공용 인덱스(DEFAULT_INTENT_INDEX, 캐시 포함)를 거치며, 다른 IntentIndex를 넘기면
+    일치 확인과 동작 결정 모두 그 인덱스의 어휘를 씁니다.
+    light_only_turns_on=True 이면 조명 키워드만 있는 경우 디바이스의 기본 동작(켜기)으로 추정합니다.
+    """
+    if not text:
+        return None
+    return matcher.resolve(matcher.match(text), light_only_turns_on)
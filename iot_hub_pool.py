@@ -0,0 +1,244 @@
+"""
+IoT Hub 서비스 클라이언트(IoTHubRegistryManager) 풀
+
+SendIoTCommand 요청마다 IoTHubRegistryManager 를 새로 만들면 매번 AMQP 연결과
+SAS 인증 핸드셰이크 비용을 치르게 됩니다. 이 모듈은 워커 프로세스마다 클라이언트를
+지연 생성해 재사용하고, 연결 문자열이 바뀌거나 통신 오류가 나면 자동으로 다시 만듭니다.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_AGE_SECONDS = 45 * 60
+DEFAULT_MAX_IDLE_SECONDS = 5 * 60
+DEFAULT_ACQUIRE_TIMEOUT_SECONDS = 10
+# HTTP 상태 코드가 있는 오류는 IoT Hub가 응답한 것이므로 연결은 멀쩡함 (404 디바이스 없음/오프라인,
+# 429 제한 등). 인증 실패(401/403)만 키 교체 등으로 보고 클라이언트를 다시 만듭니다.
+DISCARD_STATUS_CODES = frozenset({401, 403})
+
+
+class PoolExhaustedError(RuntimeError):
+    """제한 시간 안에 사용 가능한 클라이언트를 얻지 못했을 때 발생합니다."""
+
+
+class _PooledClient:
+    __slots__ = ("manager", "generation", "created_at", "last_used_at")
+
+    def __init__(self, manager, generation):
+        now = time.monotonic()
+        self.manager = manager
+        self.generation = generation
+        self.created_at = now
+        self.last_used_at = now
+
+
+class RegistryManagerPool:
+    """
+    스레드 안전한 IoTHubRegistryManager 풀
+
+    클라이언트 하나는 한 번에 한 호출만 사용합니다(lease). 최대 max_size 개까지 만들고,
+    모두 사용 중이면 acquire_timeout 초 동안 반납을 기다립니다.
+    """
+
+    def __init__(self, factory=None, max_size=DEFAULT_POOL_SIZE,
+                 max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+                 max_idle_seconds=DEFAULT_MAX_IDLE_SECONDS,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT_SECONDS):
+        self._factory = factory or _create_registry_manager
+        self._max_size = max(1, max_size)
+        self._max_age = max_age_seconds
+        self._max_idle = max_idle_seconds
+        self._acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._conn_str = None
+        self._generation = 0
+
+    @contextmanager
+    def lease(self, conn_str):
+        """
+        클라이언트를 빌려 줍니다. 블록 안에서 전송/인증 오류가 나면 해당 클라이언트는
+        연결이 끊긴 것으로 보고 폐기합니다(다음 요청에서 새로 생성). IoT Hub가 HTTP 상태 코드로
+        응답한 오류(디바이스 없음, 제한 등)는 그대로 다시 던지고 클라이언트는 계속 씁니다.
+        """
+        entry = self._acquire(conn_str)
+        try:
+            yield entry.manager
+        except Exception as error:
+            self._release(entry, healthy=not is_connection_error(error))
+            raise
+        self._release(entry, healthy=True)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "maxSize": self._max_size,
+                "generation": self._generation,
+            }
+
+    def close(self):
+        """풀에 있는 유휴 클라이언트를 모두 닫습니다."""
+        with self._cond:
+            stale, self._idle = self._idle, []
+            self._size -= len(stale)
+            self._generation += 1
+            self._cond.notify_all()
+        for entry in stale:
+            _close_manager(entry.manager)
+
+    def _is_healthy(self, entry, now):
+        return (
+            entry.generation == self._generation
+            and now - entry.created_at < self._max_age
+            and now - entry.last_used_at < self._max_idle
+        )
+
+    def _acquire(self, conn_str):
+        deadline = time.monotonic() + self._acquire_timeout
+        stale = []
+        try:
+            with self._cond:
+                if conn_str != self._conn_str:
+                    # 연결 문자열이 바뀌면(키 교체 등) 기존 클라이언트는 모두 폐기
+                    if self._conn_str is not None:
+                        logging.info("IoT Hub 연결 문자열 변경 감지 - 클라이언트 풀을 재생성합니다.")
+                    self._conn_str = conn_str
+                    self._generation += 1
+                    stale.extend(self._idle)
+                    self._size -= len(self._idle)
+                    self._idle = []
+
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        entry = self._idle.pop()
+                        if self._is_healthy(entry, now):
+                            return entry
+                        stale.append(entry)
+                        self._size -= 1
+
+                    if self._size < self._max_size:
+                        self._size += 1
+                        generation = self._generation
+                        break
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolExhaustedError("사용 가능한 IoT Hub 클라이언트가 없습니다.")
+                    self._cond.wait(remaining)
+        finally:
+            for entry in stale:
+                _close_manager(entry.manager)
+
+        try:
+            manager = self._factory(conn_str)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        logging.info(f"IoT Hub 클라이언트 생성 (풀 크기: {self._size}/{self._max_size})")
+        return _PooledClient(manager, generation)
+
+    def _release(self, entry, healthy):
+        entry.last_used_at = time.monotonic()
+        with self._cond:
+            keep = healthy and entry.generation == self._generation
+            if keep:
+                self._idle.append(entry)
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not keep:
+            _close_manager(entry.manager)
+
+
+def _http_status(error):
+    """오류(또는 원인 오류)에 담긴 HTTP 상태 코드, 없으면 None"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if status is None:
+            status = getattr(error, "status_code", None)
+        if isinstance(status, int):
+            return status
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_connection_error(error):
+    """클라이언트를 버려야 하는 오류인지 (HTTP 상태 코드 없는 전송 오류 또는 인증 실패)"""
+    status = _http_status(error)
+    return status is None or status in DISCARD_STATUS_CODES
+
+
+def _create_registry_manager(conn_str):
+    # azure.iot.hub(uamqp 포함)는 import 비용이 커서 첫 클라이언트 생성 시점까지 미룹니다.
+    from azure.iot.hub import IoTHubRegistryManager
+    return IoTHubRegistryManager(conn_str)
+
+
+def _close_manager(manager):
+    amqp_client = getattr(manager, "amqp_svc_client", None)
+    if amqp_client is None:
+        return
+    try:
+        amqp_client.disconnect_sync()
+    except Exception as e:
+        logging.warning(f"IoT Hub 클라이언트 종료 오류: {str(e)}")
+
+
+def _env_number(name, default, cast=int):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logging.warning(f"{name} 환경 변수 값이 올바르지 않습니다: {value}")
+        return default
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_factory = None
+
+
+def get_registry_manager_pool():
+    """워커 프로세스 전역 풀을 반환합니다. 첫 호출 시 생성됩니다."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RegistryManagerPool(
+                    factory=_factory,
+                    max_size=_env_number("IOTHUB_POOL_SIZE", DEFAULT_POOL_SIZE),
+                    max_age_seconds=_env_number("IOTHUB_POOL_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS, float),
+                    max_idle_seconds=_env_number("IOTHUB_POOL_MAX_IDLE_SECONDS", DEFAULT_MAX_IDLE_SECONDS, float),
+                    acquire_timeout=_env_number("IOTHUB_POOL_ACQUIRE_TIMEOUT_SECONDS",
+                                                DEFAULT_ACQUIRE_TIMEOUT_SECONDS, float),
+                )
+    return _pool
+
+
+def set_registry_manager_factory(factory):
+    """
+    클라이언트 생성 함수를 교체합니다(벤치마크/로컬 테스트용 가짜 IoT Hub 등).
+    기존 풀은 닫고, 다음 get_registry_manager_pool() 호출 때 새 factory로 다시 만듭니다.
+    """
+    global _pool, _factory
+    with _pool_lock:
+        old_pool, _pool, _factory = _pool, None, factory
+    if old_pool is not None:
+        old_pool.close()
@@ -0,0 +1,81 @@
+"""
+음성 클라이언트용 무거운 모듈 지연 로딩
+
+speech_recognition, pyttsx3, pvporcupine, pyaudio, aiohttp 같은 모듈은 import만 해도
+라즈베리 파이에서 수백 ms~수 초가 걸립니다. 클라이언트는 이런 모듈을 LazyModule로 선언해
+처음 속성에 접근할 때 불러오고, preload()로 백그라운드 스레드에서 미리 불러 둡니다.
+그동안 메인 스레드는 호출어 엔진을 먼저 준비할 수 있습니다.
+
+같은 모듈을 두 스레드가 동시에 import해도 파이썬의 모듈별 import 잠금이 한 번만 실행되게 하므로,
+메인 스레드가 백그라운드에서 불러오는 중인 모듈을 쓰려 하면 그 import가 끝날 때까지 기다립니다.
+"""
+import importlib
+import threading
+import time
+
+# 모듈 이름 → 백그라운드 import 소요 시간(ms) 또는 실패 메시지
+preload_results = {}
+_preload_threads = []
+_preload_lock = threading.Lock()
+
+
+class LazyModule:
+    """처음 속성에 접근할 때 import되는 모듈 대리 객체"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def _preload(names):
+    for name in names:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            result = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            # 실제로 사용할 때 같은 오류가 다시 나므로 여기서는 기록만 합니다.
+            result = f"{type(e).__name__}: {e}"
+        with _preload_lock:
+            preload_results[name] = result
+
+
+def preload(*names):
+    """names를 순서대로 import하는 데몬 스레드를 시작하고 반환합니다."""
+    thread = threading.Thread(target=_preload, args=(names,), name="module-preload", daemon=True)
+    with _preload_lock:
+        _preload_threads.append(thread)
+    thread.start()
+    return thread
+
+
+def wait_for_preload(timeout=None):
+    """시작된 백그라운드 import가 모두 끝날 때까지 기다리고 결과를 반환합니다."""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    with _preload_lock:
+        threads = list(_preload_threads)
+    for thread in threads:
+        thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    with _preload_lock:
+        return dict(preload_results)
@@ -0,0 +1,244 @@
+"""
+고정 안내 문장 음성 캐시
+
+"네, 무엇을 도와드릴까요?"처럼 늘 같은 문장은 매번 합성하지 않고, 한 번 WAV로 만들어 디스크에
+보관한 뒤 PCM을 오디오 장치로 바로 재생합니다. 디스크 파일은 다음 실행에서도 그대로 쓰고,
+메모리에는 최근에 쓴 문장의 PCM만 max_memory_bytes까지 보관합니다(LRU).
+
+파일 이름은 문장과 음성 설정(음성 ID, 속도, 볼륨)의 해시이므로 설정이 바뀌면 새로 만듭니다.
+합성(렌더링)은 별도 프로세스(이 파일을 --render로 실행, 자체 pyttsx3 엔진)에서 하므로, 말하는 스레드
+(tts_worker.TTSWorker)는 렌더링을 기다리지 않습니다. 설치할 때 미리 만들어 둘 수도 있습니다.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import wave
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "TTS_PHRASE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "voice_to_iot", "phrases")
+)
+DEFAULT_MAX_MEMORY_BYTES = int(os.getenv("TTS_PHRASE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+# 재생 중 중단 요청을 확인하는 단위 (프레임)
+PLAYBACK_CHUNK_FRAMES = 1024
+
+
+class PhraseAudio:
+    """WAV 하나의 PCM과 형식"""
+
+    __slots__ = ("channels", "sample_width", "frame_rate", "pcm")
+
+    def __init__(self, channels, sample_width, frame_rate, pcm):
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_rate = frame_rate
+        self.pcm = pcm
+
+    @classmethod
+    def from_wav(cls, path):
+        with wave.open(path, "rb") as f:
+            return cls(f.getnchannels(), f.getsampwidth(), f.getframerate(), f.readframes(f.getnframes()))
+
+    @property
+    def frame_bytes(self):
+        return self.channels * self.sample_width
+
+
+class PhraseAudioCache:
+    """고정 문장 → 미리 합성한 PCM (디스크 + 메모리 LRU, 스레드 안전)"""
+
+    def __init__(self, phrases=(), cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES):
+        self.phrases = list(dict.fromkeys(phrases))
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self._voice_key = ""
+        self._voice = {"voiceId": None, "rate": None, "volume": None}
+        self._render_process = None
+        self._render_stopped = False
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def set_voice(self, voice_id, rate, volume):
+        """음성 설정을 정합니다(파일 이름에 포함). 엔진을 만든 뒤 한 번 호출합니다."""
+        with self._lock:
+            self._voice_key = f"{voice_id}|{rate}|{volume}"
+            self._voice = {"voiceId": voice_id, "rate": rate, "volume": volume}
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def path_for(self, text):
+        digest = hashlib.sha1(f"{self._voice_key}|{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.wav")
+
+    def missing(self):
+        """아직 디스크에 없는(렌더링이 필요한) 문장 목록"""
+        return [text for text in self.phrases if not os.path.exists(self.path_for(text))]
+
+    def render_missing_in_background(self):
+        """
+        디스크에 없는 문장을 별도 프로세스에서 WAV로 만듭니다 (set_voice() 뒤에 호출).
+        자식 프로세스를 기다리는 스레드를 반환하며, 만들 문장이 없으면 None.
+        """
+        missing = self.missing()
+        if not missing:
+            return None
+        job = {
+            **self._voice,
+            "phrases": [{"text": text, "path": self.path_for(text)} for text in missing],
+        }
+        self._render_stopped = False
+        thread = threading.Thread(target=self._run_render_process, args=(job,), name="phrase-render", daemon=True)
+        thread.start()
+        return thread
+
+    def _run_render_process(self, job):
+        try:
+            process = self._render_process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--render"],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+            )
+            _, errors = process.communicate(json.dumps(job, ensure_ascii=False))
+        except Exception as e:
+            print(f"⚠️ 안내 문장 음성 파일 생성 실패: {e}")
+            return
+        if self._render_stopped:
+            return
+        if process.returncode:
+            print(f"⚠️ 안내 문장 음성 파일 생성 실패 (종료 코드 {process.returncode}): {errors.strip()[-500:]}")
+        else:
+            print(f"🗂️ 안내 문장 음성 파일 {len(job['phrases'])}개 생성 완료")
+
+    def stop_rendering(self):
+        """진행 중인 렌더링 프로세스를 끝냅니다."""
+        self._render_stopped = True
+        process = self._render_process
+        if process is not None and process.poll() is None:
+            process.terminate()
+
+    def get(self, text):
+        """미리 합성한 문장이면 PhraseAudio, 아니면 None (실시간 합성 대상)"""
+        if text not in self.phrases:
+            return None
+        with self._lock:
+            audio = self._memory.get(text)
+            if audio is not None:
+                self._memory.move_to_end(text)
+                return audio
+        path = self.path_for(text)
+        try:
+            audio = PhraseAudio.from_wav(path)
+        except (OSError, EOFError, wave.Error):
+            return None
+        with self._lock:
+            self._remember(text, audio)
+        return audio
+
+    def _remember(self, text, audio):
+        if len(audio.pcm) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(text, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous.pcm)
+        self._memory[text] = audio
+        self._memory_bytes += len(audio.pcm)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.pcm)
+
+
+def render_phrase_file(engine, text, path):
+    """
+    pyttsx3 엔진으로 문장을 path에 WAV로 저장합니다.
+    임시 파일에 쓴 뒤 이름을 바꾸므로 중간에 꺼져도 잘린 파일이 남지 않습니다.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp.wav"
+    engine.save_to_file(text, temp_path)
+    engine.runAndWait()
+    # 잘못된 파일이면 여기서 예외가 나서 캐시에 들어가지 않음
+    PhraseAudio.from_wav(temp_path)
+    os.replace(temp_path, path)
+    return path
+
+
+class PCMPlayer:
+    """pyaudio 출력 스트림을 형식별로 열어 두고 PCM을 재생합니다 (한 스레드에서만 사용)"""
+
+    def __init__(self):
+        self._pa = None
+        self._streams = {}
+
+    def play(self, audio, should_stop=None):
+        """PCM을 재생합니다. should_stop()이 참이 되면 다음 조각에서 멈추고 False를 반환합니다."""
+        stream = self._stream_for(audio)
+        stream.start_stream()
+        chunk_bytes = PLAYBACK_CHUNK_FRAMES * audio.frame_bytes
+        view = memoryview(audio.pcm)
+        try:
+            for offset in range(0, len(view), chunk_bytes):
+                if should_stop is not None and should_stop():
+                    return False
+                stream.write(view[offset:offset + chunk_bytes])
+            return True
+        finally:
+            stream.stop_stream()
+
+    def _stream_for(self, audio):
+        key = (audio.channels, audio.sample_width, audio.frame_rate)
+        stream = self._streams.get(key)
+        if stream is None:
+            import pyaudio
+            if self._pa is None:
+                self._pa = pyaudio.PyAudio()
+            stream = self._streams[key] = self._pa.open(
+                format=self._pa.get_format_from_width(audio.sample_width),
+                channels=audio.channels,
+                rate=audio.frame_rate,
+                output=True,
+                start=False
+            )
+        return stream
+
+    def close(self):
+        for stream in self._streams.values():
+            stream.close()
+        self._streams.clear()
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
+
+def _render_main():
+    """
+    렌더링 프로세스: 표준 입력의 작업(JSON: voiceId, rate, volume, phrases=[{text, path}])을
+    자체 pyttsx3 엔진으로 처리합니다. 실패한 문장이 있으면 종료 코드 1.
+    """
+    job = json.load(sys.stdin)
+    if hasattr(os, "nice"):
+        # 말하는 프로세스보다 낮은 우선순위
+        os.nice(10)
+    import pyttsx3
+    engine = pyttsx3.init()
+    if job.get("voiceId"):
+        engine.setProperty('voice', job["voiceId"])
+    if job.get("rate") is not None:
+        engine.setProperty('rate', job["rate"])
+    if job.get("volume") is not None:
+        engine.setProperty('volume', job["volume"])
+    failed = 0
+    for phrase in job["phrases"]:
+        try:
+            render_phrase_file(engine, phrase["text"], phrase["path"])
+        except Exception as e:
+            failed += 1
+            print(f"'{phrase['text']}': {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--render"]:
+    sys.exit(_render_main())
@@ -0,0 +1,56 @@
+"""
+음성 명령 파이프라인 추적 (마이크 → Azure Function → IoT Hub → 디바이스)
+
+명령 하나마다 trace ID를 만들고, 단계별 벽시계 시각(UNIX 시간, 초)을 기록합니다.
+클라이언트는 요청 본문의 "trace"로 보내고, Azure Function은 자기 단계를 덧붙여 C2D 메시지에
+그대로 실어 보내므로, 디바이스에서 호출어 감지 → 조명 변경까지의 지연 분포를 계산할 수 있습니다.
+
+클라이언트 단계: wake_detected, speech_end, stt_done, input_done(텍스트 입력), http_sent
+Function 단계:   function_received, function_analyzed, c2d_sent / direct_sent / queued
+디바이스 단계:   device_received
+"""
+import math
+import time
+import uuid
+
+# 외부에서 받은 trace의 단계 수 상한 (요청 본문 크기 보호)
+MAX_STAGES = 32
+
+
+class PipelineTrace:
+    """trace ID와 단계 이름 → 시각 기록"""
+
+    def __init__(self, trace_id=None, stages=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.stages = dict(stages or {})
+
+    def mark(self, stage, at=None):
+        """단계 시각을 기록합니다(같은 단계는 마지막 시각으로 덮어씀)."""
+        self.stages[stage] = at if at is not None else time.time()
+        return self
+
+    def to_dict(self):
+        return {"traceId": self.trace_id, "stages": dict(self.stages)}
+
+    @classmethod
+    def from_dict(cls, data, trace_id=None):
+        """
+        요청 본문의 {"traceId": ..., "stages": {...}}를 검증해 만듭니다.
+        숫자가 아니거나 유한하지 않은(NaN, 무한대) 시각과 MAX_STAGES를 넘는 단계는 버리고,
+        없거나 형식이 틀리면 새 trace를 만듭니다.
+        """
+        if not isinstance(data, dict):
+            return cls(trace_id)
+        stages = {}
+        raw_stages = data.get("stages")
+        if isinstance(raw_stages, dict):
+            for stage, at in list(raw_stages.items())[:MAX_STAGES]:
+                if isinstance(at, (int, float)) and not isinstance(at, bool):
+                    try:
+                        at = float(at)
+                    except OverflowError:
+                        continue
+                    if math.isfinite(at):
+                        stages[str(stage)[:64]] = at
+        raw_id = data.get("traceId") or trace_id
+        return cls(str(raw_id)[:64] if raw_id else None, stages)
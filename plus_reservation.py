@@ -1,19 +1,30 @@
 import asyncio
 import os
-import speech_recognition as sr
-import json
-import aiohttp
-import pyttsx3
 from dotenv import load_dotenv
-import schedule
 import threading
 import time
 from datetime import datetime, timedelta
 import re
-import pvporcupine
-import pyaudio
-import struct
 import logging
+from azure_function_client import (
+    SEND_FAILURE_PHRASE,
+    close_session,
+    run_with_warm_connection,
+    send_with_confirmation,
+    start_connection_keeper,
+)
+from intent_engine import ACTION_COMMANDS, DEFAULT_INTENT_INDEX
+from lazy_import import LazyModule, preload
+from phrase_audio import PhraseAudioCache
+from pipeline_trace import PipelineTrace
+from tts_worker import PRIORITY_NORMAL, PRIORITY_URGENT, TTSWorker
+from wake_word import PorcupineWakeWordDetector
+
+# 무거운 모듈은 지연 로딩: 호출어 엔진(wake_word의 pvporcupine, pyaudio)은 main()에서 바로 불러오고,
+# 그 뒤에 필요한 음성 인식/TTS/스케줄/HTTP 모듈은 그동안 백그라운드에서 불러옴
+sr = LazyModule("speech_recognition")
+schedule = LazyModule("schedule")
+preload("speech_recognition", "pyttsx3", "schedule", "aiohttp")
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
@@ -27,118 +38,35 @@ print("🔍 Porcupine Access Key:", "설정됨" if os.getenv("PORCUPINE_ACCESS_K
 # 예약 정보 저장용 전역 변수
 scheduled_jobs = []
 scheduler_running = False
-
-
-def speak_text(text):
-    """TTS 설정 최적화"""
+# main()의 이벤트 루프 (스케줄러 스레드가 예약 명령을 이 루프에서 보냄)
+main_loop = None
+
+
+# 늘 같은 안내 문장은 미리 합성해 두고 바로 재생 (예약 시각 등이 들어간 문장은 실시간 합성)
+FIXED_PHRASES = [
+    "네, 무엇을 도와드릴까요?",
+    "네, 조명을 켜겠습니다.",
+    "네, 조명을 끄겠습니다.",
+    "음성을 인식하지 못했습니다. 다시 말씀해 주세요.",
+    "죄송합니다. 명령을 이해하지 못했습니다. 다시 말씀해 주세요.",
+    "죄송합니다. 명령을 인식하지 못했습니다. 다시 웨이크 워드를 말해주세요.",
+    "예약된 시간이 되었습니다. 조명을 켜겠습니다.",
+    "예약된 시간이 되었습니다. 조명을 끄겠습니다.",
+    "죄송합니다. 이미 지난 시간입니다.",
+    "현재 취소할 예약이 없습니다.",
+    "현재 예약된 작업이 없습니다.",
+    SEND_FAILURE_PHRASE,
+]
+
+# TTS 엔진은 전용 스레드 하나에서만 사용 (메인 루프와 스케줄러가 함께 사용, 음성 설정은 한 번만)
+TTS_WORKER = TTSWorker(rate=180, volume=0.9, phrase_cache=PhraseAudioCache(FIXED_PHRASES))
+
+
+async def speak_text(text, priority=PRIORITY_NORMAL, interrupt=False):
+    """TTS 작업 스레드에 문장을 넣고 말을 마칠 때까지 기다립니다 (기다리는 동안 이벤트 루프는 계속 실행)."""
     print(f"🔊 bumblebee: {text}")
-    try:
-        tts_engine = pyttsx3.init()
-        
-        # TTS 속도와 음성 설정
-        voices = tts_engine.getProperty('voices')
-        if voices:
-            # 한국어 또는 여성 음성 선택
-            for voice in voices:
-                if 'korean' in voice.name.lower() or 'female' in voice.name.lower():
-                    tts_engine.setProperty('voice', voice.id)
-                    break
-        
-        tts_engine.setProperty('rate', 180)  # 말하기 속도 (기본: 200)
-        tts_engine.setProperty('volume', 0.9)  # 볼륨
-        
-        tts_engine.say(text)
-        tts_engine.runAndWait()
-        
-    except Exception as e:
-        print(f"❌ TTS 오류: {e}")
-
-
-class PorcupineWakeWordDetector:
-    """Porcupine 웨이크 워드 감지기"""
-    
-    def __init__(self, access_key, keywords=None):
-        self.access_key = access_key
-        self.keywords = keywords or ['bumblebee']  # 기본 키워드
-        self.porcupine = None
-        self.pa = None
-        self.audio_stream = None
-        
-    def initialize(self):
-        """Porcupine 초기화"""
-        try:
-            # Porcupine 객체 생성
-            self.porcupine = pvporcupine.create(
-                access_key=self.access_key,
-                keywords=self.keywords,
-                sensitivities=[0.7] * len(self.keywords)  # 민감도 설정
-            )
-            
-            # PyAudio 초기화
-            self.pa = pyaudio.PyAudio()
-            
-            # 오디오 스트림 설정
-            self.audio_stream = self.pa.open(
-                rate=self.porcupine.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
-                frames_per_buffer=self.porcupine.frame_length
-            )
-            
-            print(f"✅ Porcupine 초기화 완료 - 키워드: {self.keywords}")
-            print(f"   샘플레이트: {self.porcupine.sample_rate}Hz")
-            print(f"   프레임 길이: {self.porcupine.frame_length}")
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Porcupine 초기화 실패: {e}")
-            return False
-    
-    def listen_for_wake_word(self, timeout=None):
-        """웨이크 워드 감지"""
-        if not self.porcupine or not self.audio_stream:
-            print("❌ Porcupine가 초기화되지 않았습니다.")
-            return False
-        
-        print("🎤 웨이크 워드 감지 중...")
-        start_time = time.time()
-        
-        try:
-            while True:
-                # 타임아웃 체크
-                if timeout and (time.time() - start_time) > timeout:
-                    return False
-                
-                # 오디오 데이터 읽기
-                pcm = self.audio_stream.read(self.porcupine.frame_length)
-                pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
-                
-                # 웨이크 워드 감지
-                keyword_index = self.porcupine.process(pcm)
-                
-                if keyword_index >= 0:
-                    detected_keyword = self.keywords[keyword_index]
-                    print(f"✅ 웨이크 워드 감지됨: '{detected_keyword}'")
-                    return True
-                    
-        except Exception as e:
-            print(f"❌ 웨이크 워드 감지 오류: {e}")
-            return False
-    
-    def cleanup(self):
-        """리소스 정리"""
-        try:
-            if self.audio_stream:
-                self.audio_stream.close()
-            if self.pa:
-                self.pa.terminate()
-            if self.porcupine:
-                self.porcupine.delete()
-            print("✅ Porcupine 리소스 정리 완료")
-        except Exception as e:
-            print(f"❌ Porcupine 정리 오류: {e}")
+    utterance = TTS_WORKER.say(text, priority=priority, interrupt=interrupt)
+    await asyncio.to_thread(utterance.wait)
 
 
 def setup_speech_recognizer():
@@ -166,8 +94,8 @@ def setup_speech_recognizer():
         return None, None
 
 
-def recognize_speech_improved(recognizer, microphone, timeout=10, phrase_limit=5):
-    """개선된 음성 인식 함수"""
+def recognize_speech_improved(recognizer, microphone, timeout=10, phrase_limit=5, trace=None):
+    """개선된 음성 인식 함수 (trace가 있으면 speech_end / stt_done 시각 기록)"""
     try:
         print("🎤 명령어 음성 입력 대기 중...")
         
@@ -183,6 +111,8 @@ def recognize_speech_improved(recognizer, microphone, timeout=10, phrase_limit=5
                 timeout=timeout,
                 phrase_time_limit=phrase_limit
             )
+            if trace:
+                trace.mark("speech_end")
             
         print("🔄 음성 인식 중...")
         
@@ -193,6 +123,8 @@ def recognize_speech_improved(recognizer, microphone, timeout=10, phrase_limit=5
             try:
                 print(f"🌐 {lang} 언어로 인식 시도...")
                 text = recognizer.recognize_google(audio, language=lang)
+                if trace:
+                    trace.mark("stt_done")
                 print(f"✅ 인식 성공 ({lang}): '{text}'")
                 return text
                 
@@ -213,74 +145,30 @@ def recognize_speech_improved(recognizer, microphone, timeout=10, phrase_limit=5
         return None
 
 
-async def send_command_to_azure_function(command):
-    """Azure Function에 HTTP 요청을 보내서 IoT Hub로 메시지를 전달합니다."""
-    try:
-        function_url = os.getenv("AZURE_FUNCTION_URL")
-
-        if not function_url:
-            raise ValueError("AZURE_FUNCTION_URL 환경 변수가 설정되지 않았습니다.")
-
-        payload = {
-            "command": command,
-            "deviceId": os.getenv("DEVICE_ID", "default-device"),
-            "timestamp": time.time(),
-        }
-
-        print(f"🌐 Azure Function으로 요청 전송: {function_url}")
-        print(f"📄 요청 데이터: {json.dumps(payload, indent=2)}")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                function_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=10),
-            ) as response:
-
-                status_code = response.status
-                response_text = await response.text()
-
-                print(f"📊 응답 상태 코드: {status_code}")
-                print(f"📨 응답 내용: {response_text}")
-
-                if status_code == 200:
-                    print("✅ Azure Function 요청 성공!")
-                    try:
-                        response_json = json.loads(response_text)
-                        if response_json.get("success"):
-                            print("✅ IoT Hub 메시지 전송 완료!")
-                        else:
-                            print(f"❌ IoT Hub 전송 실패: {response_json.get('error', '알 수 없는 오류')}")
-                    except json.JSONDecodeError:
-                        print("✅ 응답을 텍스트로 받았습니다.")
-                else:
-                    print(f"❌ Azure Function 요청 실패 (상태 코드: {status_code})")
-
-    except aiohttp.ClientTimeout:
-        print("❌ Azure Function 요청 시간 초과 (10초)")
-    except aiohttp.ClientError as e:
-        print(f"❌ HTTP 요청 오류: {e}")
-    except Exception as e:
-        print(f"❌ Azure Function 요청 오류: {e}")
-
-
 def execute_scheduled_command(command, job_id):
     """예약된 명령어 실행"""
     print(f"⏰ 예약된 명령어 실행: {command}")
 
     if command == "turn on the light":
-        speak_text("예약된 시간이 되었습니다. 조명을 켜겠습니다.")
-    elif command == "turn off the light":
-        speak_text("예약된 시간이 되었습니다. 조명을 끄겠습니다.")
-
-    # 비동기 함수를 동기적으로 실행
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(send_command_to_azure_function(command))
-    finally:
-        loop.close()
+        confirmation = "예약된 시간이 되었습니다. 조명을 켜겠습니다."
+    else:
+        confirmation = "예약된 시간이 되었습니다. 조명을 끄겠습니다."
+
+    # 메인 이벤트 루프에서 전송 (연결 유지 중인 세션 재사용, 전송과 안내를 동시에)
+    loop = main_loop
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(
+            send_with_confirmation(command, speak_text, confirmation), loop
+        ).result()
+    else:
+        # 메인 루프가 없거나 이미 끝남: 이 스레드에서 잠깐 루프를 만들어 전송
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(send_with_confirmation(command, speak_text, confirmation))
+        finally:
+            loop.run_until_complete(close_session())
+            loop.close()
 
     # 실행된 예약 제거
     global scheduled_jobs
@@ -373,59 +261,48 @@ def parse_time_expression(text):
     return None, None
 
 
+# 조명/예약 키워드 (서버와 같은 어휘 파일, 반복되는 문장은 캐시에서 바로 반환)
+COMMAND_MATCHER = DEFAULT_INTENT_INDEX
+
+
 def analyze_command_with_schedule(text):
     """명령어 분석 (예약 기능 포함)"""
     if not text:
         return None, None, None
 
-    text_lower = text.lower()
     print(f"🔍 명령어 분석 중: '{text}'")
 
-    # 예약 취소 명령
-    cancel_keywords = ["취소", "삭제", "없애", "그만", "cancel", "stop"]
-    schedule_keywords = ["예약", "스케줄", "schedule"]
+    # 조명/예약/취소/확인 키워드를 한 번에 매칭
+    flags = COMMAND_MATCHER.match(text)
 
-    if any(k in text_lower for k in cancel_keywords) and any(k in text_lower for k in schedule_keywords):
+    # 예약 취소 명령
+    if "cancel" in flags and "schedule" in flags:
         return "cancel_schedule", None, None
 
     # 예약 확인 명령
-    check_keywords = ["확인", "보기", "알려줘", "뭐가", "어떤", "list", "show"]
-    if any(k in text_lower for k in check_keywords) and any(k in text_lower for k in schedule_keywords):
+    if "check" in flags and "schedule" in flags:
         return "check_schedule", None, None
 
     # 시간 표현 파싱
     target_time, time_desc = parse_time_expression(text)
 
-    # 조명 제어 키워드 (더 많은 변형)
-    turn_on_keywords = ["켜", "키", "on", "온", "점등", "불켜", "라이트켜"]
-    turn_off_keywords = ["꺼", "끄", "off", "오프", "소등", "불꺼", "라이트꺼"]
-    light_keywords = ["불", "라이트", "light", "조명", "전등", "등", "램프"]
-
-    has_light_keyword = any(k in text_lower for k in light_keywords)
-    has_turn_on = any(k in text_lower for k in turn_on_keywords)
-    has_turn_off = any(k in text_lower for k in turn_off_keywords)
+    has_light_keyword = "light" in flags
+    has_turn_on = "turn_on" in flags or "turn_on_phrase" in flags
+    has_turn_off = "turn_off" in flags or "turn_off_phrase" in flags
 
     print(f"  조명 키워드: {has_light_keyword}, 켜기: {has_turn_on}, 끄기: {has_turn_off}")
 
     # 조명 명령어 결정
-    command = None
-    if has_turn_on and not has_turn_off:
-        command = "turn on the light"
-    elif has_turn_off and not has_turn_on:
-        command = "turn off the light"
-    elif has_light_keyword and has_turn_on:
-        command = "turn on the light"
-    elif has_light_keyword and has_turn_off:
-        command = "turn off the light"
-    elif has_light_keyword and not has_turn_off:
+    action = COMMAND_MATCHER.resolve(flags, use_default_action=True)
+    if action and has_light_keyword and not (has_turn_on or has_turn_off):
         print("  조명 키워드만 감지됨 → 켜기로 추정")
-        command = "turn on the light"
+    command = ACTION_COMMANDS.get(action)
 
     print(f"  최종 명령: {command}")
     return command, target_time, time_desc
 
 
-def add_scheduled_job(command, target_time, time_desc):
+async def add_scheduled_job(command, target_time, time_desc):
     """예약 작업 추가"""
     job_id = f"job_{int(time.time())}"
 
@@ -449,7 +326,7 @@ def add_scheduled_job(command, target_time, time_desc):
             }
             scheduled_jobs.append(job_info)
         else:
-            speak_text("죄송합니다. 이미 지난 시간입니다.")
+            await speak_text("죄송합니다. 이미 지난 시간입니다.")
             return
     else:
         job = (
@@ -469,16 +346,16 @@ def add_scheduled_job(command, target_time, time_desc):
         scheduled_jobs.append(job_info)
 
     action = "조명을 켜는" if command == "turn on the light" else "조명을 끄는"
-    speak_text(f"네, {time_desc}에 {action} 작업을 예약하겠습니다.")
+    await speak_text(f"네, {time_desc}에 {action} 작업을 예약하겠습니다.")
     print(f"✅ 예약 등록: {action} 작업 - {target_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
 
-def cancel_all_schedules():
+async def cancel_all_schedules():
     """모든 예약 취소"""
     global scheduled_jobs
 
     if not scheduled_jobs:
-        speak_text("현재 취소할 예약이 없습니다.")
+        await speak_text("현재 취소할 예약이 없습니다.")
         return
 
     for job_info in scheduled_jobs:
@@ -487,24 +364,24 @@ def cancel_all_schedules():
 
     count = len(scheduled_jobs)
     scheduled_jobs = []
-    speak_text(f"네, 총 {count}개의 예약을 모두 취소했습니다.")
+    await speak_text(f"네, 총 {count}개의 예약을 모두 취소했습니다.")
     print(f"✅ {count}개 예약 취소 완료")
 
 
-def show_schedules():
+async def show_schedules():
     """현재 예약 목록 보기"""
     if not scheduled_jobs:
-        speak_text("현재 예약된 작업이 없습니다.")
+        await speak_text("현재 예약된 작업이 없습니다.")
         return
 
-    speak_text(f"현재 {len(scheduled_jobs)}개의 예약이 있습니다.")
+    await speak_text(f"현재 {len(scheduled_jobs)}개의 예약이 있습니다.")
     print("\n📅 현재 예약 목록:")
 
     for i, job_info in enumerate(scheduled_jobs, 1):
         action = "조명 켜기" if job_info["command"] == "turn on the light" else "조명 끄기"
         print(f"  {i}. {action} - {job_info['time']}")
         if i == 1:
-            speak_text(f"첫 번째로 {job_info['description']}에 {action} 예약이 있습니다.")
+            await speak_text(f"첫 번째로 {job_info['description']}에 {action} 예약이 있습니다.")
 
 
 def run_scheduler():
@@ -519,6 +396,7 @@ def run_scheduler():
 
 
 async def main():
+    global main_loop
     print("🎯 bumblebee 음성 제어 시스템 시작 (Porcupine 웨이크 워드 감지)")
     
     # 필수 환경 변수 확인
@@ -528,6 +406,9 @@ async def main():
         print("   Picovoice Console (https://console.picovoice.ai)에서 무료 액세스 키를 받아주세요.")
         return
     
+    # TTS 엔진은 호출어 엔진과 함께 백그라운드에서 준비
+    TTS_WORKER.start()
+
     # 웨이크 워드 감지기 초기화
     wake_detector = PorcupineWakeWordDetector(
         access_key=access_key,
@@ -537,6 +418,9 @@ async def main():
     if not wake_detector.initialize():
         print("❌ Porcupine 초기화 실패")
         return
+
+    # 호출어 엔진이 준비된 뒤 Azure Function에 미리 연결
+    await start_connection_keeper()
     
     # 음성 인식기 설정
     recognizer, microphone = setup_speech_recognizer()
@@ -545,7 +429,8 @@ async def main():
         wake_detector.cleanup()
         return
 
-    # 스케줄러 백그라운드 시작
+    # 스케줄러 백그라운드 시작 (예약 명령은 이 이벤트 루프에서 전송)
+    main_loop = asyncio.get_running_loop()
     scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
     scheduler_thread.start()
     
@@ -555,9 +440,15 @@ async def main():
         while True:
             print(f"\n📣 웨이크 워드 대기 중... (현재 예약: {len(scheduled_jobs)}개)")
             
-            # Porcupine으로 웨이크 워드 감지
-            if wake_detector.listen_for_wake_word():
-                speak_text("네, 무엇을 도와드릴까요?")
+            # Porcupine으로 웨이크 워드 감지 (기다리는 동안 연결 유지, 보관함 재전송, 예약 전송이 계속 실행됨)
+            keyword = await wake_detector.wait_for_wake_word()
+            if keyword is None and not wake_detector.running:
+                print("❌ 웨이크 워드 감지가 중단되어 프로그램을 종료합니다.")
+                break
+            if keyword:
+                trace = PipelineTrace().mark("wake_detected")
+                # 예약 안내 등을 말하는 중이면 끊고 바로 응답
+                await speak_text("네, 무엇을 도와드릴까요?", priority=PRIORITY_URGENT, interrupt=True)
                 
                 print("\n💡 명령을 말해주세요!")
                 print("  즉시 실행: '불 켜줘', '불 꺼줘'")
@@ -568,63 +459,64 @@ async def main():
                 for attempt in range(3):
                     print(f"\n🗣️ 명령 인식 시도 {attempt + 1}/3")
                     
-                    recognized_text = recognize_speech_improved(
-                        recognizer, microphone,
-                        timeout=15, phrase_limit=8
+                    recognized_text = await asyncio.to_thread(
+                        recognize_speech_improved, recognizer, microphone,
+                        timeout=15, phrase_limit=8, trace=trace
                     )
 
                     if recognized_text:
                         command, target_time, time_desc = analyze_command_with_schedule(recognized_text)
 
                         if command == "cancel_schedule":
-                            cancel_all_schedules()
+                            await cancel_all_schedules()
                             break
                         elif command == "check_schedule":
-                            show_schedules()
+                            await show_schedules()
                             break
                         elif command and target_time:
-                            add_scheduled_job(command, target_time, time_desc)
+                            await add_scheduled_job(command, target_time, time_desc)
                             break
                         elif command:
                             if command == "turn on the light":
-                                speak_text("네, 조명을 켜겠습니다.")
-                            elif command == "turn off the light":
-                                speak_text("네, 조명을 끄겠습니다.")
+                                confirmation = "네, 조명을 켜겠습니다."
+                            else:
+                                confirmation = "네, 조명을 끄겠습니다."
 
                             action_text = "조명 켜기" if command == "turn on the light" else "조명 끄기"
                             print(f"✅ {action_text} 명령이 인식되었습니다!")
-                            await send_command_to_azure_function(command)
+                            # 확인 안내가 끝나기를 기다리지 않고 바로 전송
+                            await send_with_confirmation(command, speak_text, confirmation, trace=trace)
                             break
                         else:
-                            speak_text("죄송합니다. 명령을 이해하지 못했습니다. 다시 말씀해 주세요.")
+                            await speak_text("죄송합니다. 명령을 이해하지 못했습니다. 다시 말씀해 주세요.")
                             print(f"❌ 인식할 수 없는 명령입니다. 인식된 텍스트: '{recognized_text}'")
                     else:
-                        speak_text("음성을 인식하지 못했습니다. 다시 말씀해 주세요.")
+                        await speak_text("음성을 인식하지 못했습니다. 다시 말씀해 주세요.")
                         print("❌ 음성 인식 실패. 다시 시도해주세요.")
 
                     if attempt < 2:
                         print("⏳ 1초 후 다시 시도합니다...")
                         await asyncio.sleep(1)
                 else:
-                    speak_text("죄송합니다. 명령을 인식하지 못했습니다. 다시 웨이크 워드를 말해주세요.")
+                    await speak_text("죄송합니다. 명령을 인식하지 못했습니다. 다시 웨이크 워드를 말해주세요.")
                     print("❌ 3번 시도 후에도 명령을 인식하지 못했습니다.")
 
                 print("\n🔄 명령 처리 완료. 웨이크 워드를 기다립니다...")
                 await asyncio.sleep(1)
             
-            await asyncio.sleep(0.1)  # CPU 부하 줄이기
-            
     except KeyboardInterrupt:
         print("\n👋 프로그램을 종료합니다.")
     finally:
-        wake_detector.cleanup()
         global scheduler_running
         scheduler_running = False
+        main_loop = None
+        wake_detector.cleanup()
+        TTS_WORKER.stop(timeout=2)
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(run_with_warm_connection(main(), warm_up_now=False))
     except KeyboardInterrupt:
         print("\n👋 프로그램을 종료합니다.")
         scheduler_running = False
\ No newline at end of file
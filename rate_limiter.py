@@ -0,0 +1,119 @@
+"""
+C2D 전송 속도 제한 (토큰 버킷)
+
+IoT Hub는 단위(unit)별로 C2D 전송량을 제한하고, 한도를 넘으면 SDK 호출이 느리게 실패합니다.
+전송 전에 디바이스별 버킷과 허브 전체 버킷에서 토큰을 하나씩 꺼내고, 부족하면 SDK를 호출하지 않고
+다시 시도할 수 있는 시간(초)을 돌려줘 바로 429로 응답하게 합니다.
+
+버킷 상태는 워커 프로세스 메모리에 있으므로 한도는 인스턴스별로 적용됩니다.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_DEVICE_RATE = 5.0
+DEFAULT_DEVICE_BURST = 10
+# 추적하는 디바이스 버킷 수 상한 (가장 오래 쓰지 않은 버킷부터 제거)
+DEFAULT_MAX_DEVICE_BUCKETS = 10000
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지고 최대 burst개까지 쌓이는 토큰 버킷 (잠금은 호출자가 담당)"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = now
+
+    def refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, tokens=1):
+        """tokens개를 꺼낼 수 있을 때까지 남은 시간(초), 지금 가능하면 0"""
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+
+class CommandRateLimiter:
+    """
+    디바이스별 + 허브 전체 토큰 버킷
+
+    rate가 0 이하인 범위(scope)는 제한하지 않습니다. 허브 버킷은 기본적으로 꺼져 있으며,
+    IoT Hub 단위의 C2D 한도에 맞춰 설정합니다.
+    """
+
+    def __init__(self, device_rate=DEFAULT_DEVICE_RATE, device_burst=DEFAULT_DEVICE_BURST,
+                 hub_rate=0.0, hub_burst=0, max_device_buckets=DEFAULT_MAX_DEVICE_BUCKETS,
+                 clock=time.monotonic):
+        self._clock = clock
+        self._device_rate = device_rate
+        self._device_burst = max(1, device_burst or int(device_rate) or 1)
+        self._max_device_buckets = max_device_buckets
+        self._devices = OrderedDict()
+        self._hub = None
+        if hub_rate > 0:
+            self._hub = TokenBucket(hub_rate, max(1, hub_burst or int(hub_rate) or 1), clock())
+        self._lock = threading.Lock()
+        self.rejections = {"device": 0, "hub": 0}
+
+    def try_acquire(self, device_id):
+        """
+        디바이스 버킷과 허브 버킷에서 토큰을 하나씩 꺼냅니다.
+        둘 다 가능하면 (0.0, None)을, 아니면 토큰을 꺼내지 않고 (대기 시간, 제한 범위)를 반환합니다.
+        """
+        now = self._clock()
+        with self._lock:
+            device = self._device_bucket(device_id, now)
+            hub = self._hub
+            if hub is not None:
+                hub.refill(now)
+
+            device_wait = device.wait_time() if device is not None else 0.0
+            hub_wait = hub.wait_time() if hub is not None else 0.0
+            if device_wait or hub_wait:
+                scope = "hub" if hub_wait >= device_wait else "device"
+                self.rejections[scope] += 1
+                return max(device_wait, hub_wait), scope
+
+            if device is not None:
+                device.tokens -= 1
+            if hub is not None:
+                hub.tokens -= 1
+            return 0.0, None
+
+    def _device_bucket(self, device_id, now):
+        if self._device_rate <= 0:
+            return None
+        bucket = self._devices.get(device_id)
+        if bucket is None:
+            bucket = self._devices[device_id] = TokenBucket(self._device_rate, self._device_burst, now)
+            while len(self._devices) > self._max_device_buckets:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_id)
+            bucket.refill(now)
+        return bucket
+
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            throttled = 0
+            for bucket in self._devices.values():
+                bucket.refill(now)
+                if bucket.tokens < 1:
+                    throttled += 1
+            if self._hub is not None:
+                self._hub.refill(now)
+            return {
+                "deviceBuckets": len(self._devices),
+                "throttledDevices": throttled,
+                "hubTokens": self._hub.tokens if self._hub is not None else None,
+                "hubBurst": self._hub.burst if self._hub is not None else None,
+                "rejections": dict(self.rejections),
+            }
@@ -1,102 +1,46 @@
 import asyncio
 import os
-import speech_recognition as sr
-import json
-import aiohttp
-import pyttsx3
 from dotenv import load_dotenv
+from azure_function_client import SEND_FAILURE_PHRASE, run_with_warm_connection, send_with_confirmation
+from intent_engine import ACTION_COMMANDS, analyze_light_command
+from lazy_import import LazyModule, preload
+from phrase_audio import PhraseAudioCache
+from pipeline_trace import PipelineTrace
+from tts_worker import TTSWorker
+
+# 무거운 모듈은 사전 연결(warm-up)과 겹치도록 백그라운드에서 불러옴
+sr = LazyModule("speech_recognition")
+preload("aiohttp", "speech_recognition", "pyttsx3")
 
 load_dotenv()
 print("🔍 Azure Function URL:", os.getenv("AZURE_FUNCTION_URL"))
 print("🔍 디바이스 ID:", os.getenv("DEVICE_ID"))
 
 
-def speak_text(text):
+# 늘 같은 안내 문장은 미리 합성해 두고 바로 재생
+FIXED_PHRASES = [
+    "네, 새싹이에요. 말씀하세요!",
+    "불을 켭니다.",
+    "불을 끕니다.",
+    SEND_FAILURE_PHRASE,
+]
+
+# TTS 엔진은 한 번만 만들어 전용 스레드에서 계속 사용
+TTS_WORKER = TTSWorker(phrase_cache=PhraseAudioCache(FIXED_PHRASES))
+
+
+async def speak_text(text):
     print(text)
-    # TTS 엔진 초기화
-    tts_engine = pyttsx3.init()
-    tts_engine.say(text)
-    tts_engine.runAndWait()
+    # 말을 마칠 때까지 기다리되 이벤트 루프(전송, 연결 유지)는 막지 않음
+    await asyncio.to_thread(TTS_WORKER.say(text).wait)
 
-async def send_command_to_azure_function(command):
+def analyze_command(text):
     """
-    Azure Function에 HTTP 요청을 보내서 IoT Hub로 메시지를 전달합니다.
+    텍스트를 분석하여 'turn on the light' / 'turn off the light' 명령으로 변환합니다.
     """
-    try:
-        function_url = os.getenv("AZURE_FUNCTION_URL")
-        
-        if not function_url:
-            raise ValueError("AZURE_FUNCTION_URL 환경 변수가 설정되지 않았습니다.")
-            
-        payload = {
-            "command": command,
-            "deviceId": os.getenv("DEVICE_ID", "default-device"),
-            "timestamp": asyncio.get_event_loop().time()
-        }
-        
-        print(f"🌐 Azure Function으로 요청 전송: {function_url}")
-        print(f"📄 요청 데이터: {json.dumps(payload, indent=2)}")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                function_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                
-                status_code = response.status
-                response_text = await response.text()
-                
-                print(f"📊 응답 상태 코드: {status_code}")
-                print(f"📨 응답 내용: {response_text}")
-                
-                if status_code == 200:
-                    print("✅ Azure Function 요청 성공!")
-                    try:
-                        response_json = json.loads(response_text)
-                        if response_json.get("success"):
-                            print("✅ IoT Hub 메시지 전송 완료!")
-                        else:
-                            print(f"❌ IoT Hub 전송 실패: {response_json.get('error', '알 수 없는 오류')}")
-                    except json.JSONDecodeError:
-                        print("✅ 응답을 텍스트로 받았습니다.")
-                else:
-                    print(f"❌ Azure Function 요청 실패 (상태 코드: {status_code})")
-                    
-    except aiohttp.ClientTimeout:
-        print("❌ Azure Function 요청 시간 초과 (10초)")
-    except aiohttp.ClientError as e:
-        print(f"❌ HTTP 요청 오류: {e}")
-    except Exception as e:
-        print(f"❌ Azure Function 요청 오류: {e}")
-
-def analyze_command(text):
-    if not text:
-        return None
-    
-    text_lower = text.lower()
-    
-    turn_on_keywords = ["켜", "키", "on", "온"]
-    turn_off_keywords = ["꺼", "끄", "off", "오프"]
-    light_keywords = ["불", "라이트", "light", "조명", "전등"]
-    
-    has_light_keyword = any(k in text_lower for k in light_keywords)
-    has_turn_on = any(k in text_lower for k in turn_on_keywords)
-    has_turn_off = any(k in text_lower for k in turn_off_keywords)
-    
-    if has_turn_on and not has_turn_off:
-        return "turn on the light"
-    elif has_turn_off and not has_turn_on:
-        return "turn off the light"
-    elif has_light_keyword and has_turn_on:
-        return "turn on the light"
-    elif has_light_keyword and has_turn_off:
-        return "turn off the light"
-    else:
-        return None
+    return ACTION_COMMANDS.get(analyze_light_command(text))
 
-def recognize_speech_from_mic():
+def recognize_speech_from_mic(trace=None):
     recognizer = sr.Recognizer()
     
     print("🎤 사용 가능한 마이크:")
@@ -113,6 +57,8 @@ def recognize_speech_from_mic():
             
             print("✅ 준비 완료! 명령을 말해주세요 (최대 3초간 녹음)")
             audio = recognizer.listen(source, timeout=10, phrase_time_limit=3)
+            if trace:
+                trace.mark("speech_end")
             print("🔄 음성 인식 중...")
 
     except sr.WaitTimeoutError:
@@ -125,6 +71,8 @@ def recognize_speech_from_mic():
     try:
         print("🌐 Google 음성 인식 시도 중...")
         text = recognizer.recognize_google(audio, language='ko-KR')
+        if trace:
+            trace.mark("stt_done")
         print(f"✅ 인식된 음성: '{text}'")
         return text
     except sr.UnknownValueError:
@@ -135,28 +83,35 @@ def recognize_speech_from_mic():
         print("💡 인터넷 연결을 확인해주세요.")
         return None
 
+def listen_for_trigger(recognizer):
+    """호출어를 한 번 듣고 인식한 텍스트를 반환합니다 (블로킹, asyncio.to_thread로 호출)."""
+    with sr.Microphone() as source:
+        recognizer.adjust_for_ambient_noise(source, duration=0.5)
+        print("🟢 '새싹' 이라고 불러주세요.")
+        audio = recognizer.listen(source, timeout=5, phrase_time_limit=2)
+    return recognizer.recognize_google(audio, language="ko-KR")
+
 async def main():
     print("🎯 음성 제어 시스템 시작")
     print("🎙️ 호출어: '새싹' → 조명 명령 대기")
 
     recognizer = sr.Recognizer()
+    TTS_WORKER.start()
 
     for attempt in range(3):
         print(f"\n📣 호출 대기 중... (시도 {attempt + 1}/3)")
 
         try:
-            with sr.Microphone() as source:
-                recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                print("🟢 '새싹' 이라고 불러주세요.")
-                audio = recognizer.listen(source, timeout=5, phrase_time_limit=2)
-                trigger_text = recognizer.recognize_google(audio, language="ko-KR")
-                print(f"👂 인식된 텍스트: {trigger_text}")
-
-                if "새싹" in trigger_text:
-                    speak_text("네, 새싹이에요. 말씀하세요!")
-                    break
-                else:
-                    print("❌ 호출어가 아닙니다. 다시 시도해주세요.")
+            # 마이크 녹음/음성 인식은 블로킹이므로 스레드에서 (연결 유지, 보관함 재전송이 계속 실행되도록)
+            trigger_text = await asyncio.to_thread(listen_for_trigger, recognizer)
+            print(f"👂 인식된 텍스트: {trigger_text}")
+
+            if "새싹" in trigger_text:
+                trace = PipelineTrace().mark("wake_detected")
+                await speak_text("네, 새싹이에요. 말씀하세요!")
+                break
+            else:
+                print("❌ 호출어가 아닙니다. 다시 시도해주세요.")
 
         except sr.WaitTimeoutError:
             print("⏱ 음성이 감지되지 않았습니다. 다시 시도해주세요.")
@@ -178,20 +133,21 @@ async def main():
 
     for attempt in range(3):
         print(f"\n🗣️ 명령 인식 시도 {attempt + 1}/3")
-        recognized_text = recognize_speech_from_mic()
+        recognized_text = await asyncio.to_thread(recognize_speech_from_mic, trace)
 
         if recognized_text:
             standardized_command = analyze_command(recognized_text)
 
             if standardized_command:
                 if standardized_command == "turn on the light":
-                    speak_text("불을 켭니다.")
-                elif standardized_command == "turn off the light":
-                    speak_text("불을 끕니다.")
+                    confirmation = "불을 켭니다."
+                else:
+                    confirmation = "불을 끕니다."
 
                 action_text = "조명 켜기" if standardized_command == "turn on the light" else "조명 끄기"
                 print(f"✅ {action_text} 명령이 인식되었습니다!")
-                await send_command_to_azure_function(standardized_command)
+                # 확인 안내가 끝나기를 기다리지 않고 바로 전송
+                await send_with_confirmation(standardized_command, speak_text, confirmation, trace=trace)
                 break
             else:
                 print(f"❌ 조명 제어 명령이 아닙니다. 인식된 텍스트: '{recognized_text}'")
@@ -205,4 +161,4 @@ async def main():
         print("❌ 3번 시도 후에도 명령을 인식하지 못했습니다.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run_with_warm_connection(main()))
\ No newline at end of file
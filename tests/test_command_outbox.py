@@ -0,0 +1,80 @@
+"""command_outbox: 디바이스별 전송 직렬화 (재전송 중인 이전 명령과 새 명령의 순서)"""
+import asyncio
+
+from command_outbox import RESULT_SENT, CommandOutbox, replay_forever
+
+
+def make_outbox(tmp_path):
+    return CommandOutbox(str(tmp_path / "outbox.jsonl"))
+
+
+def test_fresh_send_waits_for_in_flight_replay(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.add("light-1", "turn_on", "key-old")
+    delivered = []
+
+    async def scenario():
+        replay_started = asyncio.Event()
+        release_replay = asyncio.Event()
+
+        async def slow_send(entry):
+            replay_started.set()
+            await release_replay.wait()
+            delivered.append(entry["command"])
+            return RESULT_SENT
+
+        async def fresh_send():
+            async with outbox.device_lock("light-1"):
+                delivered.append("turn_off")
+                outbox.discard_device("light-1")
+
+        replayer = asyncio.create_task(replay_forever(outbox, slow_send))
+        await replay_started.wait()
+        fresh = asyncio.create_task(fresh_send())
+        await asyncio.sleep(0.05)
+        assert delivered == []
+        release_replay.set()
+        await asyncio.wait_for(fresh, 1)
+        replayer.cancel()
+
+    asyncio.run(scenario())
+    assert delivered == ["turn_on", "turn_off"]
+    assert len(outbox) == 0
+
+
+def test_replay_skips_entry_superseded_while_waiting(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.add("light-1", "turn_on", "key-old")
+    delivered = []
+
+    async def send(entry):
+        delivered.append(entry["command"])
+        return RESULT_SENT
+
+    async def scenario():
+        async with outbox.device_lock("light-1"):
+            replayer = asyncio.create_task(replay_forever(outbox, send))
+            await asyncio.sleep(0.05)
+            # 새 명령이 전송되어 보관함의 이전 명령을 버림
+            outbox.discard_device("light-1")
+        await asyncio.sleep(0.05)
+        replayer.cancel()
+
+    asyncio.run(scenario())
+    assert delivered == []
+
+
+def test_cancelled_waiter_does_not_leak_lock(tmp_path):
+    outbox = make_outbox(tmp_path)
+
+    async def scenario():
+        async with outbox.device_lock("light-1"):
+            waiter = asyncio.create_task(outbox.device_lock("light-1").__aenter__())
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        async with outbox.device_lock("light-1"):
+            pass
+
+    asyncio.run(asyncio.wait_for(scenario(), 2))
@@ -0,0 +1,137 @@
+"""command_queue: 임대 만료/연장, 재시도 미루기, 드레이너, 이전 버전 큐 파일 변환"""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from command_queue import (
+    STATUS_ACCEPTED, STATUS_FAILED, STATUS_QUEUED, STATUS_SENDING,
+    CommandQueue, CommandQueueDrainer, RetryLater,
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return CommandQueue(str(tmp_path / "commands.db"), lease_seconds=0.3)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_claim_marks_sending_and_counts_attempt(queue):
+    queue.enqueue("a", "device-1", "{}", "turn on the light")
+    batch = queue.claim_batch(10)
+    assert [row["command_id"] for row in batch] == ["a"]
+    assert batch[0]["attempts"] == 1
+    assert queue.get("a")["status"] == STATUS_SENDING
+    assert queue.claim_batch(10) == []
+
+
+def test_expired_lease_is_claimed_again(queue):
+    queue.enqueue("a", "device-1", "{}")
+    queue.claim_batch(10)
+    time.sleep(0.35)
+    batch = queue.claim_batch(10)
+    assert [row["command_id"] for row in batch] == ["a"]
+    assert batch[0]["attempts"] == 2
+
+
+def test_renew_keeps_lease(queue):
+    queue.enqueue("a", "device-1", "{}")
+    queue.claim_batch(10)
+    for _ in range(3):
+        time.sleep(0.15)
+        queue.renew(["a"])
+    assert queue.claim_batch(10) == []
+
+
+def test_defer_does_not_count_attempt(queue):
+    queue.enqueue("a", "device-1", "{}")
+    queue.claim_batch(10)
+    queue.defer("a", time.time() + 60, "rate limited")
+    record = queue.get("a")
+    assert record["status"] == STATUS_QUEUED
+    assert record["attempts"] == 0
+    assert queue.claim_batch(10) == []
+
+
+def test_enqueue_many_is_atomic(queue):
+    queue.enqueue("a", "device-1", "{}")
+    with pytest.raises(sqlite3.IntegrityError):
+        queue.enqueue_many([("b", "device-2", "{}", None), ("a", "device-1", "{}", None)])
+    assert queue.get("b") is None
+
+
+def test_drainer_accepts_and_retries(queue, executor):
+    queue.enqueue("ok", "device-1", "{}")
+    queue.enqueue("bad", "device-2", "{}")
+
+    def send(device_id, message, command_id):
+        if command_id == "bad":
+            raise RuntimeError("hub down")
+
+    drainer = CommandQueueDrainer(queue, send, executor, max_attempts=1)
+    assert drainer.drain_once() == 2
+    assert queue.get("ok")["status"] == STATUS_ACCEPTED
+    assert queue.get("ok")["accepted_at"] is not None
+    assert queue.get("bad")["status"] == STATUS_FAILED
+    assert queue.get("bad")["error"] == "hub down"
+
+
+def test_drainer_defers_retry_later(queue, executor):
+    queue.enqueue("a", "device-1", "{}")
+
+    def send(device_id, message, command_id):
+        raise RetryLater(30)
+
+    drainer = CommandQueueDrainer(queue, send, executor)
+    drainer.drain_once()
+    record = queue.get("a")
+    assert record["status"] == STATUS_QUEUED
+    assert record["attempts"] == 0
+
+
+def test_drainer_renews_lease_during_long_send(queue, executor):
+    queue.enqueue("a", "device-1", "{}")
+    release = threading.Event()
+    claimed_again = []
+
+    def send(device_id, message, command_id):
+        release.wait(2)
+
+    drainer = CommandQueueDrainer(queue, send, executor)
+    thread = threading.Thread(target=drainer.drain_once)
+    thread.start()
+    # 임대 시간(0.3초)보다 오래 전송 중이어도 다시 꺼내지지 않아야 함
+    for _ in range(4):
+        time.sleep(0.15)
+        claimed_again.extend(queue.claim_batch(10))
+    release.set()
+    thread.join()
+    assert claimed_again == []
+    assert queue.get("a")["status"] == STATUS_ACCEPTED
+
+
+def test_migrates_delivered_queue_file(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE commands (
+            command_id TEXT PRIMARY KEY, device_id TEXT NOT NULL, message TEXT NOT NULL,
+            final_command TEXT, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL, delivered_at REAL
+        );
+        INSERT INTO commands VALUES ('a', 'device-1', '{}', NULL, 'delivered', 1, NULL, 1, 2, 1, 2);
+    """)
+    conn.commit()
+    conn.close()
+
+    record = CommandQueue(path).get("a")
+    assert record["status"] == STATUS_ACCEPTED
+    assert record["accepted_at"] == 2
@@ -0,0 +1,105 @@
+"""device_groups: 태그 → 그룹 색인, 미리 새로 고침, 오래된 색인 만료"""
+import threading
+
+import pytest
+
+import device_groups
+from device_groups import DeviceGroupResolver, UnknownDeviceGroupError, build_group_index
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(device_groups.time, "monotonic", clock.monotonic)
+    return clock
+
+
+class Loader:
+    """호출 횟수를 세고, failing이면 IoT Hub 조회 실패를 흉내 내는 트윈 조회 함수"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+        self.called = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.called.set()
+        if self.failing:
+            raise RuntimeError("hub unavailable")
+        return [{"deviceId": "lamp-1", "tags": {"room": "living"}}]
+
+
+def _wait_background(resolver, loader):
+    assert loader.called.wait(1)
+    loader.called.clear()
+    for _ in range(100):
+        if not resolver._refreshing:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("백그라운드 새로 고침이 끝나지 않음")
+
+
+def test_build_group_index_flattens_tags():
+    index = build_group_index([
+        {"deviceId": "a", "tags": {"Room": "Living", "groups": ["hall", "night"], "location": {"building": "A"}}},
+        {"deviceId": "b", "tags": {"room": "living"}},
+        {"deviceId": None, "tags": {"room": "living"}},
+    ])
+    assert index["room:living"] == ["a", "b"]
+    assert index["groups:night"] == ["a"]
+    assert index["location.building:a"] == ["a"]
+
+
+def test_unknown_group_raises(clock):
+    resolver = DeviceGroupResolver(Loader(), ttl_seconds=100)
+    with pytest.raises(UnknownDeviceGroupError):
+        resolver.resolve("room:attic")
+
+
+def test_refresh_ahead_runs_in_background(clock):
+    loader = Loader()
+    resolver = DeviceGroupResolver(loader, ttl_seconds=100)
+    assert resolver.resolve("room:living") == ["lamp-1"]
+    loader.called.clear()
+
+    clock.now += 90
+    assert resolver.resolve("ROOM:Living") == ["lamp-1"]
+    _wait_background(resolver, loader)
+    assert loader.calls == 2
+
+
+def test_refresh_ahead_still_fires_after_hard_expiry(clock):
+    loader = Loader()
+    resolver = DeviceGroupResolver(loader, ttl_seconds=100, max_stale_seconds=300)
+    resolver.resolve("room:living")
+    loader.called.clear()
+
+    # 새로 고침이 계속 실패해 색인이 max_stale을 넘김 → 요청이 조회를 기다림
+    loader.failing = True
+    clock.now += 90
+    resolver.resolve("room:living")
+    _wait_background(resolver, loader)
+    clock.now += 250
+    with pytest.raises(RuntimeError):
+        resolver.resolve("room:living")
+
+    loader.failing = False
+    assert resolver.resolve("room:living") == ["lamp-1"]
+    loader.called.clear()
+    calls = loader.calls
+
+    # 만료 뒤에도 TTL이 가까워지면 다시 백그라운드에서 새로 고쳐야 함
+    clock.now += 90
+    assert resolver.resolve("room:living") == ["lamp-1"]
+    _wait_background(resolver, loader)
+    assert loader.calls == calls + 1
+    assert not resolver._refreshing
@@ -0,0 +1,109 @@
+"""idempotency: 같은 키 재요청 응답 재사용, 보관하지 않는 결과, 동시 요청, 다른 본문의 키 재사용"""
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyCache, IdempotencyKeyConflict
+
+
+def test_replays_first_result():
+    cache = IdempotencyCache()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"status": 200, "body": len(calls)}
+
+    async def scenario():
+        first = await cache.run("key", handler)
+        second = await cache.run("key", handler)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == ({"status": 200, "body": 1}, False)
+    assert second == ({"status": 200, "body": 1}, True)
+    assert len(calls) == 1
+    assert cache.stats()["replays"] == 1
+
+
+def test_uncacheable_result_runs_again():
+    cache = IdempotencyCache()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return 503
+
+    async def scenario():
+        for _ in range(2):
+            await cache.run("key", handler, cacheable=lambda status: status < 500)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_concurrent_same_key_runs_once():
+    cache = IdempotencyCache()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 200
+
+    async def scenario():
+        return await asyncio.gather(*(cache.run("key", handler) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+
+def test_max_entries_evicts_oldest():
+    cache = IdempotencyCache(max_entries=2)
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await cache.run(key, lambda: asyncio.sleep(0, result=key))
+        return await cache.run("a", lambda: asyncio.sleep(0, result="again"))
+
+    assert asyncio.run(scenario()) == ("again", False)
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_same_key_with_different_body_conflicts():
+    cache = IdempotencyCache()
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return 200
+
+    async def scenario():
+        await cache.run("key", handler, fingerprint="body-a")
+        replay = await cache.run("key", handler, fingerprint="body-a")
+        with pytest.raises(IdempotencyKeyConflict):
+            await cache.run("key", handler, fingerprint="body-b")
+        return replay
+
+    assert asyncio.run(scenario()) == (200, True)
+    assert len(calls) == 1
+
+
+def test_concurrent_different_body_conflicts_after_first_finishes():
+    cache = IdempotencyCache()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 200
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.run("key", slow, fingerprint="body-a"),
+            cache.run("key", slow, fingerprint="body-b"),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(scenario())
+    assert first == (200, False)
+    assert isinstance(second, IdempotencyKeyConflict)
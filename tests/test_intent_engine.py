@@ -0,0 +1,118 @@
+"""intent_engine: 의도 분석, 어휘 파일 다시 불러오기, ACTION_COMMANDS 교체, 라벨 집합 캐시"""
+import json
+import os
+
+import pytest
+
+import intent_engine
+from intent_engine import IntentIndex, KeywordMatcher, analyze_light_command
+
+
+def _write_vocabulary(path, actions, mtime):
+    path.write_text(json.dumps({
+        "version": mtime,
+        "actions": {
+            name: {"command": command, "synonyms": synonyms}
+            for name, (command, synonyms) in actions.items()
+        },
+        "devices": {"light": {"synonyms": ["불"], "defaultAction": "turn_on"}},
+        "rooms": {"living": ["거실"]},
+    }), encoding="utf-8")
+    # 같은 초 안에 다시 써도 수정 시각이 바뀌도록 지정
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def vocabulary_path(tmp_path, monkeypatch):
+    path = tmp_path / "intent_vocabulary.json"
+    _write_vocabulary(path, {
+        "turn_on": ("turn on the light", ["켜"]),
+        "turn_off": ("turn off the light", ["꺼"]),
+        "dim": ("dim the light", ["어둡게"]),
+    }, 1_000_000_000)
+    # 기본 어휘 파일처럼 다뤄 ACTION_COMMANDS도 함께 바뀌게 함 (끝나면 원래대로)
+    monkeypatch.setattr(intent_engine, "DEFAULT_VOCABULARY_PATH", str(path))
+    saved = dict(intent_engine.ACTION_COMMANDS)
+    yield path
+    intent_engine._replace_action_commands(saved)
+
+
+def test_default_vocabulary_analysis():
+    assert analyze_light_command("거실 불 켜 줘") == "turn_on"
+    assert analyze_light_command("소등") == "turn_off"
+    assert analyze_light_command("오늘 날씨") is None
+    assert analyze_light_command("불", light_only_turns_on=True) == "turn_on"
+
+
+def test_entities_finds_rooms():
+    index = intent_engine.DEFAULT_INTENT_INDEX
+    assert index.entities(index.match("거실 불 꺼"))["rooms"] == ["living"]
+
+
+def test_hot_reload_replaces_index_and_action_commands(vocabulary_path):
+    index = IntentIndex(str(vocabulary_path), reload_interval=0.001)
+    action_commands = intent_engine.ACTION_COMMANDS
+    assert analyze_light_command("불 켜", matcher=index) == "turn_on"
+
+    _write_vocabulary(vocabulary_path, {
+        "turn_on": ("turn on the light", ["켜", "밝혀"]),
+        "turn_off": ("turn off the light", ["꺼"]),
+    }, 2_000_000_000)
+    index._next_check = 0.0
+    assert "turn_on" in index.match("불 밝혀")
+    assert index.reloads == 1
+    # 다른 모듈이 import한 같은 dict 객체가 새 어휘로 바뀌고, 지운 동작은 빠져야 함
+    assert intent_engine.ACTION_COMMANDS is action_commands
+    assert action_commands == {"turn_on": "turn on the light", "turn_off": "turn off the light"}
+
+
+def test_failed_reload_keeps_previous_vocabulary(vocabulary_path):
+    index = IntentIndex(str(vocabulary_path), reload_interval=0.001)
+    vocabulary_path.write_text("{ broken", encoding="utf-8")
+    os.utime(vocabulary_path, ns=(3_000_000_000, 3_000_000_000))
+    index._next_check = 0.0
+    assert "turn_on" in index.match("불 켜")
+    assert index.reloads == 0
+    assert index.vocabulary.version == 1_000_000_000
+
+
+def test_label_set_cache_is_bounded():
+    matcher = KeywordMatcher({"on": ["켜"], "off": ["꺼"], "light": ["불"]}, label_set_cache_size=2)
+    assert matcher.match("불 켜") == {"on", "light"}
+    matcher.match("불 꺼")
+    matcher.match("켜 꺼")
+    assert len(matcher._label_sets) <= 2
+    assert matcher.match("불 켜") == {"on", "light"}
+
+
+def test_resolver_follows_declaration_order():
+    vocabulary = intent_engine.Vocabulary({
+        "actions": {
+            "turn_on": {"command": "on", "phrases": ["turn on"], "synonyms": ["켜"]},
+            "turn_off": {"command": "off", "synonyms": ["꺼"]},
+        },
+        "devices": {
+            "fan": {"synonyms": ["선풍기"]},
+            "light": {"synonyms": ["불"], "defaultAction": "turn_off"},
+        },
+        "rooms": {"living": ["거실"], "kitchen": ["주방"]},
+    })
+    matcher = KeywordMatcher(vocabulary.keyword_groups())
+    resolver = intent_engine.IntentResolver(vocabulary, matcher)
+
+    assert resolver.resolve_action(matcher.match("turn on 꺼")) == "turn_on"
+    assert resolver.resolve_action(matcher.match("꺼 켜")) is None
+    assert resolver.resolve_action(matcher.match("불 꺼 켜")) == "turn_on"
+    assert resolver.resolve_action(matcher.match("선풍기 불"), use_default_action=True) == "turn_off"
+    assert resolver.entities(matcher.match("주방 거실 불 선풍기")) == {
+        "devices": ["fan", "light"], "rooms": ["living", "kitchen"]
+    }
+    # 매처가 만든 LabelSet이 아닌 일반 집합도 같은 결과
+    assert resolver.resolve_action({"light", "turn_off"}) == "turn_off"
+
+
+def test_analyze_resolves_with_passed_index(vocabulary_path):
+    # 기본 어휘에 없는 동작(dim)도 넘긴 인덱스의 어휘로 결정
+    index = IntentIndex(str(vocabulary_path), reload_interval=0)
+    assert analyze_light_command("불 어둡게", matcher=index) == "dim"
+    assert analyze_light_command("불 어둡게") is None
@@ -0,0 +1,104 @@
+"""iot_hub_pool: 클라이언트 재사용, 오류 종류별 폐기, 연결 문자열 변경, 풀 소진"""
+from types import SimpleNamespace
+
+import pytest
+
+from iot_hub_pool import PoolExhaustedError, RegistryManagerPool
+
+
+class FakeManager:
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+
+
+class HubError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"{status_code}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+@pytest.fixture
+def created():
+    return []
+
+
+@pytest.fixture
+def pool(created):
+    def factory(conn_str):
+        manager = FakeManager(conn_str)
+        created.append(manager)
+        return manager
+    return RegistryManagerPool(factory=factory, max_size=2, acquire_timeout=0.05)
+
+
+def _fail_with(pool, error):
+    with pytest.raises(type(error)):
+        with pool.lease("conn-a"):
+            raise error
+
+
+def test_lease_reuses_client(pool, created):
+    with pool.lease("conn-a") as first:
+        pass
+    with pool.lease("conn-a") as second:
+        pass
+    assert first is second
+    assert len(created) == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_http_status_error_keeps_client(pool, created):
+    # 404(디바이스 없음)는 IoT Hub가 응답한 것이므로 연결을 계속 씀
+    _fail_with(pool, HubError(404))
+    with pool.lease("conn-a"):
+        pass
+    assert len(created) == 1
+
+
+def test_status_in_cause_chain_keeps_client(pool, created):
+    try:
+        try:
+            raise HubError(429)
+        except HubError as cause:
+            raise RuntimeError("send failed") from cause
+    except RuntimeError as error:
+        _fail_with(pool, error)
+    with pool.lease("conn-a"):
+        pass
+    assert len(created) == 1
+
+
+@pytest.mark.parametrize("error", [HubError(401), HubError(403), OSError("connection reset")])
+def test_auth_or_status_less_error_discards_client(pool, created, error):
+    _fail_with(pool, error)
+    assert pool.stats()["size"] == 0
+    with pool.lease("conn-a"):
+        pass
+    assert len(created) == 2
+
+
+def test_connection_string_change_bumps_generation(pool, created):
+    with pool.lease("conn-a"):
+        pass
+    generation = pool.stats()["generation"]
+    with pool.lease("conn-b") as manager:
+        assert manager.conn_str == "conn-b"
+    assert pool.stats()["generation"] == generation + 1
+    assert pool.stats()["size"] == 1
+
+
+def test_client_leased_before_change_is_not_returned(pool, created):
+    with pool.lease("conn-a"):
+        # 사용 중에 연결 문자열이 바뀌면 반납할 때 폐기
+        with pool.lease("conn-b"):
+            pass
+    assert pool.stats()["size"] == 1
+    with pool.lease("conn-b") as manager:
+        assert manager.conn_str == "conn-b"
+
+
+def test_exhausted_pool_times_out(pool):
+    with pool.lease("conn-a"), pool.lease("conn-a"):
+        with pytest.raises(PoolExhaustedError):
+            with pool.lease("conn-a"):
+                pass
@@ -0,0 +1,21 @@
+"""pipeline_trace: 외부에서 받은 trace 검증"""
+import json
+
+from pipeline_trace import MAX_STAGES, PipelineTrace
+
+
+def test_from_dict_drops_non_finite_and_non_numeric_timestamps():
+    body = json.loads('{"traceId": "t1", "stages": {"ok": 1.5, "nan": NaN, "inf": Infinity, '
+                      '"neg_inf": -Infinity, "huge": 1' + "0" * 400 + ', "text": "1", "flag": true}}')
+    trace = PipelineTrace.from_dict(body)
+    assert trace.trace_id == "t1"
+    assert trace.stages == {"ok": 1.5}
+    json.dumps(trace.to_dict(), allow_nan=False)
+
+
+def test_from_dict_caps_stage_count_and_falls_back_to_new_trace():
+    trace = PipelineTrace.from_dict({"stages": {f"s{i}": float(i) for i in range(MAX_STAGES + 5)}})
+    assert len(trace.stages) == MAX_STAGES
+    assert trace.trace_id
+
+    assert PipelineTrace.from_dict("not a dict", trace_id="fallback").stages == {}
@@ -0,0 +1,69 @@
+"""rate_limiter: 버스트, 디바이스/허브 범위, 버킷 수 상한 (가짜 시계 사용)"""
+import pytest
+
+from rate_limiter import CommandRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_device_burst_then_refill(clock):
+    limiter = CommandRateLimiter(device_rate=2, device_burst=3, clock=clock)
+    assert [limiter.try_acquire("d1") for _ in range(3)] == [(0.0, None)] * 3
+    retry_after, scope = limiter.try_acquire("d1")
+    assert scope == "device"
+    assert retry_after == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert limiter.try_acquire("d1") == (0.0, None)
+
+
+def test_devices_have_separate_buckets(clock):
+    limiter = CommandRateLimiter(device_rate=1, device_burst=1, clock=clock)
+    assert limiter.try_acquire("d1") == (0.0, None)
+    assert limiter.try_acquire("d2") == (0.0, None)
+    assert limiter.try_acquire("d1")[1] == "device"
+
+
+def test_hub_bucket_limits_all_devices(clock):
+    limiter = CommandRateLimiter(device_rate=100, device_burst=100, hub_rate=1, hub_burst=2, clock=clock)
+    assert limiter.try_acquire("d1") == (0.0, None)
+    assert limiter.try_acquire("d2") == (0.0, None)
+    retry_after, scope = limiter.try_acquire("d3")
+    assert scope == "hub"
+    assert retry_after == pytest.approx(1.0)
+    assert limiter.stats()["rejections"] == {"device": 0, "hub": 1}
+
+
+def test_rejection_takes_no_tokens(clock):
+    limiter = CommandRateLimiter(device_rate=0.1, device_burst=1, hub_rate=10, hub_burst=1, clock=clock)
+    assert limiter.try_acquire("d2") == (0.0, None)
+    # 허브 버킷이 비어 거절되면 d1의 디바이스 토큰도 꺼내지 않아야 함 (꺼냈다면 다시 차는 데 10초)
+    assert limiter.try_acquire("d1")[1] == "hub"
+    clock.now += 0.1
+    assert limiter.try_acquire("d1") == (0.0, None)
+
+
+def test_zero_rate_disables_device_scope(clock):
+    limiter = CommandRateLimiter(device_rate=0, clock=clock)
+    assert all(limiter.try_acquire("d1") == (0.0, None) for _ in range(100))
+    assert limiter.stats()["deviceBuckets"] == 0
+
+
+def test_device_buckets_are_capped(clock):
+    limiter = CommandRateLimiter(device_rate=1, device_burst=1, max_device_buckets=2, clock=clock)
+    for device_id in ("d1", "d2", "d3"):
+        limiter.try_acquire(device_id)
+    assert limiter.stats()["deviceBuckets"] == 2
+    # 가장 오래 쓰지 않은 d1 버킷이 제거되어 새 버킷(가득 참)으로 시작
+    assert limiter.try_acquire("d1") == (0.0, None)
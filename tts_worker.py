@@ -0,0 +1,192 @@
+"""
+음성 클라이언트 TTS 작업 스레드
+
+pyttsx3 엔진은 만들 때마다 드라이버 초기화와 설치된 음성 목록 조회에 수백 ms가 걸리고,
+여러 스레드(메인 루프, 스케줄러)에서 동시에 쓰면 안전하지 않습니다.
+TTSWorker는 전용 스레드 하나에서 엔진을 한 번만 만들고(음성 선택도 한 번), 우선순위 큐로 받은
+문장을 차례로 말합니다. 다른 스레드는 say()로 문장을 넣고 필요하면 끝날 때까지 기다립니다.
+
+  - 우선순위: 숫자가 작을수록 먼저 (같은 우선순위는 넣은 순서대로)
+  - interrupt=True: 지금 말하고 있는 문장을 끊음 (다음 문장은 우선순위 순서대로)
+  - Utterance.cancel() / cancel_all(): 아직 말하지 않은 문장은 건너뛰고, 말하는 중이면 끊음
+
+말을 끊는 엔진 호출(engine.stop())은 엔진 스레드의 단어 시작 콜백 안에서만 합니다.
+
+phrase_cache(phrase_audio.PhraseAudioCache)를 넘기면 고정 문장은 미리 합성한 PCM을 바로 재생하고,
+디스크에 없는 고정 문장은 별도 프로세스에서 WAV로 만들어 둡니다(이 스레드는 렌더링을 기다리지 않음).
+"""
+import itertools
+import queue
+import threading
+
+from phrase_audio import PCMPlayer
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 5
+
+DEFAULT_RATE = 180  # 말하기 속도 (pyttsx3 기본: 200)
+DEFAULT_VOLUME = 0.9
+# 음성 이름에 이 단어가 들어간 첫 음성을 사용 (한국어 또는 여성 음성)
+DEFAULT_VOICE_KEYWORDS = ("korean", "female")
+
+
+def _create_pyttsx3_engine():
+    import pyttsx3
+    return pyttsx3.init()
+
+
+class Utterance:
+    """say()로 넣은 문장 하나 (끝났는지 기다리거나 취소할 수 있음)"""
+
+    def __init__(self, worker, text, priority):
+        self.text = text
+        self.priority = priority
+        self.cancelled = False
+        self.interrupted = False
+        self._worker = worker
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """말을 마치거나(취소/중단 포함) timeout초가 지날 때까지 기다리고, 끝났는지 반환합니다."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self._worker._cancel(self)
+
+
+class TTSWorker:
+    """pyttsx3 엔진 하나를 전용 스레드에서 계속 사용하는 TTS 작업자 (스레드 안전)"""
+
+    def __init__(self, rate=DEFAULT_RATE, volume=DEFAULT_VOLUME,
+                 voice_keywords=DEFAULT_VOICE_KEYWORDS, engine_factory=_create_pyttsx3_engine, phrase_cache=None):
+        self.phrase_cache = phrase_cache
+        self._player = PCMPlayer()
+        self._rate = rate
+        self._volume = volume
+        self._voice_keywords = voice_keywords
+        self._engine_factory = engine_factory
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._current = None
+        self._interrupt = threading.Event()
+        self._thread = None
+        self._engine = None
+        self.voice_id = None
+
+    def start(self):
+        """엔진 스레드를 시작합니다 (이미 시작했으면 무시). 클라이언트 시작 시 미리 호출해 두면 좋습니다."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+            self._thread.start()
+
+    def say(self, text, priority=PRIORITY_NORMAL, interrupt=False):
+        """문장을 큐에 넣고 Utterance를 반환합니다 (기다리지 않음)."""
+        self.start()
+        utterance = Utterance(self, text, priority)
+        if interrupt:
+            with self._lock:
+                if self._current is not None:
+                    self._current.interrupted = True
+                    self._interrupt.set()
+        self._queue.put((priority, next(self._sequence), utterance))
+        return utterance
+
+    def _cancel(self, utterance):
+        utterance.cancelled = True
+        with self._lock:
+            if self._current is utterance:
+                self._interrupt.set()
+
+    def cancel_all(self):
+        """아직 말하지 않은 문장을 모두 버리고 지금 말하는 문장도 끊습니다."""
+        while True:
+            try:
+                _, _, utterance = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if utterance is None:
+                # 종료 요청은 남겨 둠
+                self._queue.put((-1, next(self._sequence), None))
+                break
+            utterance.cancelled = True
+            utterance._done.set()
+        with self._lock:
+            if self._current is not None:
+                self._current.cancelled = True
+                self._interrupt.set()
+
+    def stop(self, timeout=None):
+        """남은 문장을 버리고 엔진 스레드를 끝냅니다."""
+        if self.phrase_cache is not None:
+            self.phrase_cache.stop_rendering()
+        self.cancel_all()
+        self._queue.put((-1, next(self._sequence), None))
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _create_engine(self):
+        engine = self._engine_factory()
+        voices = engine.getProperty('voices') or []
+        for voice in voices:
+            if any(keyword in voice.name.lower() for keyword in self._voice_keywords):
+                self.voice_id = voice.id
+                engine.setProperty('voice', voice.id)
+                break
+        engine.setProperty('rate', self._rate)
+        engine.setProperty('volume', self._volume)
+        engine.connect('started-word', self._on_word)
+        return engine
+
+    def _on_word(self, name, location, length):
+        # 엔진 스레드에서 호출되므로 여기서 멈추는 것이 안전함
+        if self._interrupt.is_set():
+            self._engine.stop()
+
+    def _speak(self, text):
+        audio = self.phrase_cache.get(text) if self.phrase_cache is not None else None
+        if audio is not None:
+            try:
+                self._player.play(audio, should_stop=self._interrupt.is_set)
+                return
+            except Exception as e:
+                print(f"⚠️ 저장된 안내 음성 재생 실패, 실시간 합성으로 말합니다: {e}")
+        if self._engine is not None:
+            self._engine.say(text)
+            self._engine.runAndWait()
+
+    def _run(self):
+        try:
+            self._engine = self._create_engine()
+            if self.phrase_cache is not None:
+                self.phrase_cache.set_voice(self.voice_id, self._rate, self._volume)
+                # 같은 음성 설정의 별도 엔진(자식 프로세스)에서 만들므로 말하기와 겹쳐도 기다리지 않음
+                self.phrase_cache.render_missing_in_background()
+        except Exception as e:
+            print(f"❌ TTS 엔진 초기화 실패: {e}")
+
+        while True:
+            _, _, utterance = self._queue.get()
+            if utterance is None:
+                break
+            if utterance.cancelled:
+                utterance._done.set()
+                continue
+            with self._lock:
+                self._current = utterance
+                self._interrupt.clear()
+            try:
+                self._speak(utterance.text)
+            except Exception as e:
+                print(f"❌ TTS 오류: {e}")
+            finally:
+                with self._lock:
+                    self._current = None
+                utterance._done.set()
+        self._player.close()
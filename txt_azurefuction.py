@@ -1,115 +1,23 @@
 import asyncio
 import os
-import json
-import aiohttp
 from dotenv import load_dotenv
+from azure_function_client import run_with_warm_connection, send_command_to_azure_function
+from intent_engine import ACTION_COMMANDS, analyze_light_command
+from lazy_import import preload
+from pipeline_trace import PipelineTrace
+
+preload("aiohttp")
 
 load_dotenv()
 print("🔍 Azure Function URL:", os.getenv("AZURE_FUNCTION_URL"))
 print("🔍 디바이스 ID:", os.getenv("DEVICE_ID"))
 
-async def send_command_to_azure_function(command):
-    """
-    Azure Function에 HTTP 요청을 보내서 IoT Hub로 메시지를 전달합니다.
-    """
-    try:
-        function_url = os.getenv("AZURE_FUNCTION_URL")
-        
-        if not function_url:
-            raise ValueError("AZURE_FUNCTION_URL 환경 변수가 설정되지 않았습니다.")
-            
-        # 요청 데이터 준비
-        payload = {
-            "command": command,
-            "deviceId": os.getenv("DEVICE_ID", "default-device"),
-            "timestamp": asyncio.get_event_loop().time()
-        }
-        
-        print(f"🌐 Azure Function으로 요청 전송: {function_url}")
-        print(f"📄 요청 데이터: {json.dumps(payload, indent=2)}")
-        
-        # HTTP 요청 전송
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                function_url,
-                json=payload,
-                headers={
-                    "Content-Type": "application/json"
-                },
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                
-                status_code = response.status
-                response_text = await response.text()
-                
-                print(f"📊 응답 상태 코드: {status_code}")
-                print(f"📨 응답 내용: {response_text}")
-                
-                if status_code == 200:
-                    print("✅ Azure Function 요청 성공!")
-                    try:
-                        response_json = json.loads(response_text)
-                        if response_json.get("success"):
-                            print("✅ IoT Hub 메시지 전송 완료!")
-                        else:
-                            print(f"❌ IoT Hub 전송 실패: {response_json.get('error', '알 수 없는 오류')}")
-                    except json.JSONDecodeError:
-                        print("✅ 응답을 텍스트로 받았습니다.")
-                else:
-                    print(f"❌ Azure Function 요청 실패 (상태 코드: {status_code})")
-                    
-    except aiohttp.ClientTimeout:
-        print("❌ Azure Function 요청 시간 초과 (30초)")
-    except aiohttp.ClientError as e:
-        print(f"❌ HTTP 요청 오류: {e}")
-    except Exception as e:
-        print(f"❌ Azure Function 요청 오류: {e}")
-
-
 def analyze_command(text):
     """
     입력된 텍스트를 분석하여 조명 제어 명령인지 판단하고
     'turn on the light' 또는 'turn off the light'로 변환합니다.
     """
-    if not text:
-        return None
-    
-    # 텍스트를 소문자로 변환하여 대소문자 구분 없이 처리
-    text_lower = text.lower()
-    
-    # 불 켜기 관련 키워드들
-    turn_on_keywords = [
-        "켜", "키", "on", "온"
-    ]
-    
-    # 불 끄기 관련 키워드들  
-    turn_off_keywords = [
-        "꺼", "끄", "off", "오프"
-    ]
-    
-    # 조명 관련 키워드들
-    light_keywords = [
-        "불", "라이트", "light", "조명", "전등"
-    ]
-    
-    # 조명 관련 키워드가 포함되어 있는지 확인
-    has_light_keyword = any(keyword in text_lower for keyword in light_keywords)
-    
-    # 조명 키워드가 없더라도 켜기/끄기 키워드만으로도 판단 (간단한 명령)
-    has_turn_on = any(keyword in text_lower for keyword in turn_on_keywords)
-    has_turn_off = any(keyword in text_lower for keyword in turn_off_keywords)
-    
-    # 표준화된 명령어로 변환
-    if has_turn_on and not has_turn_off:
-        return "turn on the light"
-    elif has_turn_off and not has_turn_on:
-        return "turn off the light"
-    elif has_light_keyword and has_turn_on:
-        return "turn on the light"
-    elif has_light_keyword and has_turn_off:
-        return "turn off the light"
-    else:
-        return None
+    return ACTION_COMMANDS.get(analyze_light_command(text))
 
 
 def get_text_input():
@@ -150,7 +58,10 @@ async def main():
     # 최대 3번 시도
     for attempt in range(3):
         print(f"🔄 시도 {attempt + 1}/3")
-        user_input = get_text_input()
+        trace = PipelineTrace()
+        # input()은 블로킹이므로 스레드에서 (입력을 기다리는 동안에도 연결 유지, 보관함 재전송이 실행되도록)
+        user_input = await asyncio.to_thread(get_text_input)
+        trace.mark("input_done")
         
         if user_input:
             # 키워드 기반 분석으로 표준화된 명령어 생성
@@ -160,7 +71,7 @@ async def main():
                 action_text = "조명 켜기" if standardized_command == "turn on the light" else "조명 끄기"
                 print(f"✅ {action_text} 명령이 인식되었습니다!")
                 print(f"📡 Azure Function으로 전송할 명령: '{standardized_command}'")
-                await send_command_to_azure_function(standardized_command)
+                await send_command_to_azure_function(standardized_command, timeout_seconds=30, trace=trace)
                 print("🎯 명령 처리가 완료되었습니다. 프로그램을 종료합니다.")
                 break
             else:
@@ -181,4 +92,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run_with_warm_connection(main()))
\ No newline at end of file
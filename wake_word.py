@@ -0,0 +1,393 @@
+"""
+Porcupine 호출어(웨이크 워드) 감지
+
+마이크에서 512샘플(16kHz에서 32ms) 프레임을 하루 종일 읽어 Porcupine에 넘기므로, 유휴 CPU의
+대부분이 이 반복문에서 나옵니다.
+
+pvporcupine 바인딩의 process()는 샘플 시퀀스를 받아 호출마다 ctypes 배열을 새로 만드는데, 이 변환이
+프레임 처리 비용의 대부분입니다. 그래서 미리 할당한 array('h') 버퍼에 PCM 바이트를 복사(memcpy)하고,
+같은 메모리를 가리키는 ctypes 배열로 바인딩 내부의 C 함수를 직접 호출합니다(프레임당 할당 없음).
+이 경로는 바인딩 내부 속성(_process_func, _handle)에 의존하므로 검증한 pvporcupine 버전
+(DIRECT_PROCESS_VERSIONS, requirements-client.txt에 고정)에서만 쓰고, 엔진을 연결할 때 같은 프레임을
+process()와 직접 호출에 넣어 결과가 같은지 한 번 확인합니다. 버전이 다르거나 결과가 다르면 미리 컴파일한
+struct.Struct로 풀어 공개 API인 process()를 호출합니다(프레임마다 형식 문자열을 만들지 않음).
+
+감지는 이벤트 루프를 막지 않습니다. PyAudio 콜백 모드로 읽은 오디오를 링 버퍼(PCMRingBuffer)에 쌓고,
+전용 감지 스레드가 프레임을 꺼내 Porcupine에 넘깁니다. 이벤트 루프는 wait_for_wake_word()를
+await하고, 감지 스레드는 loop.call_soon_threadsafe()로 결과를 알려 줍니다. 기다리는 쪽이 없을 때는
+프레임을 버리기만 하므로(엔진 호출 없음) 명령 처리 중에 안내 음성으로 다시 깨어나지 않습니다.
+"""
+import asyncio
+import ctypes
+import importlib.metadata
+import struct
+import threading
+from array import array
+
+from lazy_import import LazyModule
+
+pvporcupine = LazyModule("pvporcupine")
+pyaudio = LazyModule("pyaudio")
+
+# 링 버퍼 크기 (프레임). 512샘플 프레임 기준 약 2초
+RING_BUFFER_FRAMES = 64
+# 감지 스레드가 종료 요청을 확인하는 간격
+READ_TIMEOUT_SECONDS = 0.5
+STOP_TIMEOUT_SECONDS = 2.0
+# C 함수 직접 호출을 검증한 pvporcupine 버전 (접두사). 다른 버전은 process() 사용
+DIRECT_PROCESS_VERSIONS = ("4.0.",)
+
+
+class PCMFrameBuffer:
+    """프레임 하나 크기의 16비트 PCM 버퍼 (한 번만 할당하고 계속 재사용)"""
+
+    def __init__(self, frame_length):
+        self.frame_length = frame_length
+        self.samples = array("h", bytes(2 * frame_length))
+        self._bytes = memoryview(self.samples).cast("B")
+        # samples와 같은 메모리를 가리키는 ctypes 배열 (C 함수에 복사 없이 전달)
+        self.c_samples = (ctypes.c_short * frame_length).from_buffer(self.samples)
+
+    def load(self, pcm):
+        """마이크에서 읽은 바이트를 버퍼에 복사합니다 (길이가 다르면 ValueError)."""
+        self._bytes[:] = pcm
+        return self.samples
+
+    def fill_from(self, ring, timeout=None):
+        """링 버퍼에서 프레임 하나를 버퍼로 바로 읽습니다 (모이지 않으면 False)."""
+        return ring.read_into(self._bytes, timeout)
+
+
+class PCMRingBuffer:
+    """
+    오디오 콜백(쓰기)과 감지 스레드(읽기) 사이의 고정 크기 링 버퍼 (스레드 안전).
+    가득 차면 가장 오래된 프레임을 버리고 dropped_frames를 셉니다(최신 소리를 우선).
+    """
+
+    def __init__(self, frame_bytes, capacity_frames=RING_BUFFER_FRAMES):
+        self.frame_bytes = frame_bytes
+        self.capacity = frame_bytes * capacity_frames
+        self._data = bytearray(self.capacity)
+        self._view = memoryview(self._data)
+        # 지금까지 쓴/읽은 바이트 수 (위치는 capacity로 나눈 나머지)
+        self._written = 0
+        self._read = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.dropped_frames = 0
+
+    def write(self, pcm):
+        """오디오 콜백에서 호출합니다 (기다리지 않음)."""
+        pcm = memoryview(pcm).cast("B")
+        with self._cond:
+            if len(pcm) > self.capacity:
+                pcm = pcm[len(pcm) - self.capacity:]
+            overflow = self._written + len(pcm) - self._read - self.capacity
+            if overflow > 0:
+                frames = -(-overflow // self.frame_bytes)
+                self._read += frames * self.frame_bytes
+                self.dropped_frames += frames
+            self._copy_in(pcm)
+            self._written += len(pcm)
+            self._cond.notify()
+
+    def _copy_in(self, pcm):
+        start = self._written % self.capacity
+        first = min(len(pcm), self.capacity - start)
+        self._view[start:start + first] = pcm[:first]
+        self._view[:len(pcm) - first] = pcm[first:]
+
+    def read_into(self, dest, timeout=None):
+        """
+        dest(쓰기 가능한 바이트 memoryview) 크기만큼 읽습니다.
+        timeout초 안에 모이지 않거나 닫히면 False.
+        """
+        size = len(dest)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._written - self._read >= size, timeout):
+                return False
+            if self._closed:
+                return False
+            start = self._read % self.capacity
+            first = min(size, self.capacity - start)
+            dest[:first] = self._view[start:start + first]
+            dest[first:] = self._view[:size - first]
+            self._read += size
+            return True
+
+    def clear(self):
+        """쌓인 오디오를 버립니다 (기다리기 시작할 때 지난 소리로 깨어나지 않도록)."""
+        with self._cond:
+            self._read = self._written
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return self._written - self._read
+
+
+def _direct_process_supported(porcupine):
+    """검증한 pvporcupine 버전인지 확인합니다 (pvporcupine 객체가 아닌 녹음 재생용 엔진은 검사하지 않음)."""
+    if not type(porcupine).__module__.startswith("pvporcupine"):
+        return True
+    try:
+        version = importlib.metadata.version("pvporcupine")
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    return version.startswith(DIRECT_PROCESS_VERSIONS)
+
+
+def _self_check_frames(frame_length):
+    """직접 호출 확인용 프레임: 무음과 고정 패턴 (실제 마이크 입력과 같은 바이트 형식)"""
+    pattern = bytes(range(256)) * (2 * frame_length // 256 + 1)
+    return [bytes(2 * frame_length), pattern[:2 * frame_length]]
+
+
+def _direct_process_matches(porcupine, frame, direct_process):
+    """같은 프레임을 직접 호출과 porcupine.process()에 넣어 결과가 같은지 확인합니다."""
+    try:
+        for pcm in _self_check_frames(porcupine.frame_length):
+            frame.load(pcm)
+            if direct_process() != porcupine.process(frame.samples):
+                return False
+    except Exception:
+        return False
+    return True
+
+
+def _bind_direct_process(porcupine, frame):
+    """
+    바인딩 내부 C 함수(pv_porcupine_process)를 frame.c_samples로 직접 호출하는 함수를 만듭니다.
+    검증하지 않은 버전이거나 필요한 속성이 없거나 process()와 결과가 다르면 None (process() 사용).
+    """
+    if not _direct_process_supported(porcupine):
+        print("⚠️ 검증하지 않은 pvporcupine 버전이라 process()를 사용합니다.")
+        return None
+    process_func = getattr(porcupine, "_process_func", None)
+    handle = getattr(porcupine, "_handle", None)
+    statuses = getattr(porcupine, "PicovoiceStatuses", None)
+    if process_func is None or handle is None or statuses is None:
+        return None
+    success = statuses.SUCCESS
+    result = ctypes.c_int()
+    result_pointer = ctypes.pointer(result)
+
+    def process():
+        status = process_func(handle, frame.c_samples, result_pointer)
+        if status is not success:
+            raise RuntimeError(f"Porcupine 프레임 처리 실패: {status}")
+        return result.value
+
+    if not _direct_process_matches(porcupine, frame, process):
+        print("⚠️ C 함수 직접 호출 결과가 process()와 달라 process()를 사용합니다.")
+        return None
+    return process
+
+
+def _resolve_waiter(future, keyword):
+    # 이벤트 루프 스레드에서 실행
+    if not future.done():
+        future.set_result(keyword)
+
+
+class PorcupineWakeWordDetector:
+    """Porcupine 웨이크 워드 감지기 (오디오 콜백 + 감지 스레드, 감지 결과는 await로 받음)"""
+
+    def __init__(self, access_key, keywords=None, sensitivity=0.7, ring_buffer_frames=RING_BUFFER_FRAMES):
+        self.access_key = access_key
+        self.keywords = keywords or ['bumblebee']  # 기본 키워드
+        self.sensitivity = sensitivity
+        self.ring_buffer_frames = ring_buffer_frames
+        self.porcupine = None
+        self.pa = None
+        self.audio_stream = None
+        self._frame = None
+        self._direct_process = None
+        self._unpack_frame = None
+        self._ring = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        # 감지를 기다리는 (이벤트 루프, future). 없으면 프레임을 엔진에 넘기지 않고 버림
+        self._waiter = None
+        self.frames_processed = 0
+        self.input_overflows = 0
+        self.error = None
+
+    def initialize(self):
+        """Porcupine 초기화 후 오디오 콜백과 감지 스레드를 시작합니다."""
+        try:
+            # Porcupine 객체 생성
+            self.porcupine = pvporcupine.create(
+                access_key=self.access_key,
+                keywords=self.keywords,
+                sensitivities=[self.sensitivity] * len(self.keywords)  # 민감도 설정
+            )
+            self.attach_engine(self.porcupine)
+            self._ring = PCMRingBuffer(2 * self.porcupine.frame_length, self.ring_buffer_frames)
+
+            # PyAudio 초기화
+            self.pa = pyaudio.PyAudio()
+
+            # 오디오 스트림 설정 (콜백 모드: PortAudio 스레드가 링 버퍼에 씀)
+            self.audio_stream = self.pa.open(
+                rate=self.porcupine.sample_rate,
+                channels=1,
+                format=pyaudio.paInt16,
+                input=True,
+                frames_per_buffer=self.porcupine.frame_length,
+                stream_callback=self._on_audio,
+                start=False
+            )
+
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._detect_loop, name="wake-word", daemon=True)
+            self._thread.start()
+            self.audio_stream.start_stream()
+
+            print(f"✅ Porcupine 초기화 완료 - 키워드: {self.keywords}")
+            print(f"   샘플레이트: {self.porcupine.sample_rate}Hz")
+            print(f"   프레임 길이: {self.porcupine.frame_length}")
+
+            return True
+
+        except Exception as e:
+            print(f"❌ Porcupine 초기화 실패: {e}")
+            return False
+
+    def attach_engine(self, porcupine, direct=True):
+        """Porcupine 엔진을 연결하고 프레임 버퍼를 준비합니다 (벤치마크에서는 녹음 재생용 엔진 사용)."""
+        self.porcupine = porcupine
+        self._frame = PCMFrameBuffer(porcupine.frame_length)
+        self._direct_process = _bind_direct_process(porcupine, self._frame) if direct else None
+        self._unpack_frame = struct.Struct(f"{porcupine.frame_length}h").unpack_from
+
+    def process_frame(self, pcm):
+        """PCM 프레임(바이트) 하나를 처리해 감지된 키워드 번호(없으면 -1)를 반환합니다."""
+        if self._direct_process is not None:
+            self._frame.load(pcm)
+            return self._direct_process()
+        return self.porcupine.process(self._unpack_frame(pcm))
+
+    def _process_buffered_frame(self):
+        # 링 버퍼에서 self._frame으로 이미 읽은 프레임 처리
+        if self._direct_process is not None:
+            return self._direct_process()
+        return self.porcupine.process(self._frame.samples)
+
+    def _on_audio(self, in_data, frame_count, time_info, status_flags):
+        """PortAudio 콜백 (오디오 스레드): 링 버퍼에 넣기만 하고 바로 반환"""
+        if status_flags & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        self._ring.write(in_data)
+        return None, pyaudio.paContinue
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _detect_loop(self):
+        """감지 스레드: 링 버퍼의 프레임을 Porcupine에 넘기고 감지되면 기다리는 쪽에 알림"""
+        try:
+            while not self._stopping.is_set():
+                if not self._frame.fill_from(self._ring, READ_TIMEOUT_SECONDS):
+                    continue
+                if self._waiter is None:
+                    continue
+                keyword_index = self._process_buffered_frame()
+                self.frames_processed += 1
+                if keyword_index >= 0:
+                    self._notify(self.keywords[keyword_index])
+        except Exception as e:
+            self.error = e
+            print(f"❌ 웨이크 워드 감지 오류: {e}")
+            self._notify(None)
+
+    def _notify(self, keyword):
+        with self._lock:
+            waiter, self._waiter = self._waiter, None
+        if waiter is None:
+            return
+        loop, future = waiter
+        try:
+            loop.call_soon_threadsafe(_resolve_waiter, future, keyword)
+        except RuntimeError:
+            # 이벤트 루프가 이미 닫힘
+            pass
+
+    async def wait_for_wake_word(self, timeout=None):
+        """
+        웨이크 워드를 기다립니다 (이벤트 루프를 막지 않음).
+        감지된 키워드를 반환하고, 시간 초과나 감지 스레드 오류면 None.
+        """
+        if not self.running:
+            print("❌ Porcupine가 초기화되지 않았습니다.")
+            return None
+
+        print("🎤 웨이크 워드 감지 중...")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            # 기다리기 전에 쌓인 소리(안내 음성 등)로 깨어나지 않도록 비움
+            self._ring.clear()
+            self._waiter = (loop, future)
+        try:
+            keyword = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._lock:
+                if self._waiter is not None and self._waiter[1] is future:
+                    self._waiter = None
+        if keyword is not None:
+            print(f"✅ 웨이크 워드 감지됨: '{keyword}'")
+        return keyword
+
+    def stats(self):
+        """오디오/감지 통계 (처리한 프레임, 링 버퍼에서 버린 프레임, 입력 오버플로 횟수)"""
+        return {
+            "framesProcessed": self.frames_processed,
+            "droppedFrames": self._ring.dropped_frames if self._ring else 0,
+            "inputOverflows": self.input_overflows,
+            "bufferedBytes": len(self._ring) if self._ring else 0,
+        }
+
+    def stop(self, timeout=STOP_TIMEOUT_SECONDS):
+        """오디오 입력과 감지 스레드를 멈춥니다. 스레드가 끝났으면 True."""
+        self._stopping.set()
+        if self.audio_stream:
+            try:
+                self.audio_stream.stop_stream()
+            except Exception as e:
+                print(f"⚠️ 오디오 스트림 중지 오류: {e}")
+        if self._ring:
+            self._ring.close()
+        self._notify(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+            self._thread = None
+        return True
+
+    def cleanup(self):
+        """리소스 정리"""
+        try:
+            stopped = self.stop()
+            if self.audio_stream:
+                self.audio_stream.close()
+            if self.pa:
+                self.pa.terminate()
+            # 감지 스레드가 아직 엔진을 쓰고 있으면 해제하지 않음
+            if self.porcupine and stopped:
+                self.porcupine.delete()
+            stats = self.stats()
+            print(f"📊 오디오 프레임: 처리 {stats['framesProcessed']}개, 버림 {stats['droppedFrames']}개, "
+                  f"입력 오버플로 {stats['inputOverflows']}회")
+            print("✅ Porcupine 리소스 정리 완료")
+        except Exception as e:
+            print(f"❌ Porcupine 정리 오류: {e}")